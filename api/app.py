@@ -1,21 +1,120 @@
-from flask import Flask, jsonify
-from controllers.user_controller import bp as users_bp
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, g, jsonify, request
+from controllers.user_controller import bp as users_bp, service
 import logging
-from config import MONGO_URI, RABBITMQ_HOST
+import threading
+from metrics import REGISTRY, CONTENT_TYPE, MultiProcessCollector
+from config import (CACHE_ENABLED, CACHE_INVALIDATION_EVENTS, OUTBOX_ENABLED, OUTBOX_TRANSACTIONS, API_WARMUP, WARMUP_CHANNELS,
+                    READY_TIMEOUT, BACKPRESSURE_ENABLED, BACKPRESSURE_CONFIRM_MAX_AGE, METRICS_MULTIPROC_DIR,
+                    METRICS_SNAPSHOT_INTERVAL)
+from container import WarmUp, check_dependencies
+from services.cache_invalidation import CacheInvalidationListener
+from services.outbox_relay import OutboxRelay
+from services.backpressure import QueueDepthSampler, backpressure
+
+REQUEST_SECONDS = REGISTRY.histogram("api_request_seconds", "Latência das requisições HTTP por rota",
+                                     ("method", "route", "status"))
 
 def create_app():
+    started = time.perf_counter()
     app = Flask(__name__)
     app.register_blueprint(users_bp)
+    background = {"relay": None, "warm_up": None, "started": False}
+    background_lock = threading.Lock()
+    # com vários workers do gunicorn o scrape cai num deles: a resposta soma os snapshots de todos
+    collector = MultiProcessCollector(METRICS_MULTIPROC_DIR, interval=METRICS_SNAPSHOT_INTERVAL) \
+        if METRICS_MULTIPROC_DIR else None
+
+    def start_background():
+        """Índices, listener de cache, relay do outbox, warm-up e sampler de backpressure
+
+        Todos conectam no Mongo ou no RabbitMQ, então nada disso roda no import: sobe no
+        post_worker_init do gunicorn (gunicorn.conf.py) ou, no máximo, no primeiro request.
+        """
+        with background_lock:
+            if background["started"]:
+                return
+            background["started"] = True
+        if collector is not None:
+            collector.start()
+        # índices idempotentes; COLLSCAN em consulta quente vira warning no log e no /health
+        threading.Thread(target=lambda: service.repo.indexes.ensure(), name="index-bootstrap", daemon=True).start()
+        if CACHE_ENABLED and CACHE_INVALIDATION_EVENTS:
+            CacheInvalidationListener(on_event=lambda action, data: service.invalidate_for(action, data)).start()
+        if OUTBOX_ENABLED:
+            background["relay"] = OutboxRelay(service.outbox, service.producer)
+            background["relay"].start()
+        if API_WARMUP:
+            background["warm_up"] = WarmUp(service, channels=WARMUP_CHANNELS, timeout=READY_TIMEOUT)
+            background["warm_up"].start()
+        if BACKPRESSURE_ENABLED:
+            # a latência dos confirms só existe depois que o serviço foi criado
+            QueueDepthSampler(backpressure, confirm_latency=lambda: service.producer.recent_confirm_ms(
+                BACKPRESSURE_CONFIRM_MAX_AGE) if service.started else None).start()
+
+    app.start_background = start_background
+
+    @app.before_request
+    def start_request_timer():
+        if not background["started"]:
+            start_background()
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        # rota do url_rule (não a URL), para a cardinalidade não crescer com ids e nomes;
+        # em respostas streaming mede até o início do corpo
+        started = g.pop("request_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(time.perf_counter() - started)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        body = collector.render() if collector is not None else REGISTRY.render()
+        return Response(body, content_type=CONTENT_TYPE)
 
     # basic health endpoints
     @app.route("/health", methods=["GET"])
     def health():
-        return jsonify({"status":"ok"}), 200
+        indexes = service.repo.indexes
+        if request.args.get("check"):
+            indexes.check_query_plans()
+        return jsonify({
+            "status": "ok",
+            "query_plans": indexes.report["query_plans"],
+            "collscans": indexes.report["collscans"],
+            "cache": service.cache_stats(),
+            "outbox": background["relay"].stats() if background["relay"] else {"enabled": False},
+            "backpressure": backpressure.stats(),
+        }), 200
+
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        """Pronto para tráfego: warm-up concluído e Mongo/RabbitMQ respondendo (latência de cada um)"""
+        checks = {"mongo": lambda: service.repo.ping(READY_TIMEOUT), "rabbitmq": service.producer.ping}
+        if OUTBOX_ENABLED and OUTBOX_TRANSACTIONS:
+            # Mongo standalone: sem transação o outbox não é à prova de crash, então não fica pronto
+            checks["outbox_transactions"] = service.outbox.check_transactions
+        ok, dependencies = check_dependencies(checks)
+        body = {"ready": ok, "dependencies": dependencies, "startup": service.startup}
+        warm_up = background["warm_up"]
+        if warm_up:
+            body["warmup"] = warm_up.stats()
+            ok = ok and warm_up.done.is_set()
+            body["ready"] = ok
+        return jsonify(body), 200 if ok else 503
 
     logging.basicConfig(level=logging.INFO)
+    service.record("create_app", time.perf_counter() - started)
     return app
 
 app = create_app()
+service.record("import", time.perf_counter() - IMPORT_STARTED)
 
 if __name__ == "__main__":
+    app.start_background()
     app.run(host="0.0.0.0", port=5000)
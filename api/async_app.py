@@ -0,0 +1,114 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import logging
+from quart import Quart, Response, g, jsonify, request
+from metrics import REGISTRY, CONTENT_TYPE, MultiProcessCollector
+from controllers.async_user_controller import bp as users_bp, service
+from config import (CACHE_ENABLED, CACHE_INVALIDATION_EVENTS, OUTBOX_ENABLED, API_WARMUP, READY_TIMEOUT,
+                    BACKPRESSURE_ENABLED, BACKPRESSURE_CONFIRM_MAX_AGE, METRICS_MULTIPROC_DIR, METRICS_SNAPSHOT_INTERVAL)
+from container import check_dependencies_async
+from services.cache_invalidation import CacheInvalidationListener
+from services.backpressure import QueueDepthSampler, backpressure
+
+# Variante assíncrona da API (Quart + Motor + aio-pika), com as mesmas rotas e respostas
+# de app.py. Rodar com um servidor ASGI: hypercorn -w 4 -b 0.0.0.0:5000 async_app:app
+
+REQUEST_SECONDS = REGISTRY.histogram("api_request_seconds", "Latência das requisições HTTP por rota",
+                                     ("method", "route", "status"))
+
+def create_async_app():
+    if OUTBOX_ENABLED:
+        # o outbox (transação com o Mongo e OutboxRelay) só existe no app.py
+        raise RuntimeError("OUTBOX_ENABLED=1 is not supported by async_app; use app.py (gunicorn) for the outbox")
+    started = time.perf_counter()
+    app = Quart(__name__)
+    app.register_blueprint(users_bp)
+    warm_up = {"done": asyncio.Event(), "dependencies": {}}
+    # hypercorn -w N: a resposta do /metrics soma os snapshots de todos os workers
+    collector = MultiProcessCollector(METRICS_MULTIPROC_DIR, interval=METRICS_SNAPSHOT_INTERVAL) \
+        if METRICS_MULTIPROC_DIR else None
+
+    def dependency_checks():
+        return {
+            "mongo": lambda: service.repo.ping(READY_TIMEOUT),
+            "rabbitmq": lambda: asyncio.wait_for(service.producer.ping(), READY_TIMEOUT),
+        }
+
+    async def run_warm_up():
+        # conecta o Motor e o canal do aio-pika antes da primeira requisição
+        warm_started = time.perf_counter()
+        _, warm_up["dependencies"] = await check_dependencies_async(dependency_checks())
+        service.record("warmup", time.perf_counter() - warm_started)
+        warm_up["done"].set()
+
+    @app.before_request
+    async def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    async def observe_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(time.perf_counter() - started)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    async def metrics():
+        body = collector.render() if collector is not None else REGISTRY.render()
+        return Response(body, content_type=CONTENT_TYPE)
+
+    @app.route("/health", methods=["GET"])
+    async def health():
+        indexes = service.repo.indexes
+        if request.args.get("check"):
+            await asyncio.to_thread(indexes.check_query_plans)
+        return jsonify({
+            "status": "ok",
+            "query_plans": indexes.report["query_plans"],
+            "collscans": indexes.report["collscans"],
+            "cache": service.cache_stats(),
+            "outbox": {"enabled": False},
+            "backpressure": backpressure.stats(),
+        }), 200
+
+    @app.route("/ready", methods=["GET"])
+    async def ready():
+        ok, dependencies = await check_dependencies_async(dependency_checks())
+        body = {"ready": ok, "dependencies": dependencies, "startup": service.startup}
+        if API_WARMUP:
+            body["warmup"] = {"done": warm_up["done"].is_set(), "dependencies": warm_up["dependencies"]}
+            body["ready"] = ok = ok and warm_up["done"].is_set()
+        return jsonify(body), 200 if ok else 503
+
+    @app.before_serving
+    async def startup():
+        # o IndexManager usa pymongo síncrono: roda numa thread para não travar o loop
+        asyncio.get_running_loop().run_in_executor(None, service.repo.indexes.ensure)
+        if collector is not None:
+            collector.start()
+        if CACHE_ENABLED and CACHE_INVALIDATION_EVENTS:
+            CacheInvalidationListener(on_event=lambda action, data: service.invalidate_for(action, data)).start()
+        if API_WARMUP:
+            app.warm_up_task = asyncio.create_task(run_warm_up())
+        if BACKPRESSURE_ENABLED:
+            # thread com pika bloqueante: só lê atributos do AsyncProducer
+            QueueDepthSampler(backpressure, confirm_latency=lambda: service.producer.recent_confirm_ms(
+                BACKPRESSURE_CONFIRM_MAX_AGE) if service.started else None).start()
+
+    @app.after_serving
+    async def shutdown():
+        if service.started:
+            await service.producer.close()
+
+    logging.basicConfig(level=logging.INFO)
+    service.record("create_app", time.perf_counter() - started)
+    return app
+
+app = create_async_app()
+service.record("import", time.perf_counter() - IMPORT_STARTED)
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000)
@@ -3,3 +3,85 @@ import os
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
 QUEUE_NAME = "crud_queue"
+# Partições da crud_queue (ver messaging/partitions.py); 1 mantém a fila única crud_queue.
+# Precisa ser igual na API, nos workers e no monitor
+CRUD_PARTITIONS = int(os.getenv("CRUD_PARTITIONS", "1"))
+MONITOR_QUEUE = "monitor_queue"
+# Exchanges diretas na frente das filas: além da fila de trabalho, cada réplica
+# da API liga uma fila exclusiva nelas para invalidar o cache
+CRUD_EXCHANGE = os.getenv("CRUD_EXCHANGE", "crud_events")
+MONITOR_EXCHANGE = os.getenv("MONITOR_EXCHANGE", "monitor_events")
+
+# Paginação de GET /api/users
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+# Tamanho do lote lido do cursor do Mongo no modo streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+# POST /api/users/batch
+BATCH_MAX_OPS = int(os.getenv("BATCH_MAX_OPS", "1000"))
+
+# Pool de canais do Producer: no máximo N publicações em andamento (uma por canal),
+# cada uma aguardando o publisher confirm do broker
+PUBLISHER_POOL_SIZE = int(os.getenv("PUBLISHER_POOL_SIZE", "8"))
+PUBLISHER_CONFIRMS = os.getenv("PUBLISHER_CONFIRMS", "1").lower() in ("1", "true", "yes")
+PUBLISHER_ACQUIRE_TIMEOUT = float(os.getenv("PUBLISHER_ACQUIRE_TIMEOUT", "5"))
+
+# Cache de leitura do UserService (páginas de GET /api/users e leitura por id)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "256"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "2"))
+# Invalida o cache com os eventos de crud_events (coerência entre réplicas)
+CACHE_INVALIDATION_EVENTS = os.getenv("CACHE_INVALIDATION_EVENTS", "1").lower() in ("1", "true", "yes")
+# GET /api/users/stats: só por TTL (não é invalidado a cada escrita), então pode atrasar até esse tempo
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "2"))
+STATS_MAX_BUCKETS = int(os.getenv("STATS_MAX_BUCKETS", "50"))
+
+# Startup: o UserService é criado no primeiro uso (ver container.py). Com API_WARMUP a API
+# abre as conexões (ping no Mongo e WARMUP_CHANNELS canais do Producer) em background
+API_WARMUP = os.getenv("API_WARMUP", "0").lower() in ("1", "true", "yes")
+WARMUP_CHANNELS = int(os.getenv("WARMUP_CHANNELS", "1"))
+# conexões que o pool do MongoClient mantém abertas depois de conectar
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+# tempo máximo de cada check do /ready e do warm-up
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "2"))
+
+# Backpressure: o QueueDepthSampler lê a profundidade da crud_queue (queue_declare passivo, a
+# cada BACKPRESSURE_INTERVAL s) e a latência recente dos confirms do Producer. Acima dos limites
+# de "shed" as operações de BACKPRESSURE_LOW_PRIORITY recebem 429; acima dos de "reject", toda
+# escrita. 0 desliga o limite
+BACKPRESSURE_ENABLED = os.getenv("BACKPRESSURE_ENABLED", "1").lower() in ("1", "true", "yes")
+BACKPRESSURE_INTERVAL = float(os.getenv("BACKPRESSURE_INTERVAL", "1"))
+BACKPRESSURE_SHED_DEPTH = int(os.getenv("BACKPRESSURE_SHED_DEPTH", "10000"))
+BACKPRESSURE_REJECT_DEPTH = int(os.getenv("BACKPRESSURE_REJECT_DEPTH", "50000"))
+BACKPRESSURE_SHED_CONFIRM_MS = float(os.getenv("BACKPRESSURE_SHED_CONFIRM_MS", "250"))
+BACKPRESSURE_REJECT_CONFIRM_MS = float(os.getenv("BACKPRESSURE_REJECT_CONFIRM_MS", "1000"))
+# para sair de um nível os sinais precisam cair abaixo desta fração do limite
+BACKPRESSURE_RECOVERY = float(os.getenv("BACKPRESSURE_RECOVERY", "0.8"))
+# Retry-After quando não há estimativa de drenagem, e o máximo da estimativa
+BACKPRESSURE_RETRY_AFTER = int(os.getenv("BACKPRESSURE_RETRY_AFTER", "2"))
+BACKPRESSURE_MAX_RETRY_AFTER = int(os.getenv("BACKPRESSURE_MAX_RETRY_AFTER", "60"))
+BACKPRESSURE_LOW_PRIORITY = tuple(op.strip() for op in os.getenv("BACKPRESSURE_LOW_PRIORITY", "clear_all,batch").split(",")
+                                  if op.strip())
+# latência de confirms mais velha que isso não conta (sem publicações, o sinal expira)
+BACKPRESSURE_CONFIRM_MAX_AGE = float(os.getenv("BACKPRESSURE_CONFIRM_MAX_AGE", "10"))
+
+# Codec das mensagens publicadas (application/json ou application/msgpack)
+MESSAGE_CODEC = os.getenv("MESSAGE_CODEC", "application/json")
+
+# Outbox transacional: as escritas gravam o evento na coleção outbox e um relay em
+# background publica na crud_queue, tirando o broker do caminho da requisição
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "0").lower() in ("1", "true", "yes")
+# documento + outbox na mesma transação (exige replica set ou mongos). Ligado por padrão com o
+# outbox: sem transação são duas escritas, e um crash entre elas perde o evento
+OUTBOX_TRANSACTIONS = os.getenv("OUTBOX_TRANSACTIONS", "1" if OUTBOX_ENABLED else "0").lower() in ("1", "true", "yes")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.2"))
+# registros reservados por um relay que não confirmou o envio voltam a ficar disponíveis depois
+# disso; o relay para de publicar um lote na metade desse tempo e devolve o resto
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+
+# /metrics com vários processos (gunicorn -w N): cada um grava seu snapshot neste diretório e
+# o scrape soma todos. Vazio: cada processo responde só com as próprias métricas
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "1"))
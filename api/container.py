@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Fases do startup: import (módulo app, com create_app), create_app, service (criação do serviço) e warmup
+STARTUP_SECONDS = REGISTRY.gauge("api_startup_seconds", "Duração das fases de inicialização da API", ("phase",))
+
+class LazyService:
+    """Cria o serviço no primeiro uso; atributos são repassados para a instância
+
+    Importar o app não abre conexões nem falha se o Mongo/RabbitMQ estiver fora: isso fica
+    para a primeira requisição (ou para o warm-up), já no processo que vai atender.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self.startup = {}
+
+    @property
+    def started(self) -> bool:
+        return self._instance is not None
+
+    def get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    self._instance = self._factory()
+                    self.record("service", time.perf_counter() - started)
+        return self._instance
+
+    def record(self, phase: str, seconds: float):
+        self.startup[phase] = round(seconds, 6)
+        STARTUP_SECONDS.labels(phase).set(seconds)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+def check_dependencies(checks: dict):
+    """Executa cada check (nome -> callable) e mede a ida e volta; devolve (pronto, relatório)"""
+    report = {}
+    for name, check in checks.items():
+        started = time.perf_counter()
+        try:
+            check()
+            report[name] = {"ok": True}
+        except Exception as e:
+            report[name] = {"ok": False, "error": str(e) or type(e).__name__}
+        report[name]["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return all(r["ok"] for r in report.values()), report
+
+async def check_dependencies_async(checks: dict):
+    """Mesmo que check_dependencies, para checks assíncronos"""
+    report = {}
+    for name, check in checks.items():
+        started = time.perf_counter()
+        try:
+            await check()
+            report[name] = {"ok": True}
+        except Exception as e:
+            report[name] = {"ok": False, "error": str(e) or type(e).__name__}
+        report[name]["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return all(r["ok"] for r in report.values()), report
+
+class WarmUp(threading.Thread):
+    """Abre as conexões do serviço antes da primeira requisição (Mongo e canais do Producer)
+
+    Roda em background: falhas só vão para o log, e o /ready fica 503 até terminar.
+    """
+
+    def __init__(self, service: LazyService, channels: int = 1, timeout: float = None):
+        super().__init__(name="warm-up", daemon=True)
+        self.service = service
+        self.channels = channels
+        self.timeout = timeout
+        self.done = threading.Event()
+        self.report = {}
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            _, self.report = check_dependencies({
+                "mongo": lambda: self.service.repo.ping(self.timeout),
+                "rabbitmq": lambda: self.service.producer.warm(self.channels),
+            })
+            for name, result in self.report.items():
+                if not result["ok"]:
+                    logger.warning("warm-up of %s failed: %s", name, result["error"])
+        finally:
+            self.service.record("warmup", time.perf_counter() - started)
+            self.done.set()
+
+    def stats(self):
+        return {"done": self.done.is_set(), "dependencies": self.report}
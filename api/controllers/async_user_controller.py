@@ -0,0 +1,135 @@
+from quart import Blueprint, Response, request, jsonify
+from services.async_user_services import AsyncUserService
+from services.user_services import STAGE_SECONDS
+from schemas.user_schema import (parse_list_query, parse_stats_query, validate_batch, validate_user,
+                                 validate_user_update, encode_user, encode_users)
+from pydantic import ValidationError
+from bson import ObjectId
+from container import LazyService
+from services.backpressure import backpressure
+
+# Mesmas rotas e respostas de controllers/user_controller.py, para o app assíncrono
+bp = Blueprint("users", __name__, url_prefix="/api")
+
+# criado no primeiro uso, já dentro do event loop do servidor
+service = LazyService(AsyncUserService)
+
+def _overloaded(operation):
+    """429 com Retry-After quando o backpressure recusa a escrita (None se ela pode seguir)"""
+    retry_after = backpressure.admit(operation)
+    if retry_after is None:
+        return None
+    resp = jsonify({"error": "overloaded, retry later", "retry_after": retry_after})
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp, 429
+
+@bp.route("/users", methods=["POST"])
+async def create_user():
+    shed = _overloaded("create")
+    if shed:
+        return shed
+    try:
+        payload = await request.get_json()
+        with STAGE_SECONDS.labels("create", "validation").time():
+            user = validate_user(payload)
+    except ValidationError as e:
+        return jsonify({"error": e.errors()}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    inserted_id = await service.create_user(user)
+    return jsonify({"status": "created", "id": inserted_id}), 201
+
+async def _stream_json_array(items):
+    yield b"["
+    first = True
+    async for item in items:
+        if not first:
+            yield b","
+        first = False
+        yield encode_user(item)
+    yield b"]"
+
+@bp.route("/users", methods=["GET"])
+async def list_users():
+    try:
+        query = parse_list_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    after, limit = query["after"], query["limit"]
+    find = {"filters": query["filters"], "fields": query["fields"], "sort": query["sort"]}
+
+    if query["stream"]:
+        return Response(_stream_json_array(service.iter_users(after=after, **find)), mimetype="application/json")
+
+    users = await service.list_users(after=after, limit=limit, **find)
+    resp = Response(encode_users(users), mimetype="application/json")
+    if len(users) == limit and query["sort"] is None:
+        resp.headers["X-Next-After"] = users[-1]["id"]
+    return resp, 200
+
+@bp.route("/users/stats", methods=["GET"])
+async def users_stats():
+    try:
+        query = parse_stats_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    stats = await service.user_stats(filters=query["filters"], buckets=query["buckets"], approx=query["approx"])
+    return jsonify(stats), 200
+
+@bp.route("/users/batch", methods=["POST"])
+async def batch_users():
+    shed = _overloaded("batch")
+    if shed:
+        return shed
+    payload = await request.get_json()
+    with STAGE_SECONDS.labels("batch", "validation").time():
+        ops, errors = validate_batch(payload)
+    if errors:
+        return jsonify({"error": errors}), 400
+
+    ordered = request.args.get("ordered", "true").lower() not in ("0", "false", "no")
+    outcome = await service.apply_batch(ops, ordered=ordered)
+    return jsonify(outcome), 200
+
+@bp.route("/users/<string:user_id>", methods=["GET"])
+async def get_user(user_id):
+    if not ObjectId.is_valid(user_id):
+        return jsonify({"error": "invalid id"}), 400
+    user = await service.get_user(user_id)
+    if user is None:
+        return jsonify({"error": "not found"}), 404
+    return Response(encode_user(user), mimetype="application/json"), 200
+
+@bp.route("/users/<string:name>", methods=["PUT"])
+async def update_user(name):
+    shed = _overloaded("update")
+    if shed:
+        return shed
+    try:
+        with STAGE_SECONDS.labels("update", "validation").time():
+            data = validate_user_update(await request.get_json(), name)
+    except ValidationError as e:
+        return jsonify({"error": e.errors()}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    modified = await service.update_user_by_name(name, data)
+    return jsonify({"modified": modified}), 200
+
+@bp.route("/users/<string:name>", methods=["DELETE"])
+async def delete_user(name):
+    shed = _overloaded("delete")
+    if shed:
+        return shed
+    deleted = await service.delete_user_by_name(name)
+    return jsonify({"deleted": deleted}), 200
+
+@bp.route("/clear-all", methods=["DELETE"])
+async def clear_all_users():
+    shed = _overloaded("clear_all")
+    if shed:
+        return shed
+    try:
+        deleted_count = await service.clear_all_users()
+        return jsonify({"deleted": deleted_count}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,41 +1,124 @@
-from flask import Blueprint, request, jsonify
-from services.user_services import UserService
-from models.user_model import User
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from services.user_services import STAGE_SECONDS, UserService
 from pydantic import ValidationError
+from schemas.user_schema import (parse_list_query, parse_stats_query, validate_batch, validate_user,
+                                 validate_user_update, encode_user, encode_users, stream_json_array)
+from bson import ObjectId
+from container import LazyService
+from services.backpressure import backpressure
 
 bp = Blueprint("users", __name__, url_prefix="/api")
 
-service = UserService()
+# criado no primeiro uso: importar o controller não conecta no Mongo nem no RabbitMQ
+service = LazyService(UserService)
+
+def _overloaded(operation):
+    """429 com Retry-After quando o backpressure recusa a escrita (None se ela pode seguir)"""
+    retry_after = backpressure.admit(operation)
+    if retry_after is None:
+        return None
+    resp = jsonify({"error": "overloaded, retry later", "retry_after": retry_after})
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp, 429
 
 @bp.route("/users", methods=["POST"])
 def create_user():
+    shed = _overloaded("create")
+    if shed:
+        return shed
     try:
         payload = request.get_json()
-        user = User(**payload)
+        with STAGE_SECONDS.labels("create", "validation").time():
+            user = validate_user(payload)
     except ValidationError as e:
         return jsonify({"error": e.errors()}), 400
-    inserted_id = service.create_user(user.dict(exclude_none=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    inserted_id = service.create_user(user)
     return jsonify({"status": "created", "id": inserted_id}), 201
 
 @bp.route("/users", methods=["GET"])
 def list_users():
-    users = service.list_users()
-    return jsonify(users), 200
+    try:
+        query = parse_list_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    after, limit = query["after"], query["limit"]
+    find = {"filters": query["filters"], "fields": query["fields"], "sort": query["sort"]}
+
+    if query["stream"]:
+        items = service.iter_users(after=after, **find)
+        return Response(stream_with_context(stream_json_array(items)), mimetype="application/json")
+
+    users = service.list_users(after=after, limit=limit, **find)
+    resp = Response(encode_users(users), mimetype="application/json")
+    # cursor da próxima página: id do último item, se a página veio cheia
+    if len(users) == limit and query["sort"] is None:
+        resp.headers["X-Next-After"] = users[-1]["id"]
+    return resp, 200
+
+@bp.route("/users/stats", methods=["GET"])
+def users_stats():
+    try:
+        query = parse_stats_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    stats = service.user_stats(filters=query["filters"], buckets=query["buckets"], approx=query["approx"])
+    return jsonify(stats), 200
+
+@bp.route("/users/batch", methods=["POST"])
+def batch_users():
+    shed = _overloaded("batch")
+    if shed:
+        return shed
+    payload = request.get_json()
+    with STAGE_SECONDS.labels("batch", "validation").time():
+        ops, errors = validate_batch(payload)
+    if errors:
+        return jsonify({"error": errors}), 400
+
+    ordered = request.args.get("ordered", "true").lower() not in ("0", "false", "no")
+    outcome = service.apply_batch(ops, ordered=ordered)
+    return jsonify(outcome), 200
+
+@bp.route("/users/<string:user_id>", methods=["GET"])
+def get_user(user_id):
+    if not ObjectId.is_valid(user_id):
+        return jsonify({"error": "invalid id"}), 400
+    user = service.get_user(user_id)
+    if user is None:
+        return jsonify({"error": "not found"}), 404
+    return Response(encode_user(user), mimetype="application/json"), 200
 
 @bp.route("/users/<string:name>", methods=["PUT"])
 def update_user(name):
-    data = request.get_json()
+    shed = _overloaded("update")
+    if shed:
+        return shed
+    try:
+        with STAGE_SECONDS.labels("update", "validation").time():
+            data = validate_user_update(request.get_json(), name)
+    except ValidationError as e:
+        return jsonify({"error": e.errors()}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     modified = service.update_user_by_name(name, data)
     return jsonify({"modified": modified}), 200
 
 @bp.route("/users/<string:name>", methods=["DELETE"])
 def delete_user(name):
+    shed = _overloaded("delete")
+    if shed:
+        return shed
     deleted = service.delete_user_by_name(name)
     return jsonify({"deleted": deleted}), 200
 
 @bp.route("/clear-all", methods=["DELETE"])
 def clear_all_users():
     """Endpoint para limpar todos os usuários do banco"""
+    shed = _overloaded("clear_all")
+    if shed:
+        return shed
     try:
         deleted_count = service.clear_all_users()
         return jsonify({"deleted": deleted_count}), 200
@@ -0,0 +1,24 @@
+# Carregado automaticamente pelo gunicorn (CMD do Dockerfile, diretório de trabalho /app)
+import os
+import sys
+
+# o gunicorn lê este arquivo antes de pôr o diretório do app no sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import METRICS_MULTIPROC_DIR
+from metrics import clear_snapshots, mark_process_dead
+
+def on_starting(server):
+    # snapshots de métricas de uma execução anterior não entram na soma do /metrics
+    if METRICS_MULTIPROC_DIR:
+        clear_snapshots(METRICS_MULTIPROC_DIR)
+
+def post_worker_init(worker):
+    # o import do app não conecta em nada; cada worker sobe as threads de fundo e o warm-up
+    # logo depois de carregar o app, antes do primeiro request
+    worker.wsgi.start_background()
+
+def child_exit(server, worker):
+    # os contadores do worker que saiu continuam somando; os gauges dele saem do /metrics
+    if METRICS_MULTIPROC_DIR:
+        mark_process_dead(METRICS_MULTIPROC_DIR, worker.pid)
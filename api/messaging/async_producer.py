@@ -0,0 +1,79 @@
+import asyncio
+import time
+import uuid
+import aio_pika
+from config import RABBITMQ_HOST, QUEUE_NAME, CRUD_EXCHANGE, PUBLISHER_POOL_SIZE, MESSAGE_CODEC, CRUD_PARTITIONS
+from messaging.codecs import get_codec
+from messaging.partitions import partition_queues, queue_arguments, route
+
+class AsyncProducer:
+    """Producer sobre aio-pika: um canal com publisher confirms e várias publicações em andamento
+
+    Diferente do pika bloqueante, aqui os confirms são esperados em paralelo; o semáforo
+    limita a janela de publicações ainda sem confirmação.
+    """
+
+    def __init__(self, host: str = RABBITMQ_HOST, queue: str = QUEUE_NAME, exchange: str = CRUD_EXCHANGE,
+                 window: int = PUBLISHER_POOL_SIZE, content_type: str = MESSAGE_CODEC,
+                 partitions: int = CRUD_PARTITIONS):
+        self.host = host
+        self.codec = get_codec(content_type)
+        self.queue = queue
+        self.partitions = partitions
+        self.queues = partition_queues(queue, partitions)
+        self.exchange_name = exchange
+        self.window = asyncio.Semaphore(window)
+        self.connection = None
+        self.channel = None
+        self.exchange = None
+        self._lock = asyncio.Lock()
+        # EWMA do tempo de publish até o confirm, lido pelo backpressure
+        self.confirm_ms = None
+        self.confirm_at = 0.0
+
+    async def connect(self):
+        async with self._lock:
+            if self.exchange is not None:
+                return
+            self.connection = await aio_pika.connect_robust(host=self.host)
+            self.channel = await self.connection.channel(publisher_confirms=True)
+            self.exchange = await self.channel.declare_exchange(self.exchange_name, aio_pika.ExchangeType.DIRECT,
+                                                                durable=True)
+            for name in self.queues:
+                queue = await self.channel.declare_queue(name, durable=True, arguments=queue_arguments(self.partitions))
+                await queue.bind(self.exchange, routing_key=name)
+
+    async def publish(self, action: str, data: dict, message_id: str = None):
+        if self.exchange is None:
+            await self.connect()
+        started = time.perf_counter()
+        for partition, part, part_id in route(action, data, message_id or uuid.uuid4().hex, self.partitions):
+            body = self.codec.encode({"action": action, "data": part})
+            async with self.window:
+                await self.exchange.publish(
+                    aio_pika.Message(body=body, delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                                     content_type=self.codec.content_type,
+                                     message_id=part_id,
+                                     headers={"x-persisted": True}),
+                    routing_key=self.queues[partition],
+                    mandatory=True,
+                )
+        ms = (time.perf_counter() - started) * 1000
+        self.confirm_ms = ms if self.confirm_ms is None else self.confirm_ms + 0.2 * (ms - self.confirm_ms)
+        self.confirm_at = time.monotonic()
+
+    def recent_confirm_ms(self, max_age: float):
+        """Latência média recente dos publishes, ou None se não houve publish nos últimos max_age s"""
+        if self.confirm_ms is None or time.monotonic() - self.confirm_at > max_age:
+            return None
+        return self.confirm_ms
+
+    async def ping(self):
+        """Ida e volta ao broker (conecta se preciso): declaração passiva da fila"""
+        if self.exchange is None:
+            await self.connect()
+        await self.channel.declare_queue(self.queues[0], passive=True)
+
+    async def close(self):
+        if self.connection is not None:
+            await self.connection.close()
@@ -0,0 +1,97 @@
+import queue
+import threading
+from contextlib import contextmanager
+import pika
+from pika.exceptions import AMQPError, NackError, UnroutableError
+
+class PoolExhausted(Exception):
+    """Nenhum canal livre dentro do timeout"""
+
+class ChannelPool:
+    """Pool limitado de conexões pika, cada uma com um canal
+
+    pika não é thread-safe: cada canal é emprestado a uma thread por vez. O tamanho
+    do pool limita quantas publicações ficam em andamento ao mesmo tempo.
+    """
+
+    def __init__(self, host: str, size: int, confirms: bool = True, acquire_timeout: float = 5.0, setup=None):
+        self.host = host
+        self.size = size
+        self.confirms = confirms
+        self.acquire_timeout = acquire_timeout
+        self.setup = setup
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        channel = connection.channel()
+        if self.confirms:
+            channel.confirm_delivery()
+        if self.setup:
+            self.setup(channel)
+        return connection, channel
+
+    def _checkout(self):
+        try:
+            connection, channel = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        try:
+            # atende heartbeats pendentes; conexões mortas são descartadas
+            connection.process_data_events(time_limit=0)
+            if channel.is_open:
+                return connection, channel
+        except AMQPError:
+            pass
+        self._discard(connection)
+        return self._connect()
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolExhausted(f"no publisher channel available after {self.acquire_timeout}s")
+        try:
+            connection, channel = self._checkout()
+            try:
+                yield channel
+            except (NackError, UnroutableError):
+                # o broker recusou a mensagem, mas o canal continua válido
+                self._idle.put((connection, channel))
+                raise
+            except AMQPError:
+                self._discard(connection)
+                raise
+            except Exception:
+                if channel.is_open:
+                    self._idle.put((connection, channel))
+                else:
+                    self._discard(connection)
+                raise
+            else:
+                self._idle.put((connection, channel))
+        finally:
+            self._slots.release()
+
+    def warm(self, count: int) -> int:
+        """Abre conexões ociosas até ter count (limitado ao tamanho do pool); devolve quantas abriu"""
+        opened = 0
+        for _ in range(min(count, self.size) - self._idle.qsize()):
+            self._idle.put(self._connect())
+            opened += 1
+        return opened
+
+    def close(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(connection)
@@ -1,41 +1,82 @@
+import time
+import uuid
 import pika
-import json
-from bson import ObjectId
-from config import RABBITMQ_HOST, QUEUE_NAME
+from config import (RABBITMQ_HOST, QUEUE_NAME, CRUD_EXCHANGE, PUBLISHER_POOL_SIZE, PUBLISHER_CONFIRMS,
+                    PUBLISHER_ACQUIRE_TIMEOUT, MESSAGE_CODEC, CRUD_PARTITIONS)
+from messaging.channel_pool import ChannelPool
+from messaging.codecs import get_codec
+from messaging.partitions import partition_queues, queue_arguments, route
 
 class Producer:
-    def __init__(self, host: str = RABBITMQ_HOST, queue: str = QUEUE_NAME):
+    def __init__(self, host: str = RABBITMQ_HOST, queue: str = QUEUE_NAME, exchange: str = CRUD_EXCHANGE,
+                 pool_size: int = PUBLISHER_POOL_SIZE, confirms: bool = PUBLISHER_CONFIRMS,
+                 content_type: str = MESSAGE_CODEC, partitions: int = CRUD_PARTITIONS):
         self.host = host
         self.queue = queue
-        params = pika.ConnectionParameters(host=self.host)
-        self.connection = pika.BlockingConnection(params)
-        self.channel = self.connection.channel()
-        self.channel.queue_declare(queue=self.queue, durable=True)
-
-    def publish(self, action: str, data: dict):
-        # Converter ObjectId para string antes de serializar
-        def convert_objectid(obj):
-            if isinstance(obj, ObjectId):
-                return str(obj)
-            elif isinstance(obj, dict):
-                return {k: convert_objectid(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_objectid(item) for item in obj]
-            return obj
-        
-        # Converter ObjectIds para strings
-        clean_data = convert_objectid(data)
-        message = {"action": action, "data": clean_data}
-        
-        self.channel.basic_publish(
-            exchange='',
-            routing_key=self.queue,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
+        self.exchange = exchange
+        self.partitions = partitions
+        # partição i -> fila/routing key; com uma partição, a própria crud_queue
+        self.queues = partition_queues(queue, partitions)
+        self.codec = get_codec(content_type)
+        # um canal por thread em uso; as conexões são abertas sob demanda
+        self.pool = ChannelPool(self.host, size=pool_size, confirms=confirms,
+                                acquire_timeout=PUBLISHER_ACQUIRE_TIMEOUT, setup=self._declare)
+        # EWMA do tempo de publish (espera por canal + confirm), lido pelo backpressure
+        self.confirm_ms = None
+        self.confirm_at = 0.0
+
+    def _declare(self, channel):
+        channel.exchange_declare(exchange=self.exchange, exchange_type="direct", durable=True)
+        for queue in self.queues:
+            channel.queue_declare(queue=queue, durable=True, arguments=queue_arguments(self.partitions))
+            channel.queue_bind(queue=queue, exchange=self.exchange, routing_key=queue)
+
+    def encode(self, action: str, data: dict) -> bytes:
+        # ObjectId e datetime são convertidos pelo próprio codec
+        return self.codec.encode({"action": action, "data": data})
+
+    def publish(self, action: str, data: dict, message_id: str = None):
+        messages = route(action, data, message_id or uuid.uuid4().hex, self.partitions)
+        started = time.perf_counter()
+        # com confirms, basic_publish só retorna depois do ack do broker
+        # (NackError/UnroutableError se a mensagem não foi aceita)
+        with self.pool.acquire() as channel:
+            for partition, part, part_id in messages:
+                # message_id permite ao worker ignorar reentregas; x-persisted indica que a
+                # escrita já foi feita no Mongo pela API (o worker não insere de novo)
+                properties = pika.BasicProperties(delivery_mode=2, content_type=self.codec.content_type,
+                                                  message_id=part_id, headers={"x-persisted": True})
+                channel.basic_publish(
+                    exchange=self.exchange,
+                    routing_key=self.queues[partition],
+                    body=self.encode(action, part),
+                    properties=properties,
+                    mandatory=self.pool.confirms
+                )
+        self._observe_confirm((time.perf_counter() - started) * 1000)
+
+    def _observe_confirm(self, ms: float):
+        self.confirm_ms = ms if self.confirm_ms is None else self.confirm_ms + 0.2 * (ms - self.confirm_ms)
+        self.confirm_at = time.monotonic()
+
+    def recent_confirm_ms(self, max_age: float):
+        """Latência média recente dos publishes, ou None se não houve publish nos últimos max_age s"""
+        if self.confirm_ms is None or time.monotonic() - self.confirm_at > max_age:
+            return None
+        return self.confirm_ms
+
+    def warm(self, channels: int = 1):
+        """Abre os canais antes do primeiro publish e confere o broker"""
+        self.pool.warm(channels)
+        self.ping()
+
+    def ping(self):
+        """Ida e volta ao broker: declaração passiva da fila (falha se ela não existir)"""
+        with self.pool.acquire() as channel:
+            channel.queue_declare(queue=self.queues[0], passive=True)
 
     def close(self):
         try:
-            self.connection.close()
+            self.pool.close()
         except:
             pass
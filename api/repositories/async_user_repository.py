@@ -0,0 +1,83 @@
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+from typing import Dict, Any, AsyncIterator, List, Optional
+from bson.objectid import ObjectId
+from config import MONGO_URI, STREAM_BATCH_SIZE, MONGO_MIN_POOL_SIZE
+from repositories.indexes import IndexManager
+from repositories.user_repository import (_to_public, build_bulk_requests, build_find, build_stats_pipelines,
+                                          bulk_outcome, stats_result)
+
+class AsyncUserRepository:
+    """Mesmas operações do UserRepository, sobre o driver assíncrono (Motor)"""
+
+    def __init__(self, mongo_uri: str = MONGO_URI, db_name: str = "crud_db"):
+        self.client = AsyncIOMotorClient(mongo_uri, connect=False, minPoolSize=MONGO_MIN_POOL_SIZE)
+        self.db = self.client[db_name]
+        self.collection = self.db["items"]
+        # o IndexManager é síncrono: usa a coleção pymongo por baixo do Motor (rodar fora do event loop)
+        self.indexes = IndexManager(self.collection.delegate)
+
+    async def ping(self, timeout: Optional[float] = None):
+        await asyncio.wait_for(self.client.admin.command("ping"), timeout)
+
+    async def create(self, user: Dict[str, Any]) -> str:
+        res = await self.collection.insert_one(user)
+        return str(res.inserted_id)
+
+    async def read_all(self, **query) -> List[Dict[str, Any]]:
+        return [doc async for doc in self.iter_all(**query)]
+
+    async def read_page(self, after: Optional[str] = None, limit: int = 100, **query) -> List[Dict[str, Any]]:
+        mongo_filter, projection, order = build_find(after=after, **query)
+        cursor = self.collection.find(mongo_filter, projection).sort(order).limit(limit)
+        return [_to_public(doc) async for doc in cursor]
+
+    async def iter_all(self, after: Optional[str] = None, batch_size: int = STREAM_BATCH_SIZE, **query) -> AsyncIterator[Dict[str, Any]]:
+        mongo_filter, projection, order = build_find(after=after, **query)
+        cursor = self.collection.find(mongo_filter, projection).sort(order).batch_size(batch_size)
+        try:
+            async for doc in cursor:
+                yield _to_public(doc)
+        finally:
+            await cursor.close()
+
+    async def stats(self, filters: Optional[Dict[str, Dict[str, Any]]] = None,
+                    buckets: Optional[List[int]] = None) -> Dict[str, Any]:
+        summary, histogram = build_stats_pipelines(filters, buckets)
+        summary_rows = await self.collection.aggregate(summary).to_list(None)
+        histogram_rows = await self.collection.aggregate(histogram).to_list(None) if histogram else None
+        return stats_result(summary_rows, histogram_rows, buckets)
+
+    async def estimated_count(self) -> int:
+        return await self.collection.estimated_document_count()
+
+    async def read_by_id(self, _id: str) -> Optional[Dict[str, Any]]:
+        doc = await self.collection.find_one({"_id": ObjectId(_id)})
+        if not doc:
+            return None
+        return _to_public(doc)
+
+    async def update_by_name(self, name: str, data: Dict[str, Any]) -> int:
+        res = await self.collection.update_one({"name": name}, {"$set": data})
+        return res.modified_count
+
+    async def delete_by_name(self, name: str) -> int:
+        res = await self.collection.delete_one({"name": name})
+        return res.deleted_count
+
+    async def bulk_apply(self, ops: List[Dict[str, Any]], ordered: bool = True) -> Dict[str, Any]:
+        requests, results = build_bulk_requests(ops)
+        if not requests:
+            return bulk_outcome(results, {}, ordered)
+        try:
+            res = await self.collection.bulk_write(requests, ordered=ordered)
+            details = res.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+        return bulk_outcome(results, details, ordered)
+
+    async def clear_all(self) -> int:
+        """Remove todos os documentos da coleção"""
+        res = await self.collection.delete_many({})
+        return res.deleted_count
@@ -0,0 +1,75 @@
+import logging
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Índices da coleção items (o mesmo arquivo existe em api/ e worker/)
+INDEXES = [
+    IndexModel([("name", ASCENDING)], name="name_1"),
+    IndexModel([("email", ASCENDING)], name="email_1"),
+    # faixa de value e ordenação por value (_id desempata, nas duas direções)
+    IndexModel([("value", ASCENDING), ("_id", ASCENDING)], name="value_1__id_1"),
+]
+
+# Consultas quentes conferidas com explain(): nome -> (filtro, ordenação)
+HOT_QUERIES = {
+    "by_name": ({"name": "__index_probe__"}, None),
+    "by_id": ({"_id": ObjectId("000000000000000000000000")}, None),
+    "page_by_id": ({"_id": {"$gt": ObjectId("000000000000000000000000")}}, [("_id", ASCENDING)]),
+    "by_email": ({"email": "__index_probe__"}, None),
+    "value_range": ({"value": {"$gte": 0, "$lte": 0}}, [("_id", ASCENDING)]),
+    "top_by_value": ({}, [("value", DESCENDING), ("_id", DESCENDING)]),
+}
+
+def _plan_stages(plan):
+    """Coleta todos os 'stage' de um plano do explain(), em qualquer nível"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+class IndexManager:
+    def __init__(self, collection, indexes=INDEXES, hot_queries=HOT_QUERIES):
+        self.collection = collection
+        self.indexes = indexes
+        self.hot_queries = hot_queries
+        self.report = {"indexes": [], "query_plans": {}, "collscans": []}
+
+    def ensure(self):
+        """Cria os índices declarados (idempotente) e confere os planos das consultas quentes"""
+        try:
+            self.report["indexes"] = self.collection.create_indexes(self.indexes)
+        except PyMongoError as e:
+            logger.warning("could not create indexes: %s", e)
+            self.report["error"] = str(e)
+            return self.report
+        self.check_query_plans()
+        return self.report
+
+    def check_query_plans(self):
+        plans, collscans = {}, []
+        for name, (query, sort) in self.hot_queries.items():
+            try:
+                cursor = self.collection.find(query)
+                if sort:
+                    cursor = cursor.sort(sort)
+                explain = cursor.limit(1).explain()
+            except PyMongoError as e:
+                plans[name] = {"error": str(e)}
+                continue
+            stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+            plans[name] = {"stages": stages}
+            if "COLLSCAN" in stages:
+                collscans.append(name)
+                logger.warning("hot query %r runs as COLLSCAN: %s", name, stages)
+        self.report["query_plans"] = plans
+        self.report["collscans"] = collscans
+        return plans
@@ -0,0 +1,105 @@
+import logging
+import time
+import uuid
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import DuplicateKeyError
+from typing import Any, Callable, Dict, List, Optional
+from config import MONGO_URI, OUTBOX_TRANSACTIONS
+
+logger = logging.getLogger(__name__)
+
+class OutboxRepository:
+    """Eventos pendentes de publicação, gravados junto com a escrita do usuário
+
+    Cada registro é {"action", "data", "message_id", "created_at", "lease_until", "lease_owner"};
+    lease_until == 0 indica registro livre para o relay. O message_id é fixado na gravação,
+    então um registro republicado depois de uma falha chega ao worker com o mesmo id.
+    Um só relay publica de cada vez (lead), para os lotes de relays diferentes não se misturarem.
+    """
+
+    LOCK_ID = "outbox_relay"
+
+    def __init__(self, client: MongoClient = None, mongo_uri: str = MONGO_URI, db_name: str = "crud_db",
+                 transactions: bool = OUTBOX_TRANSACTIONS):
+        # o mesmo client do UserRepository, para que as duas escritas caibam numa transação
+        self.client = client or MongoClient(mongo_uri)
+        self.collection = self.client[db_name]["outbox"]
+        self.locks = self.client[db_name]["outbox_lock"]
+        self.transactions = transactions
+        if not transactions:
+            logger.warning("outbox without transactions (OUTBOX_TRANSACTIONS=0): the user write and the outbox "
+                           "record are separate writes, and a crash between them loses the event")
+
+    def check_transactions(self):
+        """Falha se o Mongo não aceita transações (standalone), em vez de deixar cada escrita falhar"""
+        hello = self.client.admin.command("hello")
+        if not hello.get("setName") and hello.get("msg") != "isdbgrid":
+            raise RuntimeError("OUTBOX_TRANSACTIONS=1 requires a replica set or mongos; "
+                               "OUTBOX_TRANSACTIONS=0 accepts outbox writes that are not crash-safe")
+
+    def ensure_indexes(self):
+        self.collection.create_index([("lease_until", ASCENDING)], name="lease_until_1")
+
+    def run(self, write: Callable[[Any], Any]):
+        """Executa write(session) numa transação quando habilitado; senão sem sessão"""
+        if not self.transactions:
+            return write(None)
+        with self.client.start_session() as session:
+            return session.with_transaction(write)
+
+    def lead(self, owner: str, lease_seconds: float) -> bool:
+        """Assume ou renova a liderança do relay; False enquanto outro relay tem o lease"""
+        now = time.time()
+        try:
+            # com o lease de outro relay em vigor o filtro não casa e o upsert colide no _id
+            self.locks.find_one_and_update(
+                {"_id": self.LOCK_ID, "$or": [{"owner": owner}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"owner": owner, "lease_until": now + lease_seconds}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def resign(self, owner: str):
+        """Solta a liderança (relay parando), sem esperar o lease vencer"""
+        self.locks.update_one({"_id": self.LOCK_ID, "owner": owner}, {"$set": {"lease_until": 0}})
+
+    def add(self, action: str, data: Dict[str, Any], session=None):
+        self.collection.insert_one(
+            {"action": action, "data": data, "message_id": uuid.uuid4().hex, "created_at": time.time(),
+             "lease_until": 0, "lease_owner": None},
+            session=session,
+        )
+
+    def claim(self, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """Reserva até limit registros livres (ou com lease vencido), na ordem de gravação"""
+        now = time.time()
+        free = {"lease_until": {"$lt": now}}
+        ids = [doc["_id"] for doc in self.collection.find(free, {"_id": 1}).sort("_id", ASCENDING).limit(limit)]
+        if not ids:
+            return []
+        owner = uuid.uuid4().hex
+        # outro relay pode ter reservado parte dos ids entre o find e o update
+        self.collection.update_many(
+            {"_id": {"$in": ids}, **free},
+            {"$set": {"lease_until": now + lease_seconds, "lease_owner": owner}},
+        )
+        return list(self.collection.find({"_id": {"$in": ids}, "lease_owner": owner}).sort("_id", ASCENDING))
+
+    def delete(self, ids: List[Any]) -> int:
+        if not ids:
+            return 0
+        return self.collection.delete_many({"_id": {"$in": ids}}).deleted_count
+
+    def release(self, ids: List[Any]):
+        """Devolve registros reservados e não publicados"""
+        if ids:
+            self.collection.update_many({"_id": {"$in": ids}}, {"$set": {"lease_until": 0, "lease_owner": None}})
+
+    def pending(self) -> int:
+        return self.collection.estimated_document_count()
+
+    def oldest_created_at(self) -> Optional[float]:
+        doc = self.collection.find_one({}, {"created_at": 1}, sort=[("_id", ASCENDING)])
+        return doc["created_at"] if doc else None
@@ -1,44 +1,189 @@
-from pymongo import MongoClient
-from typing import Dict, Any, List, Optional
+import pymongo
+from pymongo import MongoClient, ASCENDING, InsertOne, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
 from bson.objectid import ObjectId
-from config import MONGO_URI
+from config import MONGO_URI, STREAM_BATCH_SIZE, MONGO_MIN_POOL_SIZE
+from repositories.indexes import IndexManager
+
+def _to_public(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Troca o _id (ObjectId) do documento pelo campo id (string)"""
+    if "_id" in doc:
+        doc["id"] = str(doc.pop("_id"))
+    return doc
+
+def build_find(after: Optional[str] = None, filters: Optional[Dict[str, Dict[str, Any]]] = None,
+               fields: Optional[Sequence[str]] = None, sort: Optional[Tuple[str, int]] = None):
+    """Filtro, projeção e ordenação do find a partir da consulta validada em parse_list_query"""
+    query = {field: {f"${op}": value for op, value in conds.items()} for field, conds in (filters or {}).items()}
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+    projection = None
+    if fields:
+        projection = {"_id": 1, **{field: 1 for field in fields if field != "id"}}
+    if sort is None:
+        order = [("_id", ASCENDING)]
+    else:
+        # _id desempata; o índice (value, _id) atende as duas direções
+        field, direction = sort
+        order = [(field, direction), ("_id", direction)]
+    return query, projection, order
+
+def build_stats_pipelines(filters: Optional[Dict[str, Dict[str, Any]]] = None,
+                          buckets: Optional[List[int]] = None):
+    """Pipelines de agregação de value: resumo (count/sum/avg/min/max) e histograma opcional"""
+    match, _, _ = build_find(filters=filters)
+    prefix = [{"$match": match}] if match else []
+    summary = prefix + [{"$group": {
+        "_id": None,
+        "count": {"$sum": 1},
+        "sum": {"$sum": "$value"},
+        "avg": {"$avg": "$value"},
+        "min": {"$min": "$value"},
+        "max": {"$max": "$value"},
+    }}]
+    histogram = None
+    if buckets:
+        # fora dos limites (ou sem value) cai em "other"
+        histogram = prefix + [{"$bucket": {"groupBy": "$value", "boundaries": buckets, "default": "other",
+                                           "output": {"count": {"$sum": 1}}}}]
+    return summary, histogram
+
+def stats_result(summary: List[Dict[str, Any]], histogram: Optional[List[Dict[str, Any]]],
+                 buckets: Optional[List[int]]) -> Dict[str, Any]:
+    """Monta a resposta de stats a partir do resultado das agregações"""
+    row = summary[0] if summary else {}
+    result = {"count": row.get("count", 0), "approx": False,
+              "value": {k: row.get(k) for k in ("sum", "avg", "min", "max")}}
+    if buckets:
+        counts = {b["_id"]: b["count"] for b in histogram}
+        result["histogram"] = {
+            "buckets": [{"min": lo, "max": hi, "count": counts.get(lo, 0)} for lo, hi in zip(buckets, buckets[1:])],
+            "other": counts.get("other", 0),
+        }
+    return result
+
+def build_bulk_requests(ops: List[Dict[str, Any]]):
+    """Monta as operações do bulk_write e o resultado inicial de cada op"""
+    requests = []
+    results = []
+    for index, op in enumerate(ops):
+        result = {"index": index, "op": op["op"], "status": "ok"}
+        if op["op"] == "create":
+            doc = dict(op["data"])
+            doc["_id"] = ObjectId()
+            result["id"] = str(doc["_id"])
+            requests.append(InsertOne(doc))
+        elif op["op"] == "update":
+            requests.append(UpdateOne({"name": op["name"]}, {"$set": op["data"]}))
+        elif op["op"] == "delete":
+            requests.append(DeleteOne({"name": op["name"]}))
+        else:
+            raise ValueError(f"unknown op: {op['op']}")
+        results.append(result)
+    return requests, results
+
+def bulk_outcome(results: List[Dict[str, Any]], details: Dict[str, Any], ordered: bool) -> Dict[str, Any]:
+    """Marca as ops com erro (e as puladas, no bulk ordenado) a partir do resultado do bulk_write"""
+    failed = {err["index"]: err.get("errmsg", "write error") for err in details.get("writeErrors", [])}
+    for index, errmsg in failed.items():
+        results[index]["status"] = "error"
+        results[index]["error"] = errmsg
+    if ordered and failed:
+        # bulk ordenado para no primeiro erro: o resto não foi executado
+        for result in results[min(failed) + 1:]:
+            result["status"] = "skipped"
+    for result in results:
+        if result["status"] != "ok":
+            result.pop("id", None)
+    return {
+        "results": results,
+        "inserted": details.get("nInserted", 0),
+        "modified": details.get("nModified", 0),
+        "deleted": details.get("nRemoved", 0),
+    }
 
 class UserRepository:
     def __init__(self, mongo_uri: str = MONGO_URI, db_name: str = "crud_db"):
-        self.client = MongoClient(mongo_uri)
+        # connect=False: o monitoramento do servidor só começa na primeira operação
+        self.client = MongoClient(mongo_uri, connect=False, minPoolSize=MONGO_MIN_POOL_SIZE)
         self.db = self.client[db_name]
         self.collection = self.db["items"]
+        self.indexes = IndexManager(self.collection)
+
+    def ping(self, timeout: Optional[float] = None):
+        """Ida e volta ao servidor (também abre a primeira conexão do pool)"""
+        with pymongo.timeout(timeout):
+            self.client.admin.command("ping")
 
-    def create(self, user: Dict[str, Any]) -> str:
-        res = self.collection.insert_one(user)
+    def create(self, user: Dict[str, Any], session=None) -> str:
+        res = self.collection.insert_one(user, session=session)
         return str(res.inserted_id)
 
-    def read_all(self) -> List[Dict[str, Any]]:
-        docs = list(self.collection.find({}))
-        # Converter ObjectId para string
-        for doc in docs:
-            if "_id" in doc:
-                doc["id"] = str(doc["_id"])
-                del doc["_id"]
-        return docs
+    def read_all(self, **query) -> List[Dict[str, Any]]:
+        return list(self.iter_all(**query))
+
+    def read_page(self, after: Optional[str] = None, limit: int = 100, **query) -> List[Dict[str, Any]]:
+        """Lê uma página ordenada por _id (ou pelo sort), começando depois do id informado
+
+        query aceita filters, fields e sort (ver build_find).
+        """
+        mongo_filter, projection, order = build_find(after=after, **query)
+        cursor = self.collection.find(mongo_filter, projection).sort(order).limit(limit)
+        return [_to_public(doc) for doc in cursor]
+
+    def iter_all(self, after: Optional[str] = None, batch_size: int = STREAM_BATCH_SIZE, **query) -> Iterator[Dict[str, Any]]:
+        """Percorre a coleção pelo cursor, sem carregar tudo em memória"""
+        mongo_filter, projection, order = build_find(after=after, **query)
+        cursor = self.collection.find(mongo_filter, projection).sort(order).batch_size(batch_size)
+        try:
+            for doc in cursor:
+                yield _to_public(doc)
+        finally:
+            cursor.close()
+
+    def stats(self, filters: Optional[Dict[str, Dict[str, Any]]] = None,
+              buckets: Optional[List[int]] = None) -> Dict[str, Any]:
+        """count e sum/avg/min/max de value (e histograma) calculados no servidor"""
+        summary, histogram = build_stats_pipelines(filters, buckets)
+        return stats_result(list(self.collection.aggregate(summary)),
+                            list(self.collection.aggregate(histogram)) if histogram else None, buckets)
+
+    def estimated_count(self) -> int:
+        """Contagem pelos metadados da coleção, sem varrer documentos"""
+        return self.collection.estimated_document_count()
 
     def read_by_id(self, _id: str) -> Optional[Dict[str, Any]]:
         doc = self.collection.find_one({"_id": ObjectId(_id)})
         if not doc:
             return None
-        doc["id"] = str(doc["_id"])
-        doc.pop("_id", None)
-        return doc
+        return _to_public(doc)
 
-    def update_by_name(self, name: str, data: Dict[str, Any]) -> int:
-        res = self.collection.update_one({"name": name}, {"$set": data})
+    def update_by_name(self, name: str, data: Dict[str, Any], session=None) -> int:
+        res = self.collection.update_one({"name": name}, {"$set": data}, session=session)
         return res.modified_count
 
-    def delete_by_name(self, name: str) -> int:
-        res = self.collection.delete_one({"name": name})
+    def delete_by_name(self, name: str, session=None) -> int:
+        res = self.collection.delete_one({"name": name}, session=session)
         return res.deleted_count
 
-    def clear_all(self) -> int:
+    def bulk_apply(self, ops: List[Dict[str, Any]], ordered: bool = True, session=None) -> Dict[str, Any]:
+        """Aplica create/update/delete num único bulk_write e devolve o resultado de cada op
+
+        Cada op é {"op": "create", "data": {...}}, {"op": "update", "name": ..., "data": {...}}
+        ou {"op": "delete", "name": ...}.
+        """
+        requests, results = build_bulk_requests(ops)
+        if not requests:
+            return bulk_outcome(results, {}, ordered)
+        try:
+            res = self.collection.bulk_write(requests, ordered=ordered, session=session)
+            details = res.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+        return bulk_outcome(results, details, ordered)
+
+    def clear_all(self, session=None) -> int:
         """Remove todos os documentos da coleção"""
-        res = self.collection.delete_many({})
+        res = self.collection.delete_many({}, session=session)
         return res.deleted_count
@@ -0,0 +1,224 @@
+from bson import ObjectId
+from pydantic import ValidationError
+from models.user_model import User
+from messaging.codecs import get_codec
+from config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, BATCH_MAX_OPS, STATS_MAX_BUCKETS
+
+# Validação de entrada compartilhada pelos controllers sync (Flask) e async (Quart)
+
+_MISSING = object()
+
+def _builtin_type(type_):
+    # constr()/Field(min_length=...) viram subclasses (ConstrainedStrValue); o valor do JSON é o tipo base
+    return next((t for t in type_.__mro__ if t.__module__ == "builtins" and t is not object), type_)
+
+def _field_specs(model):
+    """(nome, tipo, obrigatório, aceita None, min_length) de cada campo, lidos uma vez do modelo"""
+    return tuple(
+        (name, _builtin_type(field.type_), field.required, field.allow_none, getattr(field.field_info, "min_length", None))
+        for name, field in model.__fields__.items()
+    )
+
+def _fast_value(value, type_, min_length):
+    # só aceita direto o tipo exato (bool não passa por int); o resto vai para o pydantic
+    return type(value) is type_ and (min_length is None or len(value) >= min_length)
+
+def compile_create_validator(model):
+    """Validador de criação: dict pronto para gravar (sem None), igual a model(**payload).dict(exclude_none=True)
+
+    Payloads com os tipos exatos não instanciam o modelo; qualquer outro caso (coerção,
+    campo obrigatório ausente, valor inválido) passa pelo pydantic, que gera os mesmos
+    dados ou o mesmo ValidationError de antes.
+    """
+    specs = _field_specs(model)
+
+    def validate(payload):
+        if not isinstance(payload, dict):
+            raise ValueError("body must be a JSON object")
+        data = {}
+        for name, type_, required, allow_none, min_length in specs:
+            value = payload.get(name, _MISSING)
+            if value is _MISSING or value is None:
+                if required or (value is None and not allow_none):
+                    break
+                continue
+            if not _fast_value(value, type_, min_length):
+                break
+            data[name] = value
+        else:
+            return data
+        return model(**payload).dict(exclude_none=True)
+    return validate
+
+def compile_update_validator(model, key_field="name"):
+    """Validador de update parcial: só campos do modelo, cada um com o tipo do modelo
+
+    key_field completa os campos obrigatórios ausentes no caminho lento (o update é por nome).
+    """
+    specs = {spec[0]: spec[1:] for spec in _field_specs(model)}
+
+    def validate(data, key):
+        if not isinstance(data, dict) or not data:
+            raise ValueError("'data' must be a non-empty object")
+        unknown = set(data) - set(specs)
+        if unknown:
+            raise ValueError(f"unknown fields: {sorted(unknown)}")
+        for name, value in data.items():
+            type_, required, allow_none, min_length = specs[name]
+            if value is None:
+                if required or not allow_none:
+                    break
+            elif not _fast_value(value, type_, min_length):
+                break
+        else:
+            return dict(data)
+        user = model(**{key_field: key, **data})
+        return {k: getattr(user, k) for k in data}
+    return validate
+
+# montados uma vez no import e usados pelos controllers e pelo batch
+validate_user = compile_create_validator(User)
+validate_user_update = compile_update_validator(User)
+
+_json = get_codec("application/json")
+
+def encode_user(user) -> bytes:
+    """Corpo JSON de um usuário (orjson quando disponível, ObjectId/datetime convertidos)"""
+    return _json.encode(user)
+
+def encode_users(users) -> bytes:
+    return _json.encode(users)
+
+# filtros de GET /api/users: ?campo=valor (igualdade), ?campo_min= e ?campo_max= (faixa, inclusivos)
+FILTER_FIELDS = ("name", "email", "value")
+RANGE_SUFFIXES = {"_min": "gte", "_max": "lte"}
+SORT_FIELDS = ("value",)
+
+def _coerce(field, raw):
+    """Converte o valor da query string para o tipo do campo no modelo User"""
+    if User.__fields__[field].type_ is int:
+        try:
+            return int(raw)
+        except ValueError:
+            raise ValueError(f"'{field}' must be an integer")
+    return raw
+
+def parse_filters(args):
+    """Filtros de igualdade/faixa no formato {campo: {"eq"|"gte"|"lte": valor}}"""
+    filters = {}
+    for field in FILTER_FIELDS:
+        if field in args:
+            filters.setdefault(field, {})["eq"] = _coerce(field, args[field])
+        for suffix, op in RANGE_SUFFIXES.items():
+            if field + suffix in args:
+                filters.setdefault(field, {})[op] = _coerce(field, args[field + suffix])
+    return filters
+
+def parse_fields(raw):
+    """Projeção (?fields=name,value), validada contra os campos do modelo User"""
+    if raw is None:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    if not fields:
+        raise ValueError("'fields' must list at least one field")
+    unknown = set(fields) - set(User.__fields__)
+    if unknown:
+        raise ValueError(f"unknown fields: {sorted(unknown)}")
+    return fields
+
+def parse_sort(raw):
+    """?sort=value (crescente) ou ?sort=-value (decrescente) -> (campo, direção)"""
+    if raw is None:
+        return None
+    field, direction = (raw[1:], -1) if raw.startswith("-") else (raw, 1)
+    if field not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of {list(SORT_FIELDS)} (prefix '-' for descending)")
+    return field, direction
+
+def parse_list_query(args):
+    """Lê after/limit/stream, filtros, fields e sort de GET /api/users; ValueError com a mensagem de erro"""
+    after = args.get("after")
+    if after is not None and not ObjectId.is_valid(after):
+        raise ValueError("invalid 'after' cursor")
+    stream = args.get("stream", "").lower() in ("1", "true", "yes")
+    raw_limit = args.get("limit")
+    if raw_limit is None:
+        # sem limit é a primeira página, nunca a coleção inteira (essa só com stream=1)
+        limit = DEFAULT_PAGE_SIZE
+    else:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    sort = parse_sort(args.get("sort"))
+    if sort is not None and after is not None:
+        # o cursor 'after' é por _id; com ordenação por outro campo use limit (top-N)
+        raise ValueError("'after' cannot be combined with 'sort'")
+    return {"after": after, "limit": limit, "stream": stream,
+            "filters": parse_filters(args), "fields": parse_fields(args.get("fields")), "sort": sort}
+
+def parse_stats_query(args):
+    """Lê filtros, buckets (limites do histograma de value) e approx de GET /api/users/stats"""
+    filters = parse_filters(args)
+    approx = args.get("approx", "").lower() in ("1", "true", "yes")
+    if approx and filters:
+        raise ValueError("'approx' only counts the whole collection (no filters)")
+    buckets = None
+    raw = args.get("buckets")
+    if raw:
+        try:
+            buckets = [int(b) for b in raw.split(",")]
+        except ValueError:
+            raise ValueError("buckets must be a comma-separated list of integers")
+        if len(buckets) < 2 or len(buckets) > STATS_MAX_BUCKETS + 1:
+            raise ValueError(f"buckets must have between 2 and {STATS_MAX_BUCKETS + 1} boundaries")
+        if any(a >= b for a, b in zip(buckets, buckets[1:])):
+            raise ValueError("bucket boundaries must be strictly increasing")
+        if approx:
+            raise ValueError("'approx' cannot be combined with 'buckets'")
+    return {"filters": filters, "buckets": buckets, "approx": approx}
+
+def validate_batch_op(raw):
+    """Valida uma op do batch com o modelo User e devolve a op normalizada"""
+    if not isinstance(raw, dict):
+        raise ValueError("op must be an object")
+    kind = raw.get("op")
+    if kind == "create":
+        return {"op": "create", "data": validate_user(raw.get("data") or {})}
+    if kind in ("update", "delete"):
+        name = raw.get("name")
+        if not isinstance(name, str) or not name:
+            raise ValueError("'name' is required")
+        if kind == "delete":
+            return {"op": "delete", "name": name}
+        return {"op": "update", "name": name, "data": validate_user_update(raw.get("data"), name)}
+    raise ValueError("'op' must be one of create, update, delete")
+
+def validate_batch(payload):
+    """Valida o corpo de POST /api/users/batch; devolve (ops, erros)"""
+    if not isinstance(payload, list) or not payload:
+        return [], "body must be a non-empty array of ops"
+    if len(payload) > BATCH_MAX_OPS:
+        return [], f"at most {BATCH_MAX_OPS} ops per batch"
+    ops, errors = [], []
+    for index, raw in enumerate(payload):
+        try:
+            ops.append(validate_batch_op(raw))
+        except ValidationError as e:
+            errors.append({"index": index, "error": e.errors()})
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+    return ops, errors or None
+
+def stream_json_array(items):
+    """Escreve o array JSON item a item, a partir do cursor"""
+    yield b"["
+    first = True
+    for item in items:
+        if not first:
+            yield b","
+        first = False
+        yield encode_user(item)
+    yield b"]"
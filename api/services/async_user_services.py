@@ -0,0 +1,119 @@
+from repositories.async_user_repository import AsyncUserRepository
+from messaging.async_producer import AsyncProducer
+from services.cache import TTLCache
+from services.user_services import STAGE_SECONDS, batch_messages, invalidate_write, page_copy, query_key
+from config import CACHE_ENABLED, CACHE_MAXSIZE, CACHE_TTL, STATS_CACHE_TTL
+
+_MISSING = object()
+
+class AsyncUserService:
+    """Versão assíncrona do UserService, com o mesmo cache e as mesmas mensagens
+
+    Sem outbox: publica direto no broker (o async_app recusa OUTBOX_ENABLED).
+    """
+
+    def __init__(self, repo: AsyncUserRepository = None, producer: AsyncProducer = None,
+                 cache_enabled: bool = CACHE_ENABLED):
+        self.repo = repo or AsyncUserRepository()
+        self.producer = producer or AsyncProducer()
+        self.cache_enabled = cache_enabled
+        self.list_cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+        self.item_cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+        self.stats_cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=STATS_CACHE_TTL)
+
+    def invalidate_cache(self):
+        self.list_cache.clear()
+        self.item_cache.clear()
+
+    def invalidate_for(self, action: str, data: dict):
+        invalidate_write(self.list_cache, self.item_cache, action, data)
+
+    def cache_stats(self):
+        return {"enabled": self.cache_enabled, "list": self.list_cache.stats(), "item": self.item_cache.stats(),
+                "stats": self.stats_cache.stats()}
+
+    async def _cached(self, cache, key, loader):
+        if not self.cache_enabled:
+            return await loader()
+        # None também fica em cache (usuário inexistente), como no get_or_load do UserService
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = await loader()
+            cache.set(key, value)
+        return value
+
+    async def create_user(self, user: dict):
+        with STAGE_SECONDS.labels("create", "mongo").time():
+            inserted_id = await self.repo.create(user)
+        data = user.copy()
+        data["id"] = inserted_id
+        self.invalidate_for("create", data)
+        with STAGE_SECONDS.labels("create", "publish").time():
+            await self.producer.publish("create", data)
+        return inserted_id
+
+    async def list_users(self, after: str = None, limit: int = None, **query):
+        async def loader():
+            with STAGE_SECONDS.labels("list", "mongo").time():
+                if limit is None:
+                    return await self.repo.read_all(after=after, **query)
+                return await self.repo.read_page(after=after, limit=limit, **query)
+        if limit is None:
+            # sem limit é a coleção inteira: não vai para o cache
+            return await loader()
+        async def page_loader():
+            return tuple(await loader())
+        return page_copy(await self._cached(self.list_cache, ("page", after, limit, query_key(query)), page_loader))
+
+    def iter_users(self, after: str = None, **query):
+        return self.repo.iter_all(after=after, **query)
+
+    async def user_stats(self, filters: dict = None, buckets: list = None, approx: bool = False):
+        async def loader():
+            with STAGE_SECONDS.labels("stats", "mongo").time():
+                if approx:
+                    return {"count": await self.repo.estimated_count(), "approx": True}
+                return await self.repo.stats(filters=filters, buckets=buckets)
+        key = ("stats", approx, query_key({"filters": filters, "buckets": buckets}))
+        return await self._cached(self.stats_cache, key, loader)
+
+    async def get_user(self, user_id: str):
+        async def loader():
+            with STAGE_SECONDS.labels("get", "mongo").time():
+                return await self.repo.read_by_id(user_id)
+        return await self._cached(self.item_cache, user_id, loader)
+
+    async def update_user_by_name(self, name: str, data: dict):
+        with STAGE_SECONDS.labels("update", "mongo").time():
+            modified = await self.repo.update_by_name(name, data)
+        self.invalidate_for("update", {"name": name, "new_data": data})
+        with STAGE_SECONDS.labels("update", "publish").time():
+            await self.producer.publish("update", {"name": name, "new_data": data})
+        return modified
+
+    async def delete_user_by_name(self, name: str):
+        with STAGE_SECONDS.labels("delete", "mongo").time():
+            deleted = await self.repo.delete_by_name(name)
+        self.invalidate_for("delete", {"name": name})
+        with STAGE_SECONDS.labels("delete", "publish").time():
+            await self.producer.publish("delete", {"name": name})
+        return deleted
+
+    async def apply_batch(self, ops: list, ordered: bool = True):
+        with STAGE_SECONDS.labels("batch", "mongo").time():
+            outcome = await self.repo.bulk_apply(ops, ordered=ordered)
+        messages = batch_messages(ops, outcome["results"])
+        self.invalidate_for("batch", {"ops": messages})
+        if messages:
+            with STAGE_SECONDS.labels("batch", "publish").time():
+                await self.producer.publish("batch", {"ops": messages})
+        return outcome
+
+    async def clear_all_users(self):
+        """Remove todos os usuários do banco"""
+        with STAGE_SECONDS.labels("clear_all", "mongo").time():
+            deleted_count = await self.repo.clear_all()
+        self.invalidate_cache()
+        with STAGE_SECONDS.labels("clear_all", "publish").time():
+            await self.producer.publish("clear_all", {"deleted_count": deleted_count})
+        return deleted_count
@@ -0,0 +1,169 @@
+import logging
+import math
+import threading
+import time
+import pika
+from pika.exceptions import AMQPError
+from metrics import REGISTRY
+from config import (RABBITMQ_HOST, QUEUE_NAME, CRUD_PARTITIONS, BACKPRESSURE_SHED_DEPTH, BACKPRESSURE_REJECT_DEPTH,
+                    BACKPRESSURE_SHED_CONFIRM_MS, BACKPRESSURE_REJECT_CONFIRM_MS, BACKPRESSURE_RECOVERY,
+                    BACKPRESSURE_RETRY_AFTER, BACKPRESSURE_MAX_RETRY_AFTER, BACKPRESSURE_LOW_PRIORITY,
+                    BACKPRESSURE_INTERVAL)
+from messaging.partitions import partition_queues
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("ok", "shed", "reject")
+
+BACKPRESSURE_LEVEL = REGISTRY.gauge("api_backpressure_level", "Nível de backpressure (0 ok, 1 shed, 2 reject)")
+QUEUE_DEPTH = REGISTRY.gauge("api_crud_queue_depth", "Mensagens prontas na crud_queue (soma das partições)")
+SHED_TOTAL = REGISTRY.counter("api_shed_total", "Escritas recusadas com 429 por backpressure", ("operation",))
+
+class Backpressure:
+    """Nível de carga dos workers, a partir da profundidade da crud_queue e da latência dos confirms
+
+    ok: tudo passa. shed: as operações de baixa prioridade (clear_all, batch) recebem 429.
+    reject: toda escrita recebe 429. Para sair de um nível os sinais precisam cair abaixo de
+    recovery x limite (histerese), para o nível não oscilar a cada amostra. Limite 0 desliga
+    o sinal correspondente.
+    """
+
+    def __init__(self, shed_depth: int = BACKPRESSURE_SHED_DEPTH, reject_depth: int = BACKPRESSURE_REJECT_DEPTH,
+                 shed_confirm_ms: float = BACKPRESSURE_SHED_CONFIRM_MS,
+                 reject_confirm_ms: float = BACKPRESSURE_REJECT_CONFIRM_MS, recovery: float = BACKPRESSURE_RECOVERY,
+                 retry_after: int = BACKPRESSURE_RETRY_AFTER, max_retry_after: int = BACKPRESSURE_MAX_RETRY_AFTER,
+                 low_priority=BACKPRESSURE_LOW_PRIORITY):
+        self.thresholds = ((shed_depth, shed_confirm_ms), (reject_depth, reject_confirm_ms))
+        self.recovery = recovery
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self.low_priority = frozenset(low_priority)
+        self.level = 0
+        self.depth = None
+        self.confirm_ms = None
+        self.drain_rate = None
+        self._last_sample = None
+        self._lock = threading.Lock()
+        self.shed = {}
+
+    @staticmethod
+    def _above(value, limit, scale):
+        return bool(limit) and value is not None and value >= limit * scale
+
+    def _level_for(self, depth, confirm_ms, scale):
+        level = 0
+        for i, (depth_limit, confirm_limit) in enumerate(self.thresholds, start=1):
+            if self._above(depth, depth_limit, scale) or self._above(confirm_ms, confirm_limit, scale):
+                level = i
+        return level
+
+    def update(self, depth=None, confirm_ms=None, now=None):
+        """Nova amostra (None = sinal indisponível); devolve o nível resultante"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if depth is not None and self._last_sample is not None:
+                last_depth, last_at = self._last_sample
+                if now > last_at and depth < last_depth:
+                    # vazão de drenagem observada (EWMA), usada no Retry-After
+                    rate = (last_depth - depth) / (now - last_at)
+                    self.drain_rate = rate if self.drain_rate is None else self.drain_rate + 0.3 * (rate - self.drain_rate)
+            if depth is not None:
+                self._last_sample = (depth, now)
+            self.depth, self.confirm_ms = depth, confirm_ms
+            level = self._level_for(depth, confirm_ms, 1.0)
+            if level < self.level:
+                level = max(level, min(self.level, self._level_for(depth, confirm_ms, self.recovery)))
+            if level != self.level:
+                logger.warning("backpressure %s -> %s (depth=%s, confirm_ms=%s)",
+                               LEVELS[self.level], LEVELS[level], depth, confirm_ms)
+            self.level = level
+        BACKPRESSURE_LEVEL.set(level)
+        if depth is not None:
+            QUEUE_DEPTH.set(depth)
+        return level
+
+    def retry_after_seconds(self) -> int:
+        """Tempo estimado até a fila voltar abaixo do limite de recuperação"""
+        shed_depth = self.thresholds[0][0]
+        if self.depth is None or not self.drain_rate or not shed_depth:
+            return self.retry_after
+        excess = self.depth - shed_depth * self.recovery
+        if excess <= 0:
+            return self.retry_after
+        return max(1, min(self.max_retry_after, math.ceil(excess / self.drain_rate)))
+
+    def admit(self, operation: str):
+        """None se a escrita pode seguir; senão os segundos do Retry-After"""
+        level = self.level
+        if level == 0 or (level == 1 and operation not in self.low_priority):
+            return None
+        SHED_TOTAL.labels(operation).inc()
+        with self._lock:
+            self.shed[operation] = self.shed.get(operation, 0) + 1
+        return self.retry_after_seconds()
+
+    def stats(self):
+        with self._lock:
+            return {"level": LEVELS[self.level], "depth": self.depth, "confirm_ms": self.confirm_ms,
+                    "drain_rate": round(self.drain_rate, 3) if self.drain_rate else None, "shed": dict(self.shed)}
+
+# estado compartilhado pelos controllers; o QueueDepthSampler (iniciado pelo app) atualiza
+backpressure = Backpressure()
+
+class QueueDepthSampler(threading.Thread):
+    """Amostra em background a profundidade das partições (queue_declare passivo) e a latência dos confirms
+
+    Usa uma conexão própria, fora do pool do Producer. Sem broker, a profundidade fica
+    indisponível e o nível passa a depender só da latência dos confirms.
+    """
+
+    def __init__(self, backpressure: Backpressure, confirm_latency, host: str = RABBITMQ_HOST,
+                 queues=None, interval: float = BACKPRESSURE_INTERVAL, retry_delay: float = 5.0):
+        super().__init__(name="backpressure-sampler", daemon=True)
+        self.backpressure = backpressure
+        # callable: latência recente dos confirms em ms, ou None sem publicações recentes
+        self.confirm_latency = confirm_latency
+        self.host = host
+        self.queues = queues or partition_queues(QUEUE_NAME, CRUD_PARTITIONS)
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self._sample_forever()
+            except AMQPError as e:
+                logger.warning("backpressure sampler disconnected: %s", e)
+            except Exception:
+                logger.exception("backpressure sampler failed")
+            self._sample(None)
+            self._stopped.wait(self.retry_delay)
+
+    def _sample_forever(self):
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        try:
+            channel = connection.channel()
+            while not self._stopped.is_set():
+                depth = 0
+                for queue in self.queues:
+                    # passivo: só lê o message_count (fila inexistente fecha o canal e o sampler reconecta)
+                    depth += int(channel.queue_declare(queue=queue, passive=True).method.message_count)
+                self._sample(depth)
+                # o queue_declare de cada amostra já processa o I/O (heartbeats) da conexão
+                self._stopped.wait(self.interval)
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _sample(self, depth):
+        try:
+            confirm_ms = self.confirm_latency()
+        except Exception:
+            confirm_ms = None
+        self.backpressure.update(depth, confirm_ms)
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,65 @@
+import logging
+import threading
+import pika
+from pika.exceptions import AMQPError
+from config import RABBITMQ_HOST, QUEUE_NAME, CRUD_EXCHANGE, CRUD_PARTITIONS
+from messaging.codecs import get_codec
+from messaging.partitions import partition_queues
+
+logger = logging.getLogger(__name__)
+
+class CacheInvalidationListener(threading.Thread):
+    """Escuta os eventos de crud_events e invalida o cache desta réplica
+
+    Usa uma fila exclusiva (apagada quando a réplica sai) ligada às mesmas routing keys
+    de crud_queue (todas as partições), então não concorre com os workers pelas mensagens.
+    on_event(action, data) recebe a escrita, para invalidar só o que ela pode ter mudado;
+    os eventos de monitor_events não mudam dados e não são ouvidos.
+    """
+
+    def __init__(self, on_event, host: str = RABBITMQ_HOST, retry_delay: float = 5.0):
+        super().__init__(name="cache-invalidation", daemon=True)
+        self.on_event = on_event
+        self.host = host
+        self.retry_delay = retry_delay
+        self._stopped = threading.Event()
+        self.events_seen = 0
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self._consume()
+            except AMQPError as e:
+                logger.warning("cache invalidation listener disconnected: %s", e)
+            self._stopped.wait(self.retry_delay)
+
+    def _consume(self):
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        try:
+            channel = connection.channel()
+            result = channel.queue_declare(queue="", exclusive=True, auto_delete=True)
+            queue = result.method.queue
+            channel.exchange_declare(exchange=CRUD_EXCHANGE, exchange_type="direct", durable=True)
+            for routing_key in partition_queues(QUEUE_NAME, CRUD_PARTITIONS):
+                channel.queue_bind(queue=queue, exchange=CRUD_EXCHANGE, routing_key=routing_key)
+            channel.basic_consume(queue=queue, on_message_callback=self._on_message, auto_ack=True)
+            while not self._stopped.is_set():
+                connection.process_data_events(time_limit=1)
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _on_message(self, ch, method, properties, body):
+        self.events_seen += 1
+        try:
+            message = get_codec(getattr(properties, "content_type", None)).decode(body)
+        except Exception as e:
+            # evento ilegível: sem saber o que mudou, invalida tudo
+            logger.warning("unreadable cache invalidation event: %s", e)
+            message = {}
+        self.on_event(message.get("action"), message.get("data") or {})
+
+    def stop(self):
+        self._stopped.set()
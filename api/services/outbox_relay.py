@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+import uuid
+from pika.exceptions import AMQPError
+from pymongo.errors import PyMongoError
+from config import OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_LEASE_SECONDS
+from messaging.channel_pool import PoolExhausted
+
+logger = logging.getLogger(__name__)
+
+class OutboxRelay(threading.Thread):
+    """Publica os registros do outbox na crud_queue, em lotes e na ordem de gravação
+
+    Cada publicação espera o confirm do broker antes do registro ser apagado; se o
+    broker falhar no meio do lote, o resto é devolvido e reenviado depois (entrega
+    pelo menos uma vez). As publicações são sequenciais para manter a ordem dos eventos.
+
+    Cada processo da API (workers do gunicorn, réplicas) tem um relay, mas só o que detém o
+    lease da trava do outbox publica; os outros esperam o lease vencer para assumir.
+    """
+
+    def __init__(self, outbox, producer, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL, lease_seconds: float = OUTBOX_LEASE_SECONDS,
+                 retry_delay: float = 1.0):
+        super().__init__(name="outbox-relay", daemon=True)
+        self.outbox = outbox
+        self.producer = producer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.owner = uuid.uuid4().hex
+        self.leader = False
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.published = 0
+        self.failures = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_lag_ms = None
+
+    def run(self):
+        try:
+            self.outbox.ensure_indexes()
+            if self.outbox.transactions:
+                self.outbox.check_transactions()
+        except PyMongoError as e:
+            logger.warning("outbox index bootstrap failed: %s", e)
+        except RuntimeError as e:
+            logger.error("%s", e)
+        while not self._stopped.is_set():
+            try:
+                sent = self.relay_once()
+            except (AMQPError, PoolExhausted, PyMongoError) as e:
+                logger.warning("outbox relay failed: %s", e)
+                with self._lock:
+                    self.failures += 1
+                self._stopped.wait(self.retry_delay)
+                continue
+            if sent < self.batch_size:
+                self._stopped.wait(self.poll_interval)
+        if self.leader:
+            try:
+                self.outbox.resign(self.owner)
+            except PyMongoError as e:
+                logger.warning("outbox relay resign failed: %s", e)
+
+    def stop(self):
+        self._stopped.set()
+
+    def relay_once(self) -> int:
+        """Reserva, publica e apaga um lote; devolve quantos registros foram publicados
+
+        Só publica quem detém a trava, e no máximo até a metade do lease: depois disso outro
+        relay poderia assumir e publicar os mesmos registros, então o resto do lote é devolvido.
+        """
+        deadline = time.monotonic() + self.lease_seconds / 2
+        self.leader = self.outbox.lead(self.owner, self.lease_seconds)
+        if not self.leader:
+            return 0
+        records = self.outbox.claim(self.batch_size, self.lease_seconds)
+        if not records:
+            return 0
+        sent = []
+        try:
+            for record in records:
+                if time.monotonic() >= deadline:
+                    break
+                self.producer.publish(record["action"], record["data"], message_id=record.get("message_id"))
+                sent.append(record["_id"])
+        finally:
+            self.outbox.delete(sent)
+            if len(sent) < len(records):
+                self.outbox.release([r["_id"] for r in records[len(sent):]])
+            if sent:
+                self._record_batch(len(sent), records[0]["created_at"])
+        return len(sent)
+
+    def _record_batch(self, size: int, oldest_created_at: float):
+        with self._lock:
+            self.batches += 1
+            self.published += size
+            self.last_batch_size = size
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.last_lag_ms = round((time.time() - oldest_created_at) * 1000, 3)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "batches": self.batches,
+                "published": self.published,
+                "failures": self.failures,
+                "last_batch_size": self.last_batch_size,
+                "max_batch_size": self.max_batch_size,
+                "avg_batch_size": round(self.published / self.batches, 2) if self.batches else 0,
+                "last_lag_ms": self.last_lag_ms,
+                "leader": self.leader,
+            }
+        try:
+            oldest = self.outbox.oldest_created_at()
+            stats["pending"] = self.outbox.pending()
+            stats["lag_ms"] = round((time.time() - oldest) * 1000, 3) if oldest is not None else 0
+        except PyMongoError as e:
+            stats["error"] = str(e)
+        return stats
@@ -1,34 +1,204 @@
+import json
+from bson import ObjectId
 from repositories.user_repository import UserRepository
+from repositories.outbox_repository import OutboxRepository
 from messaging.producer import Producer
+from services.cache import TTLCache
+from metrics import REGISTRY
+from config import CACHE_ENABLED, CACHE_MAXSIZE, CACHE_TTL, OUTBOX_ENABLED, STATS_CACHE_TTL
+
+# validation (controllers), mongo, publish (broker) e outbox, por operação
+STAGE_SECONDS = REGISTRY.histogram("api_stage_seconds", "Tempo por etapa das operações da API", ("operation", "stage"))
+
+def batch_messages(ops: list, results: list) -> list:
+    """Itens da mensagem 'batch', no mesmo formato das mensagens individuais"""
+    messages = []
+    for op, result in zip(ops, results):
+        if result["status"] != "ok":
+            continue
+        if op["op"] == "create":
+            data = dict(op["data"])
+            data["id"] = result["id"]
+            messages.append({"action": "create", "data": data})
+        elif op["op"] == "update":
+            messages.append({"action": "update", "data": {"name": op["name"], "new_data": op["data"]}})
+        elif op["op"] == "delete":
+            messages.append({"action": "delete", "data": {"name": op["name"]}})
+    return messages
+
+def query_key(query: dict):
+    """Parte da chave de cache para filters/fields/sort (None sem consulta)"""
+    query = {k: v for k, v in query.items() if v}
+    return json.dumps(query, sort_keys=True) if query else None
+
+def _may_contain(page, data):
+    """A página tem o documento da escrita? (pelo id ou pelo name; sem name na projeção, talvez)"""
+    name, user_id = data.get("name"), data.get("id")
+    for user in page:
+        if user_id is not None and user.get("id") == user_id:
+            return True
+        if name is not None and user.get("name", name) == name:
+            return True
+    return False
+
+def page_affected(key, page, action, data) -> bool:
+    """Se uma escrita (create/update/delete) pode mudar a página em cache sob essa chave"""
+    _, after, limit, query = key
+    query = json.loads(query) if query else {}
+    if query.get("sort") or (action != "delete" and query.get("filters")):
+        # top-N e filtros: a escrita pode pôr o documento na página
+        return True
+    if action == "create":
+        # páginas por _id: o documento novo só entra depois do cursor e antes do fim de uma
+        # página cheia (ids da mesma réplica crescem, mas de réplicas diferentes podem vir fora de ordem)
+        if not ObjectId.is_valid(data.get("id")):
+            return True
+        new_id = ObjectId(data["id"])
+        if after is not None and new_id <= ObjectId(after):
+            return False
+        return len(page) < limit or new_id < ObjectId(page[-1]["id"])
+    return _may_contain(page, data)
+
+def invalidate_write(list_cache, item_cache, action, data):
+    """Invalida só as páginas e leituras por id que a escrita pode ter mudado"""
+    if action == "batch":
+        for op in data.get("ops", []):
+            invalidate_write(list_cache, item_cache, op.get("action"), op.get("data", {}))
+        return
+    if action not in ("create", "update", "delete"):
+        # clear_all ou evento desconhecido
+        list_cache.clear()
+        item_cache.clear()
+        return
+    if data.get("id") is not None:
+        item_cache.invalidate(str(data["id"]))
+    if data.get("name") is not None:
+        item_cache.invalidate_where(lambda _, user: user is not None and user.get("name") == data["name"])
+    list_cache.invalidate_where(lambda key, page: page_affected(key, page, action, data))
+
+def page_copy(users):
+    """Cópia de uma página do cache: ele guarda uma tupla, e cada chamador recebe dicts próprios"""
+    return [dict(user) for user in users]
 
 class UserService:
-    def __init__(self, repo: UserRepository = None, producer: Producer = None):
+    def __init__(self, repo: UserRepository = None, producer: Producer = None, cache_enabled: bool = CACHE_ENABLED,
+                 outbox: OutboxRepository = None, outbox_enabled: bool = OUTBOX_ENABLED):
         self.repo = repo or UserRepository()
         self.producer = producer or Producer()
+        # com outbox, o evento vai para o Mongo junto com a escrita e o OutboxRelay publica
+        if outbox is None and outbox_enabled:
+            outbox = OutboxRepository(client=self.repo.client)
+        self.outbox = outbox
+        self.cache_enabled = cache_enabled
+        # páginas de listagem e leituras por id
+        self.list_cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+        self.item_cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+        # agregados expiram só pelo TTL: escritas não limpam este cache
+        self.stats_cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=STATS_CACHE_TTL)
+
+    def invalidate_cache(self):
+        self.list_cache.clear()
+        self.item_cache.clear()
+
+    def invalidate_for(self, action: str, data: dict):
+        """Invalidação de uma escrita (desta réplica ou vista em crud_events)"""
+        invalidate_write(self.list_cache, self.item_cache, action, data)
+
+    def cache_stats(self):
+        return {"enabled": self.cache_enabled, "list": self.list_cache.stats(), "item": self.item_cache.stats(),
+                "stats": self.stats_cache.stats()}
+
+    def _write(self, operation, write, event):
+        """Executa write(session) e publica o evento event(resultado), direto ou via outbox"""
+        if self.outbox is None:
+            with STAGE_SECONDS.labels(operation, "mongo").time():
+                result = write(None)
+            message = event(result)
+            if message:
+                with STAGE_SECONDS.labels(operation, "publish").time():
+                    self.producer.publish(*message)
+            return result
+
+        def write_with_outbox(session):
+            with STAGE_SECONDS.labels(operation, "mongo").time():
+                result = write(session)
+            message = event(result)
+            if message:
+                with STAGE_SECONDS.labels(operation, "outbox").time():
+                    self.outbox.add(*message, session=session)
+            return result
+        return self.outbox.run(write_with_outbox)
 
     def create_user(self, user: dict):
-        inserted_id = self.repo.create(user)
-        # add id to data for consumer traceability
-        data = user.copy()
-        data["id"] = inserted_id
-        self.producer.publish("create", data)
+        def event(inserted_id):
+            # add id to data for consumer traceability
+            data = user.copy()
+            data["id"] = inserted_id
+            return "create", data
+        inserted_id = self._write("create", lambda session: self.repo.create(user, session=session), event)
+        self.invalidate_for(*event(inserted_id))
         return inserted_id
 
-    def list_users(self):
-        return self.repo.read_all()
+    def list_users(self, after: str = None, limit: int = None, **query):
+        """query: filters, fields e sort, repassados ao find do repositório"""
+        def loader():
+            with STAGE_SECONDS.labels("list", "mongo").time():
+                if limit is None:
+                    return self.repo.read_all(after=after, **query)
+                return self.repo.read_page(after=after, limit=limit, **query)
+        if not self.cache_enabled or limit is None:
+            # sem limit é a coleção inteira: não vai para o cache
+            return loader()
+        return page_copy(self.list_cache.get_or_load(("page", after, limit, query_key(query)),
+                                                     lambda: tuple(loader())))
+
+    def iter_users(self, after: str = None, **query):
+        return self.repo.iter_all(after=after, **query)
+
+    def user_stats(self, filters: dict = None, buckets: list = None, approx: bool = False):
+        """count e agregados de value; approx usa a contagem estimada da coleção"""
+        def loader():
+            with STAGE_SECONDS.labels("stats", "mongo").time():
+                if approx:
+                    return {"count": self.repo.estimated_count(), "approx": True}
+                return self.repo.stats(filters=filters, buckets=buckets)
+        if not self.cache_enabled:
+            return loader()
+        key = ("stats", approx, query_key({"filters": filters, "buckets": buckets}))
+        return self.stats_cache.get_or_load(key, loader)
+
+    def get_user(self, user_id: str):
+        def loader():
+            with STAGE_SECONDS.labels("get", "mongo").time():
+                return self.repo.read_by_id(user_id)
+        if not self.cache_enabled:
+            return loader()
+        return self.item_cache.get_or_load(user_id, loader)
 
     def update_user_by_name(self, name: str, data: dict):
-        modified = self.repo.update_by_name(name, data)
-        self.producer.publish("update", {"name": name, "new_data": data})
+        modified = self._write("update", lambda session: self.repo.update_by_name(name, data, session=session),
+                               lambda _: ("update", {"name": name, "new_data": data}))
+        self.invalidate_for("update", {"name": name, "new_data": data})
         return modified
 
     def delete_user_by_name(self, name: str):
-        deleted = self.repo.delete_by_name(name)
-        self.producer.publish("delete", {"name": name})
+        deleted = self._write("delete", lambda session: self.repo.delete_by_name(name, session=session),
+                              lambda _: ("delete", {"name": name}))
+        self.invalidate_for("delete", {"name": name})
         return deleted
 
+    def apply_batch(self, ops: list, ordered: bool = True):
+        """Aplica várias operações num bulk_write e publica uma única mensagem"""
+        def event(outcome):
+            messages = batch_messages(ops, outcome["results"])
+            return ("batch", {"ops": messages}) if messages else None
+        outcome = self._write("batch", lambda session: self.repo.bulk_apply(ops, ordered=ordered, session=session), event)
+        self.invalidate_for("batch", {"ops": batch_messages(ops, outcome["results"])})
+        return outcome
+
     def clear_all_users(self):
         """Remove todos os usuários do banco"""
-        deleted_count = self.repo.clear_all()
-        self.producer.publish("clear_all", {"deleted_count": deleted_count})
-        return deleted_count
\ No newline at end of file
+        deleted_count = self._write("clear_all", lambda session: self.repo.clear_all(session=session),
+                                    lambda count: ("clear_all", {"deleted_count": count}))
+        self.invalidate_cache()
+        return deleted_count
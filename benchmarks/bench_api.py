@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks da API (sem rede): validação do User (pydantic e schemas compilados),
+serialização e publish do Producer, custo das métricas, UserRepository.read_all e o cold
+start do app. Normalmente chamado por run.py.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "api"))
+
+import fakes  # noqa: E402
+fakes.install()
+
+import mongomock  # noqa: E402
+from bson import ObjectId  # noqa: E402
+import harness  # noqa: E402
+from harness import benchmark  # noqa: E402
+from models.user_model import User  # noqa: E402
+from schemas.user_schema import validate_user, validate_batch, encode_users  # noqa: E402
+from messaging.producer import Producer  # noqa: E402
+from messaging.codecs import CODECS  # noqa: E402
+import repositories.user_repository as repo_module  # noqa: E402
+from metrics import Registry  # noqa: E402
+
+repo_module.MongoClient = mongomock.MongoClient
+
+PAYLOAD = {"name": "João Silva", "email": "joao@example.com", "value": 100}
+NESTED = {
+    "id": ObjectId(),
+    "name": "João Silva",
+    "email": "joao@example.com",
+    "value": 100,
+    "tags": [ObjectId() for _ in range(5)],
+    "history": [{"by": ObjectId(), "value": i} for i in range(10)],
+}
+
+# schemas compilados x caminho anterior; os _x1000 medem o lote inteiro (custo por item = /1000)
+BULK = [dict(PAYLOAD, name=f"user{i}", value=i) for i in range(1000)]
+BULK_OPS = [{"op": "create", "data": p} for p in BULK]
+PAGE = [dict(p, id=str(ObjectId())) for p in BULK]
+
+@benchmark("api.schema.create.compiled", number=20000)
+def bench_schema_create_compiled():
+    return lambda: validate_user(PAYLOAD)
+
+@benchmark("api.schema.create_x1000.pydantic", number=20, repeat=3)
+def bench_schema_bulk_pydantic():
+    return lambda: [User(**p).dict(exclude_none=True) for p in BULK]
+
+@benchmark("api.schema.create_x1000.compiled", number=20, repeat=3)
+def bench_schema_bulk_compiled():
+    return lambda: validate_batch(BULK_OPS)
+
+@benchmark("api.schema.encode_x1000.json", number=20, repeat=3)
+def bench_schema_encode_json():
+    import json
+    return lambda: json.dumps(PAGE).encode()
+
+@benchmark("api.schema.encode_x1000.compiled", number=20, repeat=3)
+def bench_schema_encode_compiled():
+    return lambda: encode_users(PAGE)
+
+@benchmark("api.metrics.histogram_time", number=100000)
+def bench_metrics_histogram_time():
+    # custo da instrumentação por etapa (labels + timer + observe)
+    stage = Registry().histogram("bench_seconds", "bench", ("operation", "stage"))
+    def run():
+        with stage.labels("create", "mongo").time():
+            pass
+    return run
+
+@benchmark("api.user_validation", number=20000)
+def bench_user_validation():
+    return lambda: User(**PAYLOAD).dict(exclude_none=True)
+
+@benchmark("api.producer_encode.flat", number=20000)
+def bench_encode_flat():
+    producer = Producer()
+    data = dict(PAYLOAD, id=ObjectId())
+    return lambda: producer.encode("create", data)
+
+@benchmark("api.producer_encode.nested", number=10000)
+def bench_encode_nested():
+    producer = Producer()
+    return lambda: producer.encode("create", NESTED)
+
+def register_codecs():
+    message = {"action": "create", "data": NESTED}
+    for content_type, codec in CODECS.items():
+        name = content_type.split("/")[-1]
+        benchmark(f"api.codec.{name}.encode", number=20000)(lambda codec=codec: lambda: codec.encode(message))
+        body = codec.encode(message)
+        benchmark(f"api.codec.{name}.decode", number=20000)(lambda codec=codec, body=body: lambda: codec.decode(body))
+
+@benchmark("api.repository_read_page.mongomock_1000", number=20, repeat=3)
+def bench_read_page_mongomock():
+    repo = repo_module.UserRepository(mongo_uri="mongodb://localhost")
+    repo.collection.insert_many([{"name": f"user{i}", "value": i} for i in range(1000)])
+    return lambda: repo.read_page(limit=100)
+
+@benchmark("api.producer_publish", number=10000)
+def bench_publish():
+    producer = Producer()
+    data = dict(PAYLOAD, id=ObjectId())
+    return lambda: producer.publish("create", data)
+
+@benchmark("api.producer_publish.partitioned", number=10000)
+def bench_publish_partitioned():
+    # mesmo publish com 8 partições: soma o hash da entidade (jump hash) ao custo acima
+    producer = Producer(partitions=8)
+    data = dict(PAYLOAD, id=ObjectId())
+    return lambda: producer.publish("create", data)
+
+@benchmark("api.cold_start.import_app", number=1, repeat=3)
+def bench_cold_start():
+    # processo novo importando o app, com Mongo/RabbitMQ inalcançáveis: nada no import pode esperar por eles
+    env = dict(os.environ, MONGO_URI="mongodb://127.0.0.1:1", RABBITMQ_HOST="127.0.0.1",
+               CACHE_INVALIDATION_EVENTS="0", OUTBOX_ENABLED="0", API_WARMUP="0")
+    command = [sys.executable, "-c", "import app"]
+    api_dir = os.path.join(HERE, "..", "api")
+    return lambda: subprocess.run(command, cwd=api_dir, env=env, check=True, capture_output=True)
+
+def register_read_all(sizes):
+    for size in sizes:
+        def setup(size=size):
+            repo = repo_module.UserRepository(mongo_uri="mongodb://localhost")
+            # coleção em memória: mede a conversão e a materialização, não o mongomock
+            repo.collection = fakes.FakeCollection(size)
+            return repo.read_all
+        benchmark(f"api.repository_read_all.{size}", number=1, repeat=3)(setup)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplica o número de chamadas por amostra")
+    parser.add_argument("--only", nargs="*")
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    register_codecs()
+    register_read_all([int(s) for s in args.sizes.split(",") if s])
+    results = harness.run_all(args.only, args.scale)
+    if args.json:
+        harness.save(args.json, results)
+
+if __name__ == "__main__":
+    main()
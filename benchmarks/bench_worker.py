@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks do worker (sem rede): custo por mensagem de MessageHandler._on_message
+(inclusive de uma mensagem que falha e vai para a DLQ) e do flush em lote, com mongomock
+e broker em memória. Normalmente chamado por run.py.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "worker"))
+
+import fakes  # noqa: E402
+fakes.install()
+
+import mongomock  # noqa: E402
+from bson import ObjectId  # noqa: E402
+import harness  # noqa: E402
+from harness import benchmark  # noqa: E402
+import repositories.user_repository as repo_module  # noqa: E402
+from monitoring.monitor_publisher import MonitorPublisher  # noqa: E402
+from processing.message_handler import MessageHandler  # noqa: E402
+from processing.batch_handler import BatchMessageHandler  # noqa: E402
+
+repo_module.MongoClient = mongomock.MongoClient
+
+def _handler(cls=MessageHandler, **kwargs):
+    repo = repo_module.UserRepository(mongo_uri="mongodb://localhost")
+    return cls(repo=repo, monitor=MonitorPublisher(mode="event"), **kwargs)
+
+def _seed(handler, count=1000):
+    ids = [ObjectId() for _ in range(count)]
+    handler.repo.collection.insert_many([{"_id": _id, "name": f"user{i}", "value": i} for i, _id in enumerate(ids)])
+    return ids
+
+@benchmark("worker.on_message.update", number=2000)
+def bench_on_message_update():
+    handler = _handler()
+    ids = itertools.cycle([str(_id) for _id in _seed(handler)])
+    tags = itertools.count(1)
+    def run():
+        body = json.dumps({"action": "update", "data": {"id": next(ids), "value": 1}})
+        handler._on_message(handler.channel, fakes.FakeMethod(next(tags)), None, body)
+    return run
+
+@benchmark("worker.on_message.delete_missing", number=2000)
+def bench_on_message_delete():
+    handler = _handler()
+    body = json.dumps({"action": "delete", "data": {"id": str(ObjectId())}})
+    tags = itertools.count(1)
+    return lambda: handler._on_message(handler.channel, fakes.FakeMethod(next(tags)), None, body)
+
+@benchmark("worker.on_message.decode_only", number=20000)
+def bench_on_message_unknown():
+    handler = _handler()
+    body = json.dumps({"action": "noop", "data": {"id": str(ObjectId()), "value": 1}})
+    tags = itertools.count(1)
+    return lambda: handler._on_message(handler.channel, fakes.FakeMethod(next(tags)), None, body)
+
+@benchmark("worker.on_message.dead_letter", number=2000)
+def bench_on_message_dead_letter():
+    # id inválido (erro permanente): republicação direto na DLQ + ack, sem sleep no consumidor
+    handler = _handler()
+    body = json.dumps({"action": "update", "data": {"id": "not-an-object-id", "value": 1}})
+    tags = itertools.count(1)
+    return lambda: handler._on_message(handler.channel, fakes.FakeMethod(next(tags)), None, body)
+
+@benchmark("worker.batch_flush.update_x100", number=20, repeat=5)
+def bench_batch_flush():
+    handler = _handler(BatchMessageHandler, batch_size=100)
+    ids = [str(_id) for _id in _seed(handler, 100)]
+    bodies = [json.dumps({"action": "update", "data": {"id": _id, "value": 1}}) for _id in ids]
+    tags = itertools.count(1)
+    return lambda: handler._flush([(fakes.FakeMethod(next(tags)), None, body) for body in bodies])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplica o número de chamadas por amostra")
+    parser.add_argument("--only", nargs="*")
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    results = harness.run_all(args.only, args.scale)
+    if args.json:
+        harness.save(args.json, results)
+
+if __name__ == "__main__":
+    main()
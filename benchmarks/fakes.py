@@ -0,0 +1,103 @@
+"""
+Broker em memória para os benchmarks: substitui pika.BlockingConnection sem rede
+"""
+import pika
+from bson import ObjectId
+
+class FakeChannel:
+    def __init__(self):
+        self.is_open = True
+        self.published = 0
+        self.last_body = None
+        self.acked = 0
+        self.nacked = 0
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        # só o último corpo é guardado, para a memória não crescer durante a medição
+        self.published += 1
+        self.last_body = body
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acked += 1
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.nacked += 1
+
+    def confirm_delivery(self):
+        pass
+
+    def exchange_declare(self, *args, **kwargs):
+        pass
+
+    def queue_declare(self, *args, **kwargs):
+        pass
+
+    def queue_bind(self, *args, **kwargs):
+        pass
+
+    def basic_qos(self, *args, **kwargs):
+        pass
+
+class FakeConnection:
+    def __init__(self, params=None):
+        self.is_open = True
+
+    def channel(self):
+        return FakeChannel()
+
+    def process_data_events(self, time_limit=0):
+        pass
+
+    def call_later(self, delay, callback):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+def install():
+    pika.BlockingConnection = FakeConnection
+
+class FakeMethod:
+    __slots__ = ("delivery_tag", "routing_key")
+
+    def __init__(self, delivery_tag, routing_key="crud_queue"):
+        self.delivery_tag = delivery_tag
+        self.routing_key = routing_key
+
+class FakeCursor:
+    """Cursor que gera os documentos sob demanda (sort/limit/batch_size são aceitos e ignorados)"""
+
+    def __init__(self, size, limit=0):
+        self.size = size
+        self.limit_ = limit
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def limit(self, n):
+        self.limit_ = n
+        return self
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        count = min(self.size, self.limit_) if self.limit_ else self.size
+        for i in range(count):
+            yield {"_id": ObjectId(), "name": f"user{i}", "email": f"user{i}@example.com", "value": i}
+
+class FakeCollection:
+    """Coleção somente leitura com `size` documentos
+
+    O find do mongomock é O(n²) no tamanho da coleção, o que tornaria inviável medir
+    read_all com 1M de documentos; aqui o custo medido é só o do lado da aplicação.
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+    def find(self, query=None, *args, **kwargs):
+        return FakeCursor(self.size)
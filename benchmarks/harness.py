@@ -0,0 +1,64 @@
+"""
+Infra dos microbenchmarks: registro, medição e comparação com baseline em JSON
+"""
+import json
+import statistics
+import time
+
+BENCHMARKS = []
+
+def benchmark(name, number=1000, repeat=5):
+    """Registra uma função de setup que devolve o callable a ser medido"""
+    def register(setup):
+        BENCHMARKS.append({"name": name, "setup": setup, "number": number, "repeat": repeat})
+        return setup
+    return register
+
+def measure(fn, number, repeat):
+    """Tempo por chamada (µs) em cada uma das `repeat` amostras de `number` chamadas"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number * 1e6)
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "max_us": round(max(samples), 3),
+        "number": number,
+        "repeat": repeat,
+    }
+
+def run_all(selected=None, scale=1.0):
+    results = {}
+    for bench in BENCHMARKS:
+        if selected and not any(s in bench["name"] for s in selected):
+            continue
+        fn = bench["setup"]()
+        number = max(1, int(bench["number"] * scale))
+        fn()  # aquecimento
+        results[bench["name"]] = measure(fn, number, bench["repeat"])
+        print(f"  {bench['name']:<45} {results[bench['name']]['median_us']:>14.3f} µs/op")
+    return results
+
+def compare(baseline, current, threshold=0.25):
+    """Lista os benchmarks cuja mediana piorou mais que `threshold` (fração) em relação ao baseline"""
+    regressions = []
+    for name, result in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = result["median_us"] / base["median_us"] - 1 if base["median_us"] else 0.0
+        if change > threshold:
+            regressions.append({"name": name, "baseline_us": base["median_us"],
+                                "current_us": result["median_us"], "change": round(change, 3)})
+    return regressions
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def save(path, results, meta=None):
+    with open(path, "w") as f:
+        json.dump({"meta": meta or {}, "results": results}, f, indent=2, sort_keys=True)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga HTTP: API síncrona (Flask + gunicorn) x API assíncrona (Quart + hypercorn)
+
+Sobe cada variante com o mesmo número de processos, dispara a mesma mistura de
+requisições com concorrência fixa e compara p50/p99 de latência e requisições/s.
+Precisa de MongoDB e RabbitMQ rodando (docker-compose -f docker-services.yml up -d).
+
+    python benchmarks/http_load.py --workers 2 --concurrency 200 --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")
+
+SERVERS = {
+    "sync": lambda workers, port: ["gunicorn", "-w", str(workers), "--threads", "8",
+                                   "-b", f"127.0.0.1:{port}", "app:app"],
+    "async": lambda workers, port: ["hypercorn", "-w", str(workers),
+                                    "-b", f"127.0.0.1:{port}", "async_app:app"],
+}
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def _one_request(client, write_ratio):
+    if random.random() < write_ratio:
+        payload = {"name": f"bench-{random.getrandbits(48):x}", "email": "bench@example.com",
+                   "value": random.randint(1, 1000)}
+        return await client.post("/api/users", json=payload)
+    return await client.get("/api/users", params={"limit": 50})
+
+async def run_load(base_url, total, concurrency, write_ratio):
+    latencies, errors, shed = [], 0, 0
+    remaining = total
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal remaining, errors, shed
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                try:
+                    resp = await _one_request(client, write_ratio)
+                    if resp.status_code == 429:
+                        # recusada pelo backpressure (não é falha do servidor)
+                        shed += 1
+                    elif resp.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "shed": shed,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+def wait_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not become healthy in {timeout}s")
+
+def bench_variant(name, args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    proc = subprocess.Popen(SERVERS[name](args.workers, args.port), cwd=API_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(base_url)
+        # aquecimento: conexões e pools abertos antes de medir
+        asyncio.run(run_load(base_url, min(500, args.requests), args.concurrency, args.write_ratio))
+        return asyncio.run(run_load(base_url, args.requests, args.concurrency, args.write_ratio))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processos por servidor (mesmo número de cores)")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="fração de POST /api/users")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--variants", nargs="+", default=["sync", "async"], choices=sorted(SERVERS))
+    parser.add_argument("--json", help="salva o resultado neste arquivo")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.variants:
+        results[name] = bench_variant(name, args)
+        r = results[name]
+        print(f"{name:>5}: {r['rps']:>9} req/s  p50 {r['p50_ms']:>8} ms  p99 {r['p99_ms']:>8} ms  errors {r['errors']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"params": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Roda os microbenchmarks da API e do worker (cada um no seu processo, pois os dois
+pacotes usam os mesmos nomes de módulo), salva os resultados em JSON e compara com
+um baseline.
+
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json   # sai com 1 se houver regressão
+    python benchmarks/run.py --quick                               # tamanhos e repetições menores
+"""
+import argparse
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SUITES = {"api": "bench_api.py", "worker": "bench_worker.py"}
+
+def run_suite(name, extra_args):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+        path = tmp.name
+    try:
+        print(f"[{name}]")
+        subprocess.run([sys.executable, os.path.join(HERE, SUITES[name]), "--json", path, *extra_args],
+                       check=True, cwd=HERE)
+        return harness.load(path)
+    finally:
+        os.unlink(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", default=list(SUITES), choices=list(SUITES))
+    parser.add_argument("--only", nargs="*", help="roda só os benchmarks cujo nome contém um destes trechos")
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--output", help="salva o resultado desta execução")
+    parser.add_argument("--save-baseline", help="salva o resultado como baseline")
+    parser.add_argument("--baseline", help="compara com este baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="piora relativa tolerada (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.suites:
+        extra = ["--scale", "0.1"] if args.quick else []
+        if args.only:
+            extra += ["--only", *args.only]
+        if name == "api" and args.quick:
+            extra += ["--sizes", "1000,10000"]
+        results.update(run_suite(name, extra))
+
+    # o baseline só vale para uma máquina parecida: fica registrado onde ele foi medido
+    meta = {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "system": f"{platform.system()} {platform.release()}",
+            "processor": platform.processor(), "cpus": os.cpu_count(), "quick": args.quick,
+            "date": time.strftime("%Y-%m-%d")}
+    for path in (args.output, args.save_baseline):
+        if path:
+            harness.save(path, results, meta)
+
+    if args.baseline:
+        regressions = harness.compare(harness.load(args.baseline), results, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['name']}: {r['baseline_us']} -> {r['current_us']} µs/op (+{r['change']:.0%})")
+        if regressions:
+            return 1
+        print(f"no regressions above {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -65,12 +65,12 @@ def delete_user(name):
         return False
 
 def list_users():
-    """Lista todos os usuários"""
+    """Lista a primeira página de usuários (DEFAULT_PAGE_SIZE da API)"""
     try:
         r = requests.get(f"{API_HOST}/api/users", timeout=5)
         if r.status_code == 200:
             users = r.json()
-            print(f"📋 Total de usuários: {len(users)}")
+            print(f"📋 Usuários na primeira página: {len(users)}")
             return users
         else:
             print(f"⚠️  Erro ao listar usuários: {r.status_code}")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Agregação dos eventos da monitor_queue por worker e por ação
+
+Cada série (worker_id, action) guarda contadores por segundo num anel de 15 minutos,
+então throughput, taxa de erro e latência saem em janelas deslizantes de 1s/1m/15m
+com memória fixa por série. Séries sem eventos há mais de 15 minutos são descartadas.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+WINDOWS = {"1s": 1, "1m": 60, "15m": 900}
+HORIZON = max(WINDOWS.values())
+RECENT_EVENTS = 50
+
+class SlidingCounter:
+    """Contadores por segundo num anel de HORIZON posições"""
+
+    __slots__ = ("second", "count", "errors", "latency_sum", "latency_count", "last_seen")
+
+    def __init__(self):
+        self.second = [-1] * HORIZON
+        self.count = [0] * HORIZON
+        self.errors = [0] * HORIZON
+        self.latency_sum = [0.0] * HORIZON
+        self.latency_count = [0] * HORIZON
+        self.last_seen = 0
+
+    def add(self, second, count=1, errors=0, latency_sum=0.0, latency_count=0):
+        i = second % HORIZON
+        if self.second[i] != second:
+            self.second[i] = second
+            self.count[i] = self.errors[i] = self.latency_count[i] = 0
+            self.latency_sum[i] = 0.0
+        self.count[i] += count
+        self.errors[i] += errors
+        self.latency_sum[i] += latency_sum
+        self.latency_count[i] += latency_count
+        self.last_seen = max(self.last_seen, second)
+
+    def window(self, now, seconds):
+        count = errors = latency_count = 0
+        latency_sum = 0.0
+        oldest = now - seconds
+        for i in range(HORIZON):
+            if oldest < self.second[i] <= now:
+                count += self.count[i]
+                errors += self.errors[i]
+                latency_sum += self.latency_sum[i]
+                latency_count += self.latency_count[i]
+        return {
+            "count": count,
+            "throughput": round(count / seconds, 3),
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "avg_latency_ms": round(latency_sum / latency_count, 3) if latency_count else None,
+        }
+
+class WorkerStatsAggregator:
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._series = {}
+        self._recent = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self.messages = 0
+
+    def add_batch(self, messages):
+        now = int(self.clock())
+        with self._lock:
+            for message in messages:
+                self._add(now, message)
+                self.messages += 1
+
+    def _series_for(self, worker_id, action):
+        key = (worker_id, action)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = SlidingCounter()
+        return series
+
+    def _add(self, now, message):
+        worker_id = message.get("worker_id") or "unknown"
+        counters = self._counters.setdefault(worker_id, {})
+        for name, value in message.get("counters", {}).items():
+            counters[name] = counters.get(name, 0) + value
+        if message.get("type") == "counters":
+            return
+        if message.get("type") == "summary":
+            # resumo do modo aggregate do worker: contado no segundo em que chegou
+            for action, stats in message.get("actions", {}).items():
+                latency = stats.get("latency_ms", {})
+                self._series_for(worker_id, action).add(
+                    now,
+                    count=stats.get("success", 0) + stats.get("error", 0),
+                    errors=stats.get("error", 0),
+                    latency_sum=latency.get("sum", 0.0),
+                    latency_count=latency.get("count", 0),
+                )
+            samples = message.get("error_samples", [])
+        else:
+            latency = message.get("latency_ms")
+            self._series_for(worker_id, message.get("action") or "unknown").add(
+                now,
+                errors=0 if message.get("status") == "success" else 1,
+                latency_sum=latency or 0.0,
+                latency_count=0 if latency is None else 1,
+            )
+            samples = [message]
+        recent = self._recent.get(worker_id)
+        if recent is None:
+            recent = self._recent[worker_id] = deque(maxlen=RECENT_EVENTS)
+        recent.extend(samples)
+
+    def snapshot(self):
+        now = int(self.clock())
+        workers, fleet = {}, {}
+        with self._lock:
+            for key in [k for k, s in self._series.items() if now - s.last_seen > HORIZON]:
+                del self._series[key]
+            live = {worker_id for worker_id, _ in self._series}
+            for per_worker in (self._recent, self._counters):
+                for worker_id in list(per_worker):
+                    if worker_id not in live:
+                        del per_worker[worker_id]
+
+            for (worker_id, action), series in self._series.items():
+                windows = {name: series.window(now, seconds) for name, seconds in WINDOWS.items()}
+                worker = workers.setdefault(worker_id, {
+                    "actions": {},
+                    "recent": list(self._recent.get(worker_id, [])),
+                    "counters": dict(self._counters.get(worker_id, {})),
+                })
+                worker["actions"][action] = windows
+                totals = fleet.setdefault(action, {name: {"count": 0} for name in WINDOWS})
+                for name, w in windows.items():
+                    totals[name]["count"] += w["count"]
+        for windows in fleet.values():
+            for name, seconds in WINDOWS.items():
+                windows[name]["throughput"] = round(windows[name]["count"] / seconds, 3)
+        return {"workers": workers, "fleet": fleet, "messages": self.messages}
+
+def decode(properties, body):
+    if getattr(properties, "content_type", None) == "application/msgpack" and msgpack is not None:
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
+
+class MonitorQueueConsumer(threading.Thread):
+    """Consome a monitor_queue em lotes e alimenta o agregador (ack múltiplo por lote)"""
+
+    def __init__(self, aggregator, host="localhost", queue="monitor_queue", exchange="monitor_events",
+                 batch_size=500, flush_interval=0.5, retry_delay=5.0):
+        super().__init__(name="monitor-queue-consumer", daemon=True)
+        self.aggregator = aggregator
+        self.host = host
+        self.queue = queue
+        self.exchange = exchange
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.connected = False
+
+    def run(self):
+        import pika
+        while True:
+            try:
+                connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+                channel = connection.channel()
+                channel.exchange_declare(exchange=self.exchange, exchange_type="direct", durable=True)
+                channel.queue_declare(queue=self.queue, durable=True)
+                channel.queue_bind(queue=self.queue, exchange=self.exchange, routing_key=self.queue)
+                channel.basic_qos(prefetch_count=self.batch_size)
+                self.connected = True
+                self._consume(channel)
+            except Exception as e:
+                print(f"⚠️  Consumidor da {self.queue} desconectado: {e}")
+            self.connected = False
+            time.sleep(self.retry_delay)
+
+    def _consume(self, channel):
+        batch, last_tag = [], None
+        deadline = time.monotonic() + self.flush_interval
+        for method, properties, body in channel.consume(self.queue, inactivity_timeout=self.flush_interval):
+            if method is not None:
+                last_tag = method.delivery_tag
+                try:
+                    batch.append(decode(properties, body))
+                except Exception:
+                    pass  # evento ilegível: só é descartado (ack junto com o lote)
+            if last_tag is not None and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self.aggregator.add_batch(batch)
+                channel.basic_ack(delivery_tag=last_tag, multiple=True)
+                batch, last_tag = [], None
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
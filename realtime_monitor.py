@@ -3,19 +3,41 @@
 Monitor em Tempo Real do RabbitCRUD
 Dashboard web para visualizar operações do banco de dados em tempo real
 """
+import os
+import queue
 import time
 import threading
 import requests
+from collections import deque
 from datetime import datetime
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, Response, render_template_string, jsonify
 import json
 
+from monitor_stats import MonitorQueueConsumer, WorkerStatsAggregator, decode as _decode
+
 app = Flask(__name__)
 
+API_HOST = os.getenv("API_HOST", "http://localhost:5000")
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
+CRUD_EXCHANGE = os.getenv("CRUD_EXCHANGE", "crud_events")
+MONITOR_EXCHANGE = os.getenv("MONITOR_EXCHANGE", "monitor_events")
+MONITOR_QUEUE = os.getenv("MONITOR_QUEUE", "monitor_queue")
+# partições da crud_queue (igual ao CRUD_PARTITIONS da API e dos workers)
+CRUD_PARTITIONS = int(os.getenv("CRUD_PARTITIONS", "1"))
+MONITOR_CONSUMER_BATCH = int(os.getenv("MONITOR_CONSUMER_BATCH", "500"))
+# usuários carregados na abertura do dashboard; depois disso só chegam deltas
+USER_SNAPSHOT_LIMIT = int(os.getenv("USER_SNAPSHOT_LIMIT", "500"))
+# só os campos mostrados no dashboard (o id sempre vem)
+USER_SNAPSHOT_FIELDS = "name,email,value"
+# o total por deltas deriva (deletes de nomes fora do snapshot, reentregas, batch parcial):
+# a cada N segundos ele é corrigido pela contagem estimada da API
+USER_COUNT_RECONCILE_INTERVAL = float(os.getenv("USER_COUNT_RECONCILE_INTERVAL", "10"))
+SSE_KEEPALIVE = 15
+
 # Dados em tempo real
 realtime_data = {
     'users': [],
-    'operations': [],
+    'operations': deque(maxlen=100),
     'stats': {
         'total_users': 0,
         'total_operations': 0,
@@ -228,8 +250,8 @@ HTML_TEMPLATE = """
     </style>
 </head>
 <body>
-    <div class="auto-refresh pulse">
-        🔄 Atualização automática a cada 2 segundos
+    <div class="auto-refresh pulse" id="live-status">
+        🔌 Conectando ao feed ao vivo...
     </div>
     
     <div class="container">
@@ -268,8 +290,10 @@ HTML_TEMPLATE = """
     </div>
 
     <script>
-        let autoRefresh = true;
         let generatorRunning = false;
+        const MAX_OPERATIONS = 20;
+        // mesmo limite da lista no servidor (USER_SNAPSHOT_LIMIT); o total vem de stats
+        const MAX_USERS = {{ max_users }};
         
         function updateStatus() {
             fetch('/api/status')
@@ -281,6 +305,32 @@ HTML_TEMPLATE = """
                 });
         }
         
+        function userElement(user) {
+            const item = document.createElement('div');
+            item.className = 'user-item';
+            item.dataset.name = user.name;
+            item.innerHTML = `
+                <div class="user-name"></div>
+                <div class="user-email"></div>
+                <div class="user-value"></div>
+            `;
+            fillUser(item, user);
+            return item;
+        }
+        
+        function fillUser(item, user) {
+            if (user.name !== undefined) {
+                item.dataset.name = user.name;
+                item.querySelector('.user-name').textContent = user.name;
+            }
+            if (user.email !== undefined) item.querySelector('.user-email').textContent = user.email;
+            if (user.value !== undefined) item.querySelector('.user-value').textContent = `R$ ${user.value}`;
+        }
+        
+        function findUser(name) {
+            return document.querySelector(`#user-list .user-item[data-name="${CSS.escape(name)}"]`);
+        }
+        
         function updateUsers() {
             fetch('/api/users')
                 .then(response => response.json())
@@ -291,16 +341,22 @@ HTML_TEMPLATE = """
                         return;
                     }
                     
-                    userList.innerHTML = data.users.map(user => `
-                        <div class="user-item">
-                            <div class="user-name">${user.name}</div>
-                            <div class="user-email">${user.email}</div>
-                            <div class="user-value">R$ ${user.value}</div>
-                        </div>
-                    `).join('');
+                    userList.replaceChildren(...data.users.map(userElement));
                 });
         }
         
+        function operationElement(op) {
+            const item = document.createElement('div');
+            item.className = `operation-item ${op.type}`;
+            const title = document.createElement('strong');
+            title.textContent = op.type.toUpperCase();
+            const time = document.createElement('div');
+            time.className = 'operation-time';
+            time.textContent = op.timestamp;
+            item.append(title, `: ${op.description}`, time);
+            return item;
+        }
+        
         function updateOperations() {
             fetch('/api/operations')
                 .then(response => response.json())
@@ -311,12 +367,8 @@ HTML_TEMPLATE = """
                         return;
                     }
                     
-                    operationsList.innerHTML = data.operations.slice(-20).reverse().map(op => `
-                        <div class="operation-item ${op.type}">
-                            <strong>${op.type.toUpperCase()}</strong>: ${op.description}
-                            <div class="operation-time">${op.timestamp}</div>
-                        </div>
-                    `).join('');
+                    operationsList.replaceChildren(
+                        ...data.operations.slice(-MAX_OPERATIONS).reverse().map(operationElement));
                 });
         }
         
@@ -361,15 +413,56 @@ HTML_TEMPLATE = """
             }
         }
         
-        // Atualização automática a cada 2 segundos
-        setInterval(() => {
-            if (autoRefresh) {
-                refreshData();
-            }
-        }, 2000);
+        // Feed ao vivo (SSE): o estado inicial vem de refreshData() e depois só chegam deltas
+        function connectLive() {
+            const live = document.getElementById('live-status');
+            const source = new EventSource('/api/stream');
+            
+            let connectedOnce = false;
+            
+            source.onopen = () => {
+                live.textContent = '🟢 Ao vivo';
+                // reconexão: recarrega o estado uma vez para não perder deltas
+                if (connectedOnce) refreshData();
+                connectedOnce = true;
+            };
+            source.onerror = () => { live.textContent = '🟠 Reconectando...'; };
+            
+            source.addEventListener('user_created', e => {
+                const user = JSON.parse(e.data);
+                const userList = document.getElementById('user-list');
+                if (!userList.querySelector('.user-item')) userList.replaceChildren();
+                userList.appendChild(userElement(user));
+                while (userList.children.length > MAX_USERS) userList.firstElementChild.remove();
+            });
+            source.addEventListener('user_updated', e => {
+                const delta = JSON.parse(e.data);
+                const item = findUser(delta.name);
+                if (item) fillUser(item, delta.changes);
+            });
+            source.addEventListener('user_deleted', e => {
+                const item = findUser(JSON.parse(e.data).name);
+                if (item) item.remove();
+            });
+            source.addEventListener('users_cleared', () => {
+                document.getElementById('user-list').innerHTML = '<p>Nenhum usuário encontrado</p>';
+            });
+            source.addEventListener('operation', e => {
+                const operationsList = document.getElementById('operations');
+                if (!operationsList.querySelector('.operation-item')) operationsList.replaceChildren();
+                operationsList.prepend(operationElement(JSON.parse(e.data)));
+                while (operationsList.children.length > MAX_OPERATIONS) operationsList.lastElementChild.remove();
+            });
+            source.addEventListener('stats', e => {
+                const stats = JSON.parse(e.data);
+                if (stats.total_users !== undefined) document.getElementById('user-count').textContent = `Usuários: ${stats.total_users}`;
+                if (stats.total_operations !== undefined) document.getElementById('operation-count').textContent = `Operações: ${stats.total_operations}`;
+                if (stats.last_update) document.getElementById('last-update').textContent = `Última atualização: ${stats.last_update}`;
+            });
+        }
         
-        // Carregar dados iniciais
         refreshData();
+        connectLive();
     </script>
 </body>
 </html>
@@ -377,20 +470,50 @@ HTML_TEMPLATE = """
 
 @app.route('/')
 def dashboard():
-    return render_template_string(HTML_TEMPLATE)
+    return render_template_string(HTML_TEMPLATE, max_users=USER_SNAPSHOT_LIMIT)
 
 @app.route('/api/status')
 def get_status():
     return jsonify(realtime_data['stats'])
 
+def reconcile_total_users():
+    """Substitui o total acumulado por deltas pela contagem da API; True se ele mudou"""
+    total = fetch_total_users(default=None)
+    stats = realtime_data['stats']
+    if total is None or total == stats['total_users']:
+        return False
+    stats['total_users'] = total
+    broadcaster.publish('stats', {'total_users': total})
+    return True
+
+class UserCountReconciler(threading.Thread):
+    def __init__(self, interval=USER_COUNT_RECONCILE_INTERVAL):
+        super().__init__(name='user-count-reconciler', daemon=True)
+        self.interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            reconcile_total_users()
+
+def fetch_total_users(default=0):
+    """Total de usuários pela contagem estimada da API (o snapshot traz só uma página)"""
+    try:
+        response = requests.get(f'{API_HOST}/api/users/stats', params={'approx': 1}, timeout=5)
+        if response.status_code == 200:
+            return response.json()['count']
+    except Exception:
+        pass
+    return default
+
 @app.route('/api/users')
 def get_users():
     try:
-        response = requests.get('http://localhost:5000/api/users', timeout=5)
+        response = requests.get(f'{API_HOST}/api/users', params={'limit': USER_SNAPSHOT_LIMIT, 'fields': USER_SNAPSHOT_FIELDS}, timeout=5)
         if response.status_code == 200:
             users = response.json()
             realtime_data['users'] = users
-            realtime_data['stats']['total_users'] = len(users)
+            realtime_data['stats']['total_users'] = fetch_total_users(default=len(users))
             realtime_data['stats']['last_update'] = datetime.now().strftime('%H:%M:%S')
             return jsonify({'users': users})
         else:
@@ -400,7 +523,14 @@ def get_users():
 
 @app.route('/api/operations')
 def get_operations():
-    return jsonify({'operations': realtime_data['operations']})
+    return jsonify({'operations': list(realtime_data['operations'])})
+
+@app.route('/api/workers')
+def get_workers():
+    """Throughput, taxa de erro e latência por worker/ação em janelas de 1s/1m/15m"""
+    snapshot = worker_stats.snapshot()
+    snapshot['consumer_connected'] = monitor_consumer.connected
+    return jsonify(snapshot)
 
 @app.route('/api/start-generator', methods=['POST'])
 def start_generator():
@@ -423,7 +553,7 @@ def stop_generator():
 def clear_data():
     try:
         # Limpar dados via API
-        response = requests.delete('http://localhost:5000/api/clear-all', timeout=5)
+        response = requests.delete(f'{API_HOST}/api/clear-all', timeout=5)
         if response.status_code == 200:
             add_operation('clear', 'Todos os dados foram limpos')
             return jsonify({'success': True})
@@ -441,10 +571,169 @@ def add_operation(op_type, description):
     }
     realtime_data['operations'].append(operation)
     realtime_data['stats']['total_operations'] += 1
-    
-    # Manter apenas as últimas 100 operações
-    if len(realtime_data['operations']) > 100:
-        realtime_data['operations'] = realtime_data['operations'][-100:]
+
+    broadcaster.publish('operation', operation)
+    broadcaster.publish('stats', {'total_operations': realtime_data['stats']['total_operations']})
+
+class EventBroadcaster:
+    """Distribui eventos para os dashboards conectados via SSE (uma fila por dashboard)"""
+
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.max_pending)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event_type, payload):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((event_type, payload))
+            except queue.Full:
+                # dashboard lento: desconecta, o EventSource reconecta e recarrega o estado
+                self.unsubscribe(q)
+                q.put((None, None))
+
+broadcaster = EventBroadcaster()
+
+# consumidor da fila durável monitor_queue (a cópia exclusiva acima só alimenta o SSE)
+worker_stats = WorkerStatsAggregator()
+monitor_consumer = MonitorQueueConsumer(worker_stats, host=RABBITMQ_HOST, queue=MONITOR_QUEUE,
+                                        exchange=MONITOR_EXCHANGE, batch_size=MONITOR_CONSUMER_BATCH)
+
+def _user_fields(data):
+    return {k: data.get(k) for k in ('id', 'name', 'email', 'value') if k in data}
+
+def _apply_crud_delta(action, data):
+    """Traduz uma mensagem da crud_queue em deltas para os dashboards"""
+    stats = realtime_data['stats']
+    if action == 'batch':
+        for op in data.get('ops', []):
+            _apply_crud_delta(op.get('action'), op.get('data', {}))
+        return
+    if action == 'create':
+        user = _user_fields(data)
+        users = realtime_data['users']
+        users.append(user)
+        # a lista fica nos USER_SNAPSHOT_LIMIT mais recentes (memória e payload do SSE);
+        # a contagem é o total_users, reconciliado com a API
+        if len(users) > USER_SNAPSHOT_LIMIT:
+            del users[:len(users) - USER_SNAPSHOT_LIMIT]
+        stats['total_users'] += 1
+        broadcaster.publish('user_created', user)
+    elif action == 'update':
+        changes = data.get('new_data', {})
+        for user in realtime_data['users']:
+            if user.get('name') == data.get('name'):
+                user.update(changes)
+                break
+        broadcaster.publish('user_updated', {'name': data.get('name'), 'changes': changes})
+    elif action == 'delete':
+        before = len(realtime_data['users'])
+        realtime_data['users'] = [u for u in realtime_data['users'] if u.get('name') != data.get('name')]
+        removed = before - len(realtime_data['users'])
+        if not removed and stats['total_users'] > before:
+            # pode ser um usuário fora do snapshot; o reconciliador corrige se não era
+            removed = 1
+        stats['total_users'] = max(0, stats['total_users'] - removed)
+        broadcaster.publish('user_deleted', {'name': data.get('name')})
+    elif action == 'clear_all':
+        realtime_data['users'] = []
+        stats['total_users'] = 0
+        broadcaster.publish('users_cleared', {})
+    else:
+        return
+    stats['last_update'] = datetime.now().strftime('%H:%M:%S')
+    broadcaster.publish('stats', {'total_users': stats['total_users'], 'last_update': stats['last_update']})
+
+class QueueEventListener(threading.Thread):
+    """Recebe cópias das mensagens de crud_queue e monitor_queue e repassa como deltas
+
+    Usa uma fila exclusiva ligada às exchanges, sem disputar mensagens com os workers.
+    """
+
+    def __init__(self, host=RABBITMQ_HOST, retry_delay=5.0):
+        super().__init__(name='queue-event-listener', daemon=True)
+        self.host = host
+        self.retry_delay = retry_delay
+        self.connected = False
+
+    def run(self):
+        import pika
+        while True:
+            try:
+                connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+                channel = connection.channel()
+                q = channel.queue_declare(queue='', exclusive=True, auto_delete=True).method.queue
+                crud_keys = ['crud_queue'] if CRUD_PARTITIONS <= 1 else [f'crud_queue.{i}' for i in range(CRUD_PARTITIONS)]
+                bindings = [(CRUD_EXCHANGE, key) for key in crud_keys] + [(MONITOR_EXCHANGE, 'monitor_queue')]
+                for exchange, routing_key in bindings:
+                    channel.exchange_declare(exchange=exchange, exchange_type='direct', durable=True)
+                    channel.queue_bind(queue=q, exchange=exchange, routing_key=routing_key)
+                channel.basic_consume(queue=q, on_message_callback=self._on_message, auto_ack=True)
+                self.connected = True
+                channel.start_consuming()
+            except Exception as e:
+                print(f"⚠️  Listener de eventos desconectado: {e}")
+            self.connected = False
+            time.sleep(self.retry_delay)
+
+    def _on_message(self, ch, method, properties, body):
+        try:
+            message = _decode(properties, body)
+        except Exception:
+            return
+        if method.exchange == MONITOR_EXCHANGE:
+            broadcaster.publish('worker_event', message)
+        else:
+            _apply_crud_delta(message.get('action'), message.get('data', {}))
+
+_listener = None
+_listener_lock = threading.Lock()
+
+def ensure_listener():
+    """Inicia o listener (e o reconciliador do total) na primeira conexão SSE, no processo que serve as requisições"""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = QueueEventListener()
+            _listener.start()
+            if USER_COUNT_RECONCILE_INTERVAL > 0:
+                UserCountReconciler().start()
+    return _listener
+
+@app.route('/api/stream')
+def stream():
+    ensure_listener()
+    q = broadcaster.subscribe()
+
+    def events():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event_type, payload = q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event_type is None:
+                    return
+                yield f'event: {event_type}\ndata: {json.dumps(payload, default=str)}\n\n'
+        finally:
+            broadcaster.unsubscribe(q)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 def run_data_generator():
     """Executa o gerador de dados"""
@@ -466,7 +755,7 @@ def run_data_generator():
                     'email': fake.email(),
                     'value': random.randint(1, 1000)
                 }
-                response = requests.post('http://localhost:5000/api/users', json=payload, timeout=5)
+                response = requests.post(f'{API_HOST}/api/users', json=payload, timeout=5)
                 if response.status_code in (200, 201):
                     add_operation('create', f"Usuário criado: {payload['name']}")
                 else:
@@ -475,7 +764,7 @@ def run_data_generator():
             elif op == 'update' and realtime_data['users']:
                 user = random.choice(realtime_data['users'])
                 payload = {'value': random.randint(100, 1000)}
-                response = requests.put(f"http://localhost:5000/api/users/{user['name']}", json=payload, timeout=5)
+                response = requests.put(f"{API_HOST}/api/users/{user['name']}", json=payload, timeout=5)
                 if response.status_code == 200:
                     add_operation('update', f"Usuário atualizado: {user['name']}")
                 else:
@@ -483,20 +772,21 @@ def run_data_generator():
                     
             elif op == 'delete' and realtime_data['users']:
                 user = random.choice(realtime_data['users'])
-                response = requests.delete(f"http://localhost:5000/api/users/{user['name']}", timeout=5)
+                response = requests.delete(f"{API_HOST}/api/users/{user['name']}", timeout=5)
                 if response.status_code == 200:
                     add_operation('delete', f"Usuário deletado: {user['name']}")
                 else:
                     add_operation('delete', f"Erro ao deletar {user['name']}: {response.status_code}")
             
-            # Atualizar lista de usuários
-            try:
-                response = requests.get('http://localhost:5000/api/users', timeout=5)
-                if response.status_code == 200:
-                    realtime_data['users'] = response.json()
-                    realtime_data['stats']['total_users'] = len(realtime_data['users'])
-            except:
-                pass
+            # A lista de usuários é mantida pelos deltas da fila; sem listener conectado,
+            # recarrega só uma página
+            if not ensure_listener().connected:
+                try:
+                    response = requests.get(f'{API_HOST}/api/users', params={'limit': USER_SNAPSHOT_LIMIT, 'fields': USER_SNAPSHOT_FIELDS}, timeout=5)
+                    if response.status_code == 200:
+                        realtime_data['users'] = response.json()
+                except:
+                    pass
                 
             time.sleep(random.uniform(2, 5))
             
@@ -508,5 +798,9 @@ if __name__ == '__main__':
     print("🚀 Iniciando Monitor em Tempo Real...")
     print("📊 Dashboard disponível em: http://localhost:8000")
     print("⏹️  Pressione Ctrl+C para parar")
-    
+
+    # com o reloader do debug, só o processo filho consome a monitor_queue
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        monitor_consumer.start()
+
     app.run(host='0.0.0.0', port=8000, debug=True)
@@ -1,14 +1,43 @@
-import pytest
-from pymongo import MongoClient
-from api.repositories.user_repository import UserRepository
-import mongomock
 import os
 import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, "api")
+WORKER_DIR = os.path.join(ROOT, "worker")
+
+# Os serviços importam pelo nome de topo (from config import ...), como no container: os testes
+# também, senão api.controllers.user_controller e controllers.user_controller seriam dois módulos
+# e os patches não chegariam no app
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+# módulos de topo do worker; vários têm o mesmo nome que os da API (config, repositories, messaging)
+_WORKER_NAMES = {os.path.splitext(name)[0] for name in os.listdir(WORKER_DIR) if not name.startswith((".", "_"))}
+_worker_modules = {}
+
+def _top_level(names):
+    return {name: module for name, module in sys.modules.items() if name.split(".")[0] in names}
+
+@pytest.fixture
+def worker_path(monkeypatch):
+    """Troca api/ por worker/ no sys.path durante o teste (pytestmark dos testes do worker)"""
+    api_modules = _top_level(_WORKER_NAMES)
+    for name in api_modules:
+        del sys.modules[name]
+    sys.modules.update(_worker_modules)
+    monkeypatch.setattr(sys, "path", [WORKER_DIR] + [p for p in sys.path if p != API_DIR])
+    yield
+    # os módulos do worker ficam guardados para os próximos testes não reimportarem tudo
+    _worker_modules.update(_top_level(_WORKER_NAMES))
+    for name in _top_level(_WORKER_NAMES):
+        del sys.modules[name]
+    sys.modules.update(api_modules)
 
 @pytest.fixture
 def mongo_mock(monkeypatch):
     # patch MongoClient in repository to use mongomock
-    import api.repositories.user_repository as repo_module
+    import repositories.user_repository as repo_module
     from mongomock import MongoClient as MockClient
     monkeypatch.setattr(repo_module, "MongoClient", MockClient)
     return MockClient()
@@ -1,6 +1,7 @@
 import pytest
-from api.app import create_app
+from app import create_app
 from unittest.mock import patch, MagicMock
+from config import DEFAULT_PAGE_SIZE
 
 @pytest.fixture
 def client():
@@ -9,7 +10,7 @@ def client():
     with app.test_client() as client:
         yield client
 
-@patch("api.controllers.user_controller.service")
+@patch("controllers.user_controller.service")
 def test_create_user(mock_service, client):
     mock_service.create_user.return_value = "fakeid"
     resp = client.post("/api/users", json={"name":"Alice","email":"a@b.com"})
@@ -17,9 +18,161 @@ def test_create_user(mock_service, client):
     data = resp.get_json()
     assert "id" in data
 
-@patch("api.controllers.user_controller.service")
+@patch("controllers.user_controller.service")
 def test_list_users(mock_service, client):
     mock_service.list_users.return_value = [{"name":"Alice"}]
     resp = client.get("/api/users")
     assert resp.status_code == 200
     assert resp.get_json() == [{"name":"Alice"}]
+    # sem limit é a primeira página, não a coleção inteira
+    mock_service.list_users.assert_called_with(after=None, limit=DEFAULT_PAGE_SIZE, filters={}, fields=None, sort=None)
+    assert "X-Next-After" not in resp.headers
+
+@patch("controllers.user_controller.service")
+def test_list_users_page(mock_service, client):
+    mock_service.list_users.return_value = [{"id": "64b000000000000000000001", "name": "Alice"}]
+    resp = client.get("/api/users?limit=1")
+    assert resp.status_code == 200
+    assert resp.headers["X-Next-After"] == "64b000000000000000000001"
+    mock_service.list_users.assert_called_with(after=None, limit=1, filters={}, fields=None, sort=None)
+
+@patch("controllers.user_controller.service")
+def test_list_users_filters_fields_and_top_n(mock_service, client):
+    mock_service.list_users.return_value = [{"id": "64b000000000000000000001", "value": 9}]
+    resp = client.get("/api/users?fields=name,value&name=Alice&value_min=5&sort=-value&limit=1")
+    assert resp.status_code == 200
+    assert "X-Next-After" not in resp.headers
+    mock_service.list_users.assert_called_with(
+        after=None, limit=1, filters={"name": {"eq": "Alice"}, "value": {"gte": 5}},
+        fields=("name", "value"), sort=("value", -1))
+    assert client.get("/api/users?fields=password").status_code == 400
+    assert client.get("/api/users?value_max=abc").status_code == 400
+    assert client.get("/api/users?sort=-value&after=64b000000000000000000001").status_code == 400
+
+@patch("controllers.user_controller.service")
+def test_users_stats(mock_service, client):
+    mock_service.user_stats.return_value = {"count": 3, "approx": True}
+    resp = client.get("/api/users/stats?approx=1")
+    assert resp.status_code == 200
+    assert resp.get_json()["count"] == 3
+    mock_service.user_stats.assert_called_with(filters={}, buckets=None, approx=True)
+    assert client.get("/api/users/stats?buckets=10,5").status_code == 400
+    assert client.get("/api/users/stats?approx=1&name=Ana").status_code == 400
+
+@patch("controllers.user_controller.service")
+def test_list_users_stream(mock_service, client):
+    mock_service.iter_users.return_value = iter([{"name": "Alice"}, {"name": "Bob"}])
+    resp = client.get("/api/users?stream=1")
+    assert resp.status_code == 200
+    assert resp.get_json() == [{"name": "Alice"}, {"name": "Bob"}]
+
+@patch("controllers.user_controller.service")
+def test_batch_rejects_invalid_ops(mock_service, client):
+    resp = client.post("/api/users/batch", json=[
+        {"op": "create", "data": {"name": "Alice"}},
+        {"op": "update", "name": "Bob", "data": {"bogus": 1}},
+    ])
+    assert resp.status_code == 400
+    assert resp.get_json()["error"][0]["index"] == 1
+    mock_service.apply_batch.assert_not_called()
+
+@patch("controllers.user_controller.service")
+def test_metrics_endpoint(mock_service, client):
+    mock_service.list_users.return_value = []
+    client.get("/api/users")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.content_type.startswith("text/plain")
+    assert 'api_request_seconds_count{method="GET",route="/api/users",status="200"}' in resp.get_data(as_text=True)
+
+@patch("controllers.user_controller.service")
+def test_update_user_validates_body(mock_service, client):
+    mock_service.update_user_by_name.return_value = 1
+    assert client.put("/api/users/Alice", json={"value": "abc"}).status_code == 400
+    assert client.put("/api/users/Alice", json={"bogus": 1}).status_code == 400
+    assert client.put("/api/users/Alice", json={}).status_code == 400
+    mock_service.update_user_by_name.assert_not_called()
+    assert client.put("/api/users/Alice", json={"value": "3"}).status_code == 200
+    mock_service.update_user_by_name.assert_called_with("Alice", {"value": 3})
+
+def test_compiled_validators_match_pydantic():
+    from pydantic import ValidationError
+    from models.user_model import User
+    from schemas.user_schema import validate_user, _field_specs
+    # constr/min_length vira subclasse de str: o caminho rápido precisa enxergar o tipo base
+    assert {name: type_ for name, type_, *_ in _field_specs(User)}["name"] is str
+    payloads = [
+        {"name": "Ana", "email": "a@b.com", "value": 1, "extra": True},
+        {"name": "Ana", "value": None},
+        {"name": "Ana", "value": "7"},
+        {"name": "Ana", "value": True},
+        {"name": 5},
+    ]
+    for payload in payloads:
+        assert validate_user(payload) == User(**payload).dict(exclude_none=True)
+    for payload in ({"email": "a@b.com"}, {"name": ""}, {"name": "Ana", "value": "x"}):
+        with pytest.raises(ValidationError):
+            validate_user(payload)
+
+def test_lazy_service_is_created_on_first_use():
+    from container import LazyService
+    factory = MagicMock()
+    service = LazyService(factory)
+    assert not service.started
+    factory.assert_not_called()
+    service.list_users(limit=1)
+    service.get_user("x")
+    factory.assert_called_once_with()
+    assert service.started and "service" in service.startup
+
+def test_import_app_opens_no_connections():
+    import os
+    import subprocess
+    import sys
+    import textwrap
+    from conftest import API_DIR
+    # processo novo: neste, o app já foi importado na coleta dos testes
+    code = textwrap.dedent("""
+        import socket, threading, time
+        attempts = []
+        def record(name):
+            return lambda *args, **kwargs: attempts.append(name) or (_ for _ in ()).throw(OSError(name))
+        socket.getaddrinfo = record("getaddrinfo")
+        socket.socket.connect = record("connect")
+        socket.create_connection = record("create_connection")
+        import app
+        time.sleep(0.3)
+        print(sorted(set(attempts)), sorted(t.name for t in threading.enumerate()))
+    """)
+    env = {**os.environ, "PYTHONPATH": API_DIR}
+    out = subprocess.run([sys.executable, "-c", code], cwd=API_DIR, env=env, capture_output=True, text=True,
+                         timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "[] ['MainThread']"
+
+@patch("app.service")
+def test_ready_reports_dependency_latency(mock_service, client):
+    mock_service.startup = {"import": 0.5}
+    resp = client.get("/ready")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["ready"] is True
+    assert set(body["dependencies"]) == {"mongo", "rabbitmq"}
+    assert body["dependencies"]["mongo"]["latency_ms"] >= 0
+    mock_service.producer.ping.side_effect = ConnectionError("broker down")
+    resp = client.get("/ready")
+    assert resp.status_code == 503
+    rabbitmq = resp.get_json()["dependencies"]["rabbitmq"]
+    assert rabbitmq["ok"] is False and rabbitmq["error"] == "broker down"
+
+@patch("controllers.user_controller.service")
+def test_writes_are_shed_with_429_under_backpressure(mock_service, client):
+    from controllers import user_controller
+    with patch.object(user_controller, "backpressure") as bp:
+        bp.admit.side_effect = lambda operation: 5 if operation == "clear_all" else None
+        resp = client.delete("/api/clear-all")
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "5"
+        mock_service.clear_all_users.assert_not_called()
+        mock_service.delete_user_by_name.return_value = 1
+        assert client.delete("/api/users/Ana").status_code == 200
@@ -0,0 +1,8 @@
+from benchmarks import harness
+
+def test_compare_flags_only_regressions_above_threshold():
+    baseline = {"a": {"median_us": 10.0}, "b": {"median_us": 10.0}, "c": {"median_us": 10.0}}
+    current = {"a": {"median_us": 12.0}, "b": {"median_us": 14.0}, "c": {"median_us": 5.0}, "new": {"median_us": 1.0}}
+    regressions = harness.compare(baseline, current, threshold=0.25)
+    assert [r["name"] for r in regressions] == ["b"]
+    assert regressions[0]["change"] == 0.4
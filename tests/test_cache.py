@@ -0,0 +1,94 @@
+import time
+from unittest.mock import MagicMock
+from services.cache import TTLCache
+
+def test_cache_lru_and_ttl():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 2, 1)
+
+def test_service_list_is_cached_until_a_write():
+    from services.user_services import UserService
+    repo = MagicMock()
+    repo.read_page.return_value = [{"id": "1", "name": "Alice"}]
+    service = UserService(repo=repo, producer=MagicMock(), cache_enabled=True)
+    service.list_users(limit=10)
+    service.list_users(limit=10)
+    assert repo.read_page.call_count == 1
+    service.update_user_by_name("Alice", {"value": 2})
+    service.list_users(limit=10)
+    assert repo.read_page.call_count == 2
+
+def test_service_caches_only_bounded_pages_and_returns_copies():
+    from services.user_services import UserService
+    repo = MagicMock()
+    repo.read_all.return_value = [{"id": "1", "name": "Alice"}]
+    repo.read_page.return_value = [{"id": "1", "name": "Alice"}]
+    service = UserService(repo=repo, producer=MagicMock(), cache_enabled=True)
+    service.list_users()
+    service.list_users()
+    assert repo.read_all.call_count == 2
+    assert service.list_cache.stats()["size"] == 0
+    page = service.list_users(limit=10)
+    page[0]["name"] = "changed"
+    page.append({"id": "2"})
+    assert service.list_users(limit=10) == [{"id": "1", "name": "Alice"}]
+    assert repo.read_page.call_count == 1
+
+def test_writes_invalidate_only_the_pages_they_can_change():
+    from bson import ObjectId
+    from services.user_services import UserService
+    ids = [str(ObjectId()) for _ in range(4)]
+    pages = {None: [{"id": ids[0], "name": "Ana"}, {"id": ids[1], "name": "Bia"}],
+             ids[1]: [{"id": ids[2], "name": "Caio"}]}
+    repo = MagicMock()
+    repo.read_page.side_effect = lambda after, limit, **query: pages[after]
+    service = UserService(repo=repo, producer=MagicMock(), cache_enabled=True)
+
+    def load_all():
+        service.list_users(limit=2)
+        service.list_users(after=ids[1], limit=2)
+        return repo.read_page.call_count
+
+    assert load_all() == 2
+    # documento novo (id maior): só a última página, que não está cheia
+    service.invalidate_for("create", {"id": str(ObjectId()), "name": "Duda"})
+    assert load_all() == 3
+    # update e delete por name: só a página onde o nome está
+    service.invalidate_for("update", {"name": "Bia", "new_data": {"value": 2}})
+    assert load_all() == 4
+    service.invalidate_for("delete", {"name": "Zé"})
+    assert load_all() == 4
+    service.invalidate_for("clear_all", {"deleted_count": 3})
+    assert load_all() == 6
+
+def test_listener_passes_the_decoded_write():
+    import json
+    from services.cache_invalidation import CacheInvalidationListener
+    on_event = MagicMock()
+    listener = CacheInvalidationListener(on_event=on_event)
+    body = json.dumps({"action": "delete", "data": {"name": "Ana"}}).encode()
+    listener._on_message(None, None, MagicMock(content_type="application/json"), body)
+    on_event.assert_called_once_with("delete", {"name": "Ana"})
+
+def test_async_service_caches_missing_users():
+    import asyncio
+    from unittest.mock import AsyncMock
+    from services.async_user_services import AsyncUserService
+    repo = MagicMock()
+    repo.read_by_id = AsyncMock(return_value=None)
+    service = AsyncUserService(repo=repo, producer=MagicMock(), cache_enabled=True)
+
+    async def scenario():
+        assert await service.get_user("64b000000000000000000001") is None
+        assert await service.get_user("64b000000000000000000001") is None
+    asyncio.run(scenario())
+    # como no UserService: o None fica em cache e a segunda leitura não vai ao Mongo
+    assert repo.read_by_id.await_count == 1
@@ -0,0 +1,57 @@
+import json
+import os
+import urllib.request
+from metrics import Registry, start_http_server, MultiProcessCollector, mark_process_dead
+
+def test_render_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requisições", ("route",))
+    latency = registry.histogram("latency_seconds", "Latência", ("stage",), buckets=(0.1, 1.0))
+    requests.labels('/a"b').inc()
+    requests.labels('/a"b').inc(2)
+    latency.labels("mongo").observe(0.05)
+    latency.labels("mongo").observe(0.5)
+    with latency.labels("mongo").time():
+        pass
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{route="/a\\"b"} 3' in text
+    assert 'latency_seconds_bucket{stage="mongo",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{stage="mongo",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="mongo"} 3' in text
+    # registrar de novo devolve a mesma métrica
+    assert registry.counter("requests_total", "Requisições", ("route",)) is requests
+
+def test_http_side_port_serves_metrics():
+    registry = Registry()
+    registry.counter("acks_total", "Acks").inc()
+    server = start_http_server(0, registry=registry, host="127.0.0.1")
+    try:
+        port = server.server_address[1]
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+        assert "acks_total 1" in body
+    finally:
+        server.shutdown()
+
+def _worker_registry(requests, seconds, level):
+    registry = Registry()
+    registry.counter("requests_total", "Requisições", ("route",)).labels("/a").inc(requests)
+    registry.histogram("latency_seconds", "Latência", buckets=(0.1, 1.0)).observe(seconds)
+    registry.gauge("level", "Nível").set(level)
+    return registry
+
+def test_multiprocess_collector_sums_all_workers(tmp_path):
+    # outro worker do gunicorn já gravou o snapshot dele
+    (tmp_path / "111.json").write_text(json.dumps(_worker_registry(2, 0.5, 1).snapshot()))
+    collector = MultiProcessCollector(str(tmp_path), registry=_worker_registry(3, 0.05, 0))
+    text = collector.render()
+    assert 'requests_total{route="/a"} 5' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_count 2' in text
+    # gauges não somam: um por processo
+    assert 'level{pid="111"} 1' in text
+    assert f'level{{pid="{os.getpid()}"}} 0' in text
+    mark_process_dead(str(tmp_path), 111)
+    text = collector.render()
+    assert 'requests_total{route="/a"} 5' in text
+    assert 'pid="111"' not in text
@@ -0,0 +1,67 @@
+from monitor_stats import WorkerStatsAggregator
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_sliding_windows_per_worker_and_action():
+    clock = Clock(1000)
+    agg = WorkerStatsAggregator(clock=clock)
+    agg.add_batch([
+        {"type": "event", "worker_id": "w1", "action": "create", "status": "success", "latency_ms": 2.0},
+        {"type": "event", "worker_id": "w1", "action": "create", "status": "error", "error": "boom", "latency_ms": 4.0},
+    ])
+    clock.now = 1030
+    agg.add_batch([{
+        "type": "summary", "worker_id": "w2",
+        "actions": {"create": {"success": 10, "error": 0, "latency_ms": {"sum": 10.0, "count": 10}}},
+    }])
+    snap = agg.snapshot()
+    w1 = snap["workers"]["w1"]["actions"]["create"]
+    assert w1["1s"]["count"] == 0
+    assert w1["1m"]["count"] == 2 and w1["1m"]["error_rate"] == 0.5
+    assert w1["1m"]["avg_latency_ms"] == 3.0
+    assert snap["workers"]["w2"]["actions"]["create"]["1s"]["count"] == 10
+    assert snap["fleet"]["create"]["15m"]["count"] == 12
+
+def test_idle_series_are_dropped():
+    clock = Clock(1000)
+    agg = WorkerStatsAggregator(clock=clock)
+    agg.add_batch([{"worker_id": "old", "action": "delete", "status": "success"}])
+    clock.now = 1000 + 901
+    assert agg.snapshot()["workers"] == {}
+
+def test_realtime_total_users_is_reconciled_with_the_api(monkeypatch):
+    from unittest.mock import MagicMock
+    import realtime_monitor
+    monkeypatch.setitem(realtime_monitor.realtime_data, "users", [{"name": "Ana"}])
+    monkeypatch.setitem(realtime_monitor.realtime_data, "stats", {"total_users": 1, "total_operations": 0})
+    # snapshot completo: delete de um nome desconhecido não mexe no total
+    realtime_monitor._apply_crud_delta("delete", {"name": "Zé"})
+    assert realtime_monitor.realtime_data["stats"]["total_users"] == 1
+    # a mesma criação vista duas vezes infla o total até a próxima reconciliação
+    realtime_monitor._apply_crud_delta("create", {"name": "Bia"})
+    realtime_monitor._apply_crud_delta("create", {"name": "Bia"})
+    assert realtime_monitor.realtime_data["stats"]["total_users"] == 3
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"count": 2, "approx": True}
+    monkeypatch.setattr(realtime_monitor.requests, "get", MagicMock(return_value=response))
+    assert realtime_monitor.reconcile_total_users() is True
+    assert realtime_monitor.realtime_data["stats"]["total_users"] == 2
+    assert realtime_monitor.reconcile_total_users() is False
+
+def test_realtime_user_list_is_capped(monkeypatch):
+    import realtime_monitor
+    monkeypatch.setattr(realtime_monitor, "USER_SNAPSHOT_LIMIT", 3)
+    monkeypatch.setitem(realtime_monitor.realtime_data, "users", [])
+    monkeypatch.setitem(realtime_monitor.realtime_data, "stats", {"total_users": 0, "total_operations": 0})
+    for i in range(5):
+        realtime_monitor._apply_crud_delta("create", {"name": f"u{i}"})
+    assert [u["name"] for u in realtime_monitor.realtime_data["users"]] == ["u2", "u3", "u4"]
+    assert realtime_monitor.realtime_data["stats"]["total_users"] == 5
+    # delete de um usuário que já saiu da lista ainda conta no total
+    realtime_monitor._apply_crud_delta("delete", {"name": "u0"})
+    assert realtime_monitor.realtime_data["stats"]["total_users"] == 4
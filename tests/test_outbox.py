@@ -0,0 +1,89 @@
+import time
+import pytest
+from unittest.mock import MagicMock
+from pika.exceptions import AMQPError
+from repositories.user_repository import UserRepository
+from repositories.outbox_repository import OutboxRepository
+from services.outbox_relay import OutboxRelay
+from services.user_services import UserService
+
+def make_service():
+    repo = UserRepository(mongo_uri="mongodb://localhost")
+    producer = MagicMock()
+    service = UserService(repo=repo, producer=producer, outbox=OutboxRepository(client=repo.client, transactions=False))
+    return service, producer
+
+def test_writes_go_to_outbox_not_broker(mongo_mock):
+    service, producer = make_service()
+    user_id = service.create_user({"name": "Ana", "value": 1})
+    service.update_user_by_name("Ana", {"value": 2})
+    producer.publish.assert_not_called()
+    records = list(service.outbox.collection.find().sort("_id", 1))
+    assert [r["action"] for r in records] == ["create", "update"]
+    assert records[0]["data"]["id"] == user_id
+
+def test_relay_publishes_in_order_and_deletes(mongo_mock):
+    service, producer = make_service()
+    for name in ("A", "B", "C"):
+        service.create_user({"name": name})
+    relay = OutboxRelay(service.outbox, producer, batch_size=2)
+    assert relay.relay_once() == 2
+    assert relay.relay_once() == 1
+    assert [c.args[1]["name"] for c in producer.publish.call_args_list] == ["A", "B", "C"]
+    # o message_id gravado no outbox segue na mensagem (dedup no worker)
+    assert len({c.kwargs["message_id"] for c in producer.publish.call_args_list}) == 3
+    stats = relay.stats()
+    assert (stats["pending"], stats["batches"], stats["max_batch_size"]) == (0, 2, 2)
+
+def test_relay_releases_unsent_records_on_broker_error(mongo_mock):
+    service, producer = make_service()
+    for name in ("A", "B"):
+        service.create_user({"name": name})
+    producer.publish.side_effect = [None, AMQPError("down")]
+    relay = OutboxRelay(service.outbox, producer)
+    try:
+        relay.relay_once()
+    except AMQPError:
+        pass
+    remaining = list(service.outbox.collection.find())
+    assert [(r["data"]["name"], r["lease_until"]) for r in remaining] == [("B", 0)]
+
+def test_relay_stops_at_half_the_lease_and_releases_the_rest(mongo_mock):
+    service, producer = make_service()
+    for name in ("A", "B", "C"):
+        service.create_user({"name": name})
+    # confirms lentos: o segundo registro já passaria da metade do lease
+    producer.publish.side_effect = lambda *args, **kwargs: time.sleep(0.03)
+    relay = OutboxRelay(service.outbox, producer, lease_seconds=0.05)
+    assert relay.relay_once() == 1
+    remaining = list(service.outbox.collection.find().sort("_id", 1))
+    assert [(r["data"]["name"], r["lease_until"]) for r in remaining] == [("B", 0), ("C", 0)]
+
+def test_transactions_require_replica_set_or_mongos():
+    client = MagicMock()
+    outbox = OutboxRepository(client=client, transactions=True)
+    client.admin.command.return_value = {"isWritablePrimary": True}
+    with pytest.raises(RuntimeError, match="replica set"):
+        outbox.check_transactions()
+    client.admin.command.return_value = {"isWritablePrimary": True, "setName": "rs0"}
+    outbox.check_transactions()
+    client.admin.command.return_value = {"msg": "isdbgrid"}
+    outbox.check_transactions()
+
+def test_only_the_lease_holder_relays(mongo_mock):
+    service, producer = make_service()
+    for name in ("A", "B"):
+        service.create_user({"name": name})
+    first = OutboxRelay(service.outbox, producer, batch_size=1, lease_seconds=0.05)
+    other_producer = MagicMock()
+    second = OutboxRelay(service.outbox, other_producer, batch_size=1, lease_seconds=0.05)
+    assert first.relay_once() == 1
+    # outro processo da API não publica enquanto o lease do primeiro vale
+    assert second.relay_once() == 0
+    other_producer.publish.assert_not_called()
+    time.sleep(0.06)
+    assert second.relay_once() == 1
+    assert first.relay_once() == 0
+    assert [c.args[1]["name"] for c in producer.publish.call_args_list + other_producer.publish.call_args_list] == ["A", "B"]
+    second.outbox.resign(second.owner)
+    assert first.relay_once() == 0 and first.leader
@@ -0,0 +1,68 @@
+from unittest.mock import MagicMock
+import pytest
+from messaging import channel_pool
+from messaging.channel_pool import ChannelPool, PoolExhausted
+
+@pytest.fixture
+def fake_pika(monkeypatch):
+    connect = MagicMock(side_effect=lambda params: MagicMock())
+    monkeypatch.setattr(channel_pool.pika, "BlockingConnection", connect)
+    return connect
+
+def test_pool_reuses_channels_and_enables_confirms(fake_pika):
+    pool = ChannelPool("localhost", size=2)
+    with pool.acquire() as first:
+        first.confirm_delivery.assert_called_once()
+    with pool.acquire() as second:
+        assert second is first
+    assert fake_pika.call_count == 1
+
+def test_pool_is_bounded(fake_pika):
+    pool = ChannelPool("localhost", size=1, acquire_timeout=0.01)
+    with pool.acquire():
+        with pytest.raises(PoolExhausted):
+            with pool.acquire():
+                pass
+
+def test_pool_warm_opens_idle_connections_up_to_size(fake_pika):
+    pool = ChannelPool("localhost", size=2)
+    assert pool.warm(5) == 2
+    assert pool.warm(5) == 0
+    with pool.acquire():
+        with pool.acquire():
+            pass
+    assert fake_pika.call_count == 2
+
+def test_partition_routing_keeps_each_user_on_one_queue():
+    from messaging.partitions import partition_for, partition_queues, route
+    assert partition_queues("crud_queue", 1) == ["crud_queue"]
+    assert route("update", {"name": "Ana"}, "m1", 1) == [(0, {"name": "Ana"}, "m1")]
+    names = [f"user{i}" for i in range(2000)]
+    before = [partition_for(name, 4) for name in names]
+    assert set(before) == {0, 1, 2, 3}
+    # jump hash: de 4 para 5 partições só ~1/5 das chaves muda de fila
+    moved = sum(a != partition_for(name, 5) for a, name in zip(before, names))
+    assert moved < len(names) * 0.3
+    ana = partition_for("Ana", 4)
+    assert route("create", {"name": "Ana", "id": "x"}, "m1", 4)[0][0] == ana
+    assert route("delete", {"name": "Ana"}, "m2", 4)[0][0] == ana
+    ops = [{"action": "update", "data": {"name": name, "new_data": {}}} for name in ("Ana", "Bia", "Ana")]
+    parts = route("batch", {"ops": ops}, "m3", 4)
+    assert sum(len(data["ops"]) for _, data, _ in parts) == 3
+    for partition, data, message_id in parts:
+        assert all(partition_for(op["data"]["name"], 4) == partition for op in data["ops"])
+        assert message_id == "m3" or message_id.startswith("m3.")
+
+def test_codecs_roundtrip_objectid_and_datetime():
+    from datetime import datetime
+    from bson import ObjectId
+    from messaging.codecs import CODECS, get_codec
+    _id = ObjectId()
+    when = datetime(2024, 1, 2, 3, 4, 5)
+    for codec in CODECS.values():
+        decoded = codec.decode(codec.encode({"id": _id, "at": when, "n": 1}))
+        assert decoded["id"] == str(_id)
+        assert decoded["at"].startswith("2024-01-02T03:04:05")
+    assert get_codec(None).content_type == "application/json"
+    with pytest.raises(ValueError):
+        get_codec("application/x-unknown")
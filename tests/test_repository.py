@@ -1,10 +1,74 @@
-from api.repositories.user_repository import UserRepository
+from repositories.user_repository import UserRepository
 
 def test_create_and_read(mongo_mock):
-    repo = UserRepository(mongo_uri="mongomock://localhost")
+    repo = UserRepository(mongo_uri="mongodb://localhost")
     user = {"name":"Test","value":10}
     inserted_id = repo.create(user)
     assert inserted_id is not None
     all_users = repo.read_all()
     assert isinstance(all_users, list)
     assert any(u["name"] == "Test" for u in all_users)
+
+def test_read_page_keyset(mongo_mock):
+    repo = UserRepository(mongo_uri="mongodb://localhost")
+    for i in range(5):
+        repo.create({"name": f"U{i}", "value": i})
+    first = repo.read_page(limit=2)
+    assert [u["name"] for u in first] == ["U0", "U1"]
+    second = repo.read_page(after=first[-1]["id"], limit=2)
+    assert [u["name"] for u in second] == ["U2", "U3"]
+    assert all("_id" not in u for u in second)
+
+def test_read_page_filters_projection_and_sort(mongo_mock):
+    repo = UserRepository(mongo_uri="mongodb://localhost")
+    for i in range(6):
+        repo.create({"name": f"U{i}", "email": f"u{i}@x.com", "value": i})
+    page = repo.read_page(limit=2, filters={"value": {"gte": 1, "lte": 4}}, fields=("name",), sort=("value", -1))
+    assert page == [{"name": "U4", "id": page[0]["id"]}, {"name": "U3", "id": page[1]["id"]}]
+    assert [u["value"] for u in repo.read_all(filters={"email": {"eq": "u2@x.com"}})] == [2]
+
+def test_stats_aggregates_value_server_side(mongo_mock):
+    repo = UserRepository(mongo_uri="mongodb://localhost")
+    for value in (1, 5, 12, 40):
+        repo.create({"name": f"U{value}", "value": value})
+    stats = repo.stats(buckets=[0, 10, 20])
+    assert stats["count"] == 4
+    assert stats["value"] == {"sum": 58, "avg": 14.5, "min": 1, "max": 40}
+    assert [b["count"] for b in stats["histogram"]["buckets"]] == [2, 1]
+    assert stats["histogram"]["other"] == 1
+    assert repo.stats(filters={"value": {"gte": 10}})["count"] == 2
+    assert repo.estimated_count() == 4
+
+def test_iter_all_streams_every_doc(mongo_mock):
+    repo = UserRepository(mongo_uri="mongodb://localhost")
+    for i in range(5):
+        repo.create({"name": f"U{i}"})
+    names = [u["name"] for u in repo.iter_all(batch_size=2)]
+    assert names == ["U0", "U1", "U2", "U3", "U4"]
+
+def test_bulk_apply_mixed_ops(mongo_mock):
+    repo = UserRepository(mongo_uri="mongodb://localhost")
+    repo.create({"name": "Old", "value": 1})
+    outcome = repo.bulk_apply([
+        {"op": "create", "data": {"name": "New", "value": 2}},
+        {"op": "update", "name": "Old", "data": {"value": 5}},
+        {"op": "delete", "name": "New"},
+    ])
+    assert [r["status"] for r in outcome["results"]] == ["ok", "ok", "ok"]
+    assert "id" in outcome["results"][0]
+    assert (outcome["inserted"], outcome["modified"], outcome["deleted"]) == (1, 1, 1)
+    assert [(u["name"], u["value"]) for u in repo.read_all()] == [("Old", 5)]
+
+def test_index_manager_flags_collscan():
+    from unittest.mock import MagicMock
+    from repositories.indexes import IndexManager
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value = collection.find.return_value
+    collection.find.return_value.limit.return_value.explain.return_value = {
+        "queryPlanner": {"winningPlan": {"stage": "LIMIT", "inputStage": {"stage": "COLLSCAN"}}}
+    }
+    manager = IndexManager(collection, hot_queries={"by_name": ({"name": "x"}, None)})
+    report = manager.ensure()
+    collection.create_indexes.assert_called_once()
+    assert report["collscans"] == ["by_name"]
+    assert report["query_plans"]["by_name"]["stages"] == ["LIMIT", "COLLSCAN"]
@@ -0,0 +1,306 @@
+import json
+from unittest.mock import MagicMock
+import mongomock
+import pytest
+from bson import ObjectId
+
+# worker/ no lugar de api/ no sys.path (ver conftest.py)
+pytestmark = pytest.mark.usefixtures("worker_path")
+
+@pytest.fixture
+def worker_repo(monkeypatch):
+    import repositories.user_repository as repo_module
+    monkeypatch.setattr(repo_module, "MongoClient", mongomock.MongoClient)
+    return repo_module.UserRepository(mongo_uri="mongodb://localhost")
+
+@pytest.fixture
+def no_broker(monkeypatch):
+    import pika
+    monkeypatch.setattr(pika, "BlockingConnection", MagicMock())
+
+def _properties(message_id=None, headers=None):
+    return MagicMock(content_type=None, message_id=message_id, headers=headers)
+
+def _delivery(tag, action, data, **properties):
+    return MagicMock(delivery_tag=tag), _properties(**properties), json.dumps({"action": action, "data": data}).encode()
+
+def test_batch_flush_single_bulk_and_multi_ack(worker_repo, no_broker):
+    from processing.batch_handler import BatchMessageHandler
+    handler = BatchMessageHandler(repo=worker_repo, monitor=MagicMock(), batch_size=3)
+    _id = ObjectId()
+    worker_repo.insert({"_id": _id, "name": "Ana", "value": 1})
+    pending = [
+        _delivery(1, "create", {"name": "Bia"}),
+        _delivery(2, "update", {"id": str(_id), "value": 2}),
+        _delivery(3, "delete", {"id": str(ObjectId())}),
+    ]
+    handler._flush(pending)
+    handler.channel.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+    handler.channel.basic_nack.assert_not_called()
+    assert worker_repo.find_by_id(str(_id))["value"] == 2
+    assert worker_repo.collection.count_documents({}) == 2
+
+def test_batch_flush_dead_letters_only_bad_messages(worker_repo, no_broker):
+    from processing.batch_handler import BatchMessageHandler
+    handler = BatchMessageHandler(repo=worker_repo, monitor=MagicMock(), batch_size=2)
+    bad = (MagicMock(delivery_tag=1, routing_key="crud_queue"), _properties(), b"not json")
+    handler._flush([bad, _delivery(2, "create", {"name": "Bia"})])
+    # ilegível: vai direto para a DLQ, sem passar pelos degraus de espera
+    handler.channel.basic_nack.assert_not_called()
+    publish = handler.channel.basic_publish.call_args.kwargs
+    assert (publish["exchange"], publish["routing_key"], publish["body"]) == ("", "crud_dead", b"not json")
+    handler.channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+    assert worker_repo.collection.count_documents({}) == 1
+
+def test_failed_write_goes_to_retry_tier_then_dead_letter_queue(worker_repo, no_broker):
+    from processing.message_handler import MessageHandler
+    from processing.retry import RetryPolicy
+    handler = MessageHandler(repo=worker_repo, monitor=MagicMock(),
+                             retry_policy=RetryPolicy(delays_ms=(1000, 5000), max_attempts=3))
+    worker_repo.upsert = MagicMock(side_effect=RuntimeError("mongo down"))
+    tiers = []
+    for tag, attempts in ((1, None), (2, 1), (3, 2)):
+        method, properties, body = _delivery(tag, "create", {"id": str(ObjectId()), "name": "Ana"},
+                                             headers={"x-attempts": attempts} if attempts else None)
+        method.routing_key = "crud_queue.3"
+        handler._on_message(handler.channel, method, properties, body)
+        publish = handler.channel.basic_publish.call_args.kwargs
+        tiers.append((publish["exchange"], publish["routing_key"], publish["properties"].headers["x-attempts"]))
+        handler.channel.basic_ack.assert_called_with(delivery_tag=tag)
+    assert tiers == [("crud_retry.1000ms", "crud_queue.3", 1), ("crud_retry.5000ms", "crud_queue.3", 2),
+                     ("", "crud_dead", 3)]
+    assert publish["properties"].headers["x-original-routing-key"] == "crud_queue.3"
+    assert publish["properties"].headers["x-last-error"] == "mongo down"
+
+def test_retry_tiers_return_only_to_partition_queues(no_broker):
+    from processing.retry import RetryPolicy, RETURN_EXCHANGE
+    channel = MagicMock()
+    RetryPolicy(delays_ms=(1000,)).declare(channel, ["crud_queue.0", "crud_queue.1"])
+    tier = channel.queue_declare.call_args_list[0].kwargs
+    assert tier["arguments"]["x-dead-letter-exchange"] == RETURN_EXCHANGE != "crud_events"
+    # nada de binding na crud_events: os listeners dela não veem as tentativas
+    bindings = [(c.kwargs["exchange"], c.kwargs.get("routing_key")) for c in channel.queue_bind.call_args_list]
+    assert bindings == [(RETURN_EXCHANGE, "crud_queue.0"), (RETURN_EXCHANGE, "crud_queue.1"),
+                        ("crud_retry.1000ms", None)]
+
+def test_permanent_errors_skip_the_retry_tiers(worker_repo, no_broker):
+    from processing.message_handler import MessageHandler
+    handler = MessageHandler(repo=worker_repo, monitor=MagicMock())
+    # id que não é ObjectId: InvalidId em qualquer tentativa, então vai direto para a DLQ
+    method, properties, body = _delivery(1, "update", {"id": "not-an-object-id", "value": 1})
+    method.routing_key = "crud_queue"
+    handler._on_message(handler.channel, method, properties, body)
+    publish = handler.channel.basic_publish.call_args.kwargs
+    assert (publish["exchange"], publish["routing_key"]) == ("", "crud_dead")
+    assert publish["properties"].headers["x-attempts"] == 1
+    handler.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+
+def test_batch_flush_coalesces_writes_per_document(worker_repo, no_broker):
+    from processing.batch_handler import BatchMessageHandler
+    monitor = MagicMock()
+    handler = BatchMessageHandler(repo=worker_repo, monitor=monitor, batch_size=4)
+    kept, gone = ObjectId(), ObjectId()
+    worker_repo.insert({"_id": kept, "name": "Ana", "value": 1})
+    worker_repo.insert({"_id": gone, "name": "Bia", "value": 1})
+    worker_repo.bulk_write = MagicMock(wraps=worker_repo.bulk_write)
+    handler._flush([
+        _delivery(1, "update", {"id": str(kept), "value": 2}),
+        _delivery(2, "update", {"id": str(gone), "value": 2}),
+        _delivery(3, "update", {"id": str(kept), "name": "Ana B"}),
+        _delivery(4, "delete", {"id": str(gone)}),
+    ])
+    assert len(worker_repo.bulk_write.call_args.args[0]) == 2
+    handler.channel.basic_ack.assert_called_once_with(delivery_tag=4, multiple=True)
+    doc = worker_repo.find_by_id(str(kept))
+    assert (doc["name"], doc["value"]) == ("Ana B", 2)
+    assert worker_repo.find_by_id(str(gone)) is None
+    assert handler.coalescer.writes_saved == 2
+    monitor.count.assert_called_once_with("writes_saved", 2)
+
+def test_batch_flush_coalesces_api_messages_by_entity_key(worker_repo, no_broker):
+    from processing.batch_handler import BatchMessageHandler
+    handler = BatchMessageHandler(repo=worker_repo, monitor=MagicMock(), batch_size=6)
+    ana, bia = ObjectId(), ObjectId()
+    worker_repo.insert({"_id": bia, "name": "Bia", "value": 1})
+    worker_repo.bulk_write = MagicMock(wraps=worker_repo.bulk_write)
+    persisted = {"headers": {"x-persisted": True}}
+    handler._flush([
+        # o que a API publica: create com id (já gravado), updates e delete só com name
+        _delivery(1, "create", {"id": str(ana), "name": "Ana", "value": 1}, **persisted),
+        _delivery(2, "update", {"name": "Ana", "new_data": {"value": 2}}, **persisted),
+        _delivery(3, "update", {"name": "Ana", "new_data": {"value": 3}}, **persisted),
+        # create sem x-persisted seguido de update por id: um único upsert com $set
+        _delivery(4, "create", {"id": str(bia), "name": "Bia", "value": 9}),
+        _delivery(5, "update", {"id": str(bia), "value": 2}),
+        _delivery(6, "delete", {"name": "Ana"}, **persisted),
+    ])
+    assert handler.coalescer.writes_saved == 4
+    assert len(worker_repo.bulk_write.call_args.args[0]) == 1
+    # o documento já existia: o $setOnInsert não vale, o update sim
+    assert worker_repo.find_by_id(str(bia))["value"] == 2
+    handler.channel.basic_ack.assert_called_once_with(delivery_tag=6, multiple=True)
+
+def test_create_is_idempotent_and_redeliveries_are_skipped(worker_repo, no_broker):
+    from processing.message_handler import MessageHandler
+    handler = MessageHandler(repo=worker_repo, monitor=MagicMock())
+    _id = ObjectId()
+    worker_repo.insert({"_id": _id, "name": "Ana"})
+    # a API já inseriu o documento: o create vira upsert e não duplica
+    for tag in (1, 2):
+        method, properties, body = _delivery(tag, "create", {"id": str(_id), "name": "Ana"}, message_id=f"m{tag}")
+        handler._on_message(handler.channel, method, properties, body)
+    assert worker_repo.collection.count_documents({}) == 1
+
+    worker_repo.collection.update_one = MagicMock()
+    method, properties, body = _delivery(3, "update", {"id": str(_id), "name": "Bia"}, message_id="m1")
+    handler._on_message(handler.channel, method, properties, body)
+    method, properties, body = _delivery(4, "create", {"id": str(ObjectId()), "name": "Caio"},
+                                         message_id="m4", headers={"x-persisted": True})
+    handler._on_message(handler.channel, method, properties, body)
+    worker_repo.collection.update_one.assert_not_called()
+    assert handler.channel.basic_ack.call_count == 4
+    assert [c.args[0] for c in handler.monitor.count.call_args_list] == ["duplicates_skipped", "creates_skipped"]
+
+def test_partition_consumers_prefer_assigned_partitions():
+    from processing.message_handler import partition_consumers, declare_partitions
+    assert partition_consumers(partitions=1) == [("crud_queue", None)]
+    # x-priority só decide o consumidor ativo em quorum queues
+    channel = MagicMock()
+    declare_partitions(channel, partitions=4)
+    assert all(c.kwargs["arguments"] == {"x-queue-type": "quorum", "x-single-active-consumer": True}
+               for c in channel.queue_declare.call_args_list)
+    consumers = partition_consumers(partitions=4, preferred=(2,), worker_id="w1")
+    assert [queue for queue, _ in consumers] == [f"crud_queue.{i}" for i in range(4)]
+    priorities = [arguments["x-priority"] for _, arguments in consumers]
+    assert max(priorities) == priorities[2]
+    assert consumers == partition_consumers(partitions=4, preferred=(2,), worker_id="w1")
+    # sem preferência, cada partição fica com o worker de maior prioridade nela
+    winners = {max(("w1", "w2", "w3"), key=lambda w: partition_consumers(partitions=12, worker_id=w)[p][1]["x-priority"])
+               for p in range(12)}
+    assert len(winners) > 1
+
+def test_async_handler_keeps_order_per_entity():
+    import asyncio
+    import time
+    from unittest.mock import AsyncMock
+    from processing.async_handler import AsyncMessageHandler
+
+    applied = []
+
+    class SlowRepo:
+        def update_by_id(self, _id, data):
+            # a primeira escrita de "Ana" é a mais lenta
+            time.sleep(0.05 if (data["name"], data["value"]) == ("Ana", 1) else 0)
+            applied.append((data["name"], data["value"]))
+
+    def message(name, value):
+        body = json.dumps({"action": "update", "data": {"id": str(ObjectId()), "name": name, "value": value}})
+        return MagicMock(body=body.encode(), content_type="application/json", message_id=None, headers=None,
+                         ack=AsyncMock())
+
+    async def scenario():
+        handler = AsyncMessageHandler(repo=SlowRepo(), monitor=MagicMock(), concurrency=4)
+        handler._limit = asyncio.Semaphore(4)
+        msgs = [message("Ana", 1), message("Bia", 1), message("Ana", 2)]
+        await asyncio.gather(*(handler._on_message(m) for m in msgs))
+        assert all(m.ack.await_count == 1 for m in msgs)
+
+    asyncio.run(scenario())
+    ana = [v for n, v in applied if n == "Ana"]
+    assert ana == [1, 2]
+    assert applied[0] == ("Bia", 1)
+
+def test_monitor_aggregate_flushes_one_summary(no_broker):
+    from monitoring.monitor_publisher import MonitorPublisher
+    monitor = MonitorPublisher(mode="aggregate", flush_interval=60, flush_events=3, error_sample_rate=1.0)
+    monitor.publish_event("create", "success", latency_ms=3)
+    monitor.publish_event("create", "success", latency_ms=30)
+    monitor.channel.basic_publish.assert_not_called()
+    monitor.publish_event("update", "error", "boom", latency_ms=0.5)
+    monitor.channel.basic_publish.assert_called_once()
+    summary = json.loads(monitor.channel.basic_publish.call_args.kwargs["body"])
+    assert summary["type"] == "summary" and summary["events"] == 3
+    assert summary["actions"]["create"]["success"] == 2
+    assert summary["actions"]["create"]["latency_ms"]["count"] == 2
+    assert summary["actions"]["update"]["error"] == 1
+    assert summary["error_samples"][0]["error"] == "boom"
+    assert monitor.channel.basic_publish.call_args.kwargs["properties"].delivery_mode == 1
+
+def test_event_mode_counters_are_flushed_periodically(worker_repo, no_broker):
+    from monitoring.monitor_publisher import MonitorPublisher
+    from processing.message_handler import MessageHandler
+    monitor = MonitorPublisher(mode="event", flush_interval=60)
+    handler = MessageHandler(repo=worker_repo, monitor=monitor)
+    handler._schedule_monitor_flush()
+    delay, tick = handler.connection.call_later.call_args.args
+    assert delay == 60
+    for tag in (1, 2):
+        handler._on_message(handler.channel, *_delivery(tag, "delete", {"id": str(ObjectId())}, message_id="m1"))
+    monitor.channel.basic_publish.reset_mock()
+    monitor._next_flush = 0
+    tick()
+    counters = json.loads(monitor.channel.basic_publish.call_args.kwargs["body"])
+    assert counters["type"] == "counters" and counters["counters"] == {"duplicates_skipped": 1}
+    # o tick se reagenda
+    assert handler.connection.call_later.call_count == 2
+
+def test_prefetch_controller_tracks_rtt_over_service_time():
+    from processing.prefetch import PrefetchController
+    control = PrefetchController(parallelism=1, initial=1, maximum=50, interval=0)
+    control.observe(0.25)
+    control.observe_rtt(0.75)
+    # 1 em processamento + 3 em trânsito durante a ida e volta
+    assert control.adjust() == 4
+    control = PrefetchController(parallelism=10, initial=10, maximum=50, interval=0)
+    control.observe(1.0)
+    control.observe_rtt(1.0)
+    assert control.adjust() == 20
+    # alvo 21: variação abaixo da tolerância, o prefetch não muda
+    control.observe_rtt(1.5)
+    assert control.adjust() == 20
+    control.observe_rtt(60.0)
+    assert control.adjust() == 50
+
+def test_adaptive_prefetch_resubscribes_quorum_partitions(no_broker):
+    from processing.message_handler import MessageHandler
+    handler = MessageHandler(repo=MagicMock(), monitor=MagicMock(), partitions=4, adaptive_prefetch=True)
+    handler.channel.basic_consume.side_effect = [f"tag{i}" for i in range(8)]
+    handler._consume(handler._on_message, parallelism=1)
+    # QoS global faria o basic.consume nas quorum queues falhar
+    handler.channel.basic_qos.assert_called_once_with(prefetch_count=1)
+    assert handler._consumer_tags == ["tag0", "tag1", "tag2", "tag3"]
+    handler.prefetch_control.service, handler.prefetch_control.rtt = 0.1, 0.3
+    handler._tune_prefetch()
+    handler.channel.basic_qos.assert_called_with(prefetch_count=4)
+    # consumidores novos (com o prefetch novo) antes de cancelar os antigos
+    assert handler._consumer_tags == ["tag4", "tag5", "tag6", "tag7"]
+    assert [c.args[0] for c in handler.channel.basic_cancel.call_args_list] == ["tag0", "tag1", "tag2", "tag3"]
+    assert [c.kwargs["arguments"] for c in handler.channel.basic_consume.call_args_list[4:]] == \
+        [c.kwargs["arguments"] for c in handler.channel.basic_consume.call_args_list[:4]]
+    # alvo igual: só mede a ida e volta, sem refazer as inscrições
+    handler.prefetch_control.service, handler.prefetch_control.rtt = 0.1, 0.3
+    handler._tune_prefetch()
+    assert handler.channel.basic_consume.call_count == 8
+
+def test_batch_drain_flushes_delivered_messages_before_closing(worker_repo, no_broker):
+    from processing.batch_handler import BatchMessageHandler
+    from processing.shutdown import Drain
+    monitor = MagicMock()
+    handler = BatchMessageHandler(repo=worker_repo, monitor=monitor, batch_size=10, drain=Drain(exit=MagicMock()))
+
+    def sigterm_after_deliveries(time_limit=None):
+        deliver = handler.channel.basic_consume.call_args.kwargs["on_message_callback"]
+        for tag, name in ((1, "Ana"), (2, "Bia")):
+            deliver(handler.channel, *_delivery(tag, "create", {"name": name}))
+        handler.drain.request()
+    handler.connection.process_data_events.side_effect = sigterm_after_deliveries
+    handler.start()
+    # o lote incompleto é aplicado e confirmado antes de fechar, sem esperar o flush_ms
+    assert worker_repo.collection.count_documents({}) == 2
+    handler.channel.basic_cancel.assert_called_once()
+    handler.channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+    handler.channel.basic_qos.assert_called_with(prefetch_count=handler.prefetch_control.prefetch)
+    monitor.close.assert_called_once()
+    handler.connection.close.assert_called_once()
+    # prazo cancelado: o timer de saída forçada não dispara
+    assert handler.drain._timer.finished.is_set()
@@ -2,5 +2,67 @@ import os
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
 REQUEST_QUEUE = "crud_queue"
+# Partições da crud_queue (igual ao da API; ver messaging/partitions.py). Com mais de uma, o
+# worker se inscreve em todas e o broker ativa um consumidor por partição; WORKER_PARTITIONS
+# (ex.: "0,3") dá prioridade a estas partições, senão a divisão sai do hash do WORKER_ID
+CRUD_PARTITIONS = int(os.getenv("CRUD_PARTITIONS", "1"))
+WORKER_PARTITIONS = tuple(int(p) for p in os.getenv("WORKER_PARTITIONS", "").split(",") if p.strip())
 MONITOR_QUEUE = "monitor_queue"
+# Exchanges diretas na frente das filas (a API também liga filas de invalidação de cache nelas)
+CRUD_EXCHANGE = os.getenv("CRUD_EXCHANGE", "crud_events")
+MONITOR_EXCHANGE = os.getenv("MONITOR_EXCHANGE", "monitor_events")
 WORKER_ID = os.getenv("WORKER_ID", None)
+
+# Consumo em lote: com WORKER_BATCH_SIZE > 1 o worker junta até N mensagens
+# (ou espera WORKER_BATCH_FLUSH_MS) e aplica tudo num único bulk_write
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "1"))
+WORKER_BATCH_FLUSH_MS = int(os.getenv("WORKER_BATCH_FLUSH_MS", "50"))
+WORKER_BATCH_ORDERED = os.getenv("WORKER_BATCH_ORDERED", "1").lower() in ("1", "true", "yes")
+WORKER_PREFETCH = int(os.getenv("WORKER_PREFETCH", str(max(1, WORKER_BATCH_SIZE * 2))))
+# Junta as operações da mesma entidade (id ou name) dentro de um lote ($set mesclados, delete vence)
+WORKER_COALESCE = os.getenv("WORKER_COALESCE", "1").lower() in ("1", "true", "yes")
+
+# Retentativas fora do caminho quente: a mensagem que falha é republicada numa fila de espera
+# (TTL da fila = atraso do degrau) e volta para a crud_events com a routing key original; após
+# WORKER_MAX_ATTEMPTS falhas (ou se nem dá para decodificar), vai para a DEAD_LETTER_QUEUE
+RETRY_EXCHANGE = os.getenv("RETRY_EXCHANGE", "crud_retry")
+DEAD_LETTER_QUEUE = os.getenv("DEAD_LETTER_QUEUE", "crud_dead")
+WORKER_RETRY_DELAYS_MS = tuple(int(d) for d in os.getenv("WORKER_RETRY_DELAYS_MS", "1000,5000,30000").split(",")
+                               if d.strip())
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "5"))
+
+# Prefetch adaptativo: o limite do canal acompanha parallelism x (1 + ida e volta ao broker /
+# tempo de processamento), medidos por EWMA, entre o paralelismo do modo e WORKER_PREFETCH_MAX
+# (também o limite por consumidor); reavaliado a cada WORKER_PREFETCH_INTERVAL segundos
+WORKER_ADAPTIVE_PREFETCH = os.getenv("WORKER_ADAPTIVE_PREFETCH", "1").lower() in ("1", "true", "yes")
+WORKER_PREFETCH_MAX = int(os.getenv("WORKER_PREFETCH_MAX", "200"))
+WORKER_PREFETCH_INTERVAL = float(os.getenv("WORKER_PREFETCH_INTERVAL", "5"))
+
+# SIGTERM/SIGINT: o worker para de consumir, termina e confirma o que está em andamento,
+# publica o monitor e sai; passado o prazo (s), sai mesmo assim e o broker reentrega o resto
+WORKER_DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", "25"))
+
+# message_ids já aplicados: reentregas dentro do TTL são ignoradas sem ir ao Mongo
+WORKER_DEDUP_SIZE = int(os.getenv("WORKER_DEDUP_SIZE", "100000"))
+WORKER_DEDUP_TTL = float(os.getenv("WORKER_DEDUP_TTL", "600"))
+
+# Modo do worker: sync (uma mensagem por vez), batch (ver acima) ou async
+# (asyncio, várias mensagens em paralelo mantendo a ordem por entidade)
+WORKER_MODE = os.getenv("WORKER_MODE", "batch" if WORKER_BATCH_SIZE > 1 else "sync")
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "32"))
+WORKER_ASYNC_PREFETCH = int(os.getenv("WORKER_ASYNC_PREFETCH", str(WORKER_CONCURRENCY * 2)))
+
+# Monitoramento: event (uma mensagem por operação) ou aggregate (contagens e
+# histogramas de latência em memória, com um resumo por intervalo ou a cada N eventos)
+MONITOR_MODE = os.getenv("MONITOR_MODE", "event")
+MONITOR_FLUSH_INTERVAL = float(os.getenv("MONITOR_FLUSH_INTERVAL", "5"))
+MONITOR_FLUSH_EVENTS = int(os.getenv("MONITOR_FLUSH_EVENTS", "5000"))
+MONITOR_ERROR_SAMPLE_RATE = float(os.getenv("MONITOR_ERROR_SAMPLE_RATE", "0.1"))
+MONITOR_MAX_ERROR_SAMPLES = int(os.getenv("MONITOR_MAX_ERROR_SAMPLES", "20"))
+
+# Porta HTTP do /metrics (formato Prometheus) do worker; 0 desliga
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Codec das mensagens publicadas em monitor_queue (application/json ou application/msgpack);
+# as mensagens recebidas são lidas pelo content_type de cada uma
+MESSAGE_CODEC = os.getenv("MESSAGE_CODEC", "application/json")
@@ -0,0 +1,62 @@
+import json
+from datetime import date, datetime
+from bson import ObjectId
+
+try:
+    import orjson
+except ImportError:  # opcional: sem orjson o JSONCodec usa o json da stdlib
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # opcional: sem msgpack o codec binário não fica disponível
+    msgpack = None
+
+# Codecs das mensagens de crud_queue e monitor_queue (o mesmo arquivo existe em api/ e worker/).
+# O codec de cada mensagem vai no header content_type do AMQP; mensagens sem
+# content_type (producers antigos) são lidas como JSON.
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+class JSONCodec:
+    content_type = JSON
+
+    def encode(self, obj) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default)
+        return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+    def decode(self, body):
+        if orjson is not None:
+            return orjson.loads(body)
+        return json.loads(body)
+
+class MsgpackCodec:
+    content_type = MSGPACK
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+    def decode(self, body):
+        return msgpack.unpackb(body, raw=False)
+
+CODECS = {JSON: JSONCodec()}
+if msgpack is not None:
+    CODECS[MSGPACK] = MsgpackCodec()
+
+def get_codec(content_type: str = None):
+    """Codec para o content_type da mensagem; ValueError se não for suportado aqui"""
+    if not content_type:
+        return CODECS[JSON]
+    codec = CODECS.get(content_type.split(";")[0].strip().lower())
+    if codec is None:
+        raise ValueError(f"unsupported content_type: {content_type}")
+    return codec
@@ -0,0 +1,84 @@
+import hashlib
+
+# Partições da crud_queue (o mesmo arquivo existe em api/ e worker/).
+#
+# Com uma partição a fila é a própria crud_queue, declarada como antes. Com N, são as filas
+# crud_queue.0 .. crud_queue.N-1, ligadas à crud_events com o próprio nome como routing key;
+# o Producer escolhe a partição pelo hash da entidade (name, ou id), então as mensagens de
+# um usuário ficam sempre na mesma fila e em ordem. Cada partição é uma quorum queue com um
+# único consumidor ativo (x-single-active-consumer) e os workers se inscrevem em todas com
+# uma prioridade por (worker, partição): o broker ativa o de maior prioridade e, se ele sair,
+# passa a fila para o próximo, o que redistribui as partições quando workers entram ou saem.
+# Filas clássicas ignoram a x-priority no single active consumer (ativam o primeiro inscrito,
+# que ficaria com todas as partições); nas quorum queues ela vale a partir do RabbitMQ 4.0.
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+# prioridades por hash ficam abaixo disso; as partições de WORKER_PARTITIONS, acima
+_PREFERRED_PRIORITY = 1 << 30
+
+def _hash64(value) -> int:
+    # estável entre processos (hash() de str muda a cada execução)
+    return int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping e Veach): ao passar de N para N+1 partições só ~1/(N+1) das chaves mudam"""
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & _MASK64
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+def partition_queues(base: str, count: int) -> list:
+    """Nomes das filas (e routing keys) das partições"""
+    if count <= 1:
+        return [base]
+    return [f"{base}.{i}" for i in range(count)]
+
+def queue_arguments(count: int):
+    """Argumentos do queue_declare das partições (iguais no producer e no worker)"""
+    return {"x-queue-type": "quorum", "x-single-active-consumer": True} if count > 1 else None
+
+def message_key(data: dict):
+    """Entidade da mensagem: name (a API atualiza e remove por nome) ou id"""
+    return data.get("name") or data.get("id")
+
+def partition_for(key, count: int) -> int:
+    """Partição da entidade; mensagens sem entidade (clear_all) vão para a 0"""
+    if count <= 1 or key is None:
+        return 0
+    return jump_hash(_hash64(key), count)
+
+def split_batch(ops: list, count: int) -> dict:
+    """Ops de uma mensagem batch agrupadas por partição, na ordem original dentro de cada uma"""
+    parts = {}
+    for op in ops:
+        parts.setdefault(partition_for(message_key(op.get("data") or {}), count), []).append(op)
+    return parts
+
+def route(action: str, data: dict, message_id: str, partitions: int):
+    """(partição, data, message_id) de cada mensagem a publicar, em ordem
+
+    Com partições, cada mensagem vai para a fila da sua entidade; uma mensagem batch é
+    dividida em uma por partição (message_id com o sufixo da partição), para que as ops
+    de cada usuário fiquem na mesma fila das mensagens individuais dele.
+    """
+    if partitions <= 1:
+        return [(0, data, message_id)]
+    if action == "batch":
+        parts = split_batch(data.get("ops", []), partitions)
+        if len(parts) == 1:
+            (partition, _), = parts.items()
+            return [(partition, data, message_id)]
+        return [(partition, {**data, "ops": ops}, f"{message_id}.{partition}") for partition, ops in parts.items()]
+    return [(partition_for(message_key(data), partitions), data, message_id)]
+
+def consumer_priorities(count: int, worker_id: str, preferred=()) -> dict:
+    """x-priority deste worker em cada partição (rendezvous hashing entre os workers inscritos)"""
+    priorities = {}
+    for partition in range(count):
+        priority = _hash64(f"{worker_id}:{partition}") % _PREFERRED_PRIORITY
+        if partition in preferred:
+            priority += _PREFERRED_PRIORITY
+        priorities[partition] = priority
+    return priorities
@@ -0,0 +1,313 @@
+"""
+Métricas em memória no formato texto do Prometheus (o mesmo arquivo existe em api/ e worker/monitoring/)
+
+Contadores, gauges e histogramas com buckets fixos: cada observação custa um bisect e um
+lock sem contenção, barato o suficiente para ficar ligado em produção.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# segundos; o último bucket implícito é +Inf
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+class _Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+        return False
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def time(self):
+        """with metric.labels(...).time(): ... observa a duração do bloco"""
+        return _Timer(self)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        return _Value()
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, _labels(self.labelnames, values), child.value
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value):
+        self.labels().set(value)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, seconds):
+        self.labels().observe(seconds)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                yield self.name + "_bucket", _labels(self.labelnames, values, [("le", _number(bound))]), cumulative
+            yield self.name + "_sum", _labels(self.labelnames, values), total
+            yield self.name + "_count", _labels(self.labelnames, values), count
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"metric {name} already registered with another type or labels")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        """Valores atuais em estrutura serializável (ver MultiProcessCollector)"""
+        metrics = []
+        for metric in list(self._metrics.values()):
+            children = []
+            for values, child in list(metric._children.items()):
+                if isinstance(child, _HistogramValue):
+                    with child._lock:
+                        children.append([list(values), [list(child.counts), child.sum, child.count]])
+                else:
+                    children.append([list(values), child.value])
+            metrics.append({"name": metric.name, "kind": metric.kind, "documentation": metric.documentation,
+                            "labelnames": list(metric.labelnames), "buckets": list(getattr(metric, "buckets", ())),
+                            "children": children})
+        return metrics
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def merge_snapshots(snapshots):
+    """Registry com a soma dos snapshots {pid: snapshot}: contadores e histogramas somados,
+    gauges por processo (label pid), já que o valor de um processo não soma com o de outro"""
+    registry = Registry()
+    for pid, metrics in sorted(snapshots.items()):
+        for m in metrics:
+            if m["kind"] == "histogram":
+                metric = registry.histogram(m["name"], m["documentation"], m["labelnames"], buckets=m["buckets"])
+                for values, (counts, total, count) in m["children"]:
+                    child = metric.labels(*values)
+                    child.counts = [a + b for a, b in zip(child.counts, counts)]
+                    child.sum += total
+                    child.count += count
+            elif m["kind"] == "counter":
+                metric = registry.counter(m["name"], m["documentation"], m["labelnames"])
+                for values, value in m["children"]:
+                    metric.labels(*values).inc(value)
+            else:
+                metric = registry.gauge(m["name"], m["documentation"], m["labelnames"] + ["pid"])
+                for values, value in m["children"]:
+                    metric.labels(*values, str(pid)).set(value)
+    return registry
+
+class MultiProcessCollector:
+    """/metrics de um servidor com vários processos (gunicorn -w N, hypercorn -w N)
+
+    Cada processo grava o seu snapshot em directory/<pid>.json a cada interval segundos (e
+    na hora de responder um scrape); o processo que atende o scrape soma os de todos. Os
+    contadores e histogramas de processos que já saíram continuam na soma, para o total não
+    voltar; os gauges deles saem com mark_process_dead.
+    """
+
+    def __init__(self, directory, registry=REGISTRY, interval=1.0):
+        self.directory = directory
+        self.registry = registry
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def write(self):
+        # pid na hora da escrita: o coletor pode ter sido criado no master antes do fork
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.write()
+        threading.Thread(target=self._run, name="metrics-snapshot", daemon=True).start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                pass
+
+    def stop(self):
+        self._stopped.set()
+
+    def render(self):
+        self.write()
+        return merge_snapshots(read_snapshots(self.directory)).render()
+
+def read_snapshots(directory):
+    snapshots = {}
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshots[name[:-len(".json")]] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+def mark_process_dead(directory, pid):
+    """Tira os gauges de um processo que saiu (hook child_exit do gunicorn); o resto continua somando"""
+    path = os.path.join(directory, f"{pid}.json")
+    try:
+        with open(path) as f:
+            metrics = [m for m in json.load(f) if m["kind"] != "gauge"]
+    except (OSError, ValueError):
+        return
+    with open(path + ".tmp", "w") as f:
+        json.dump(metrics, f)
+    os.replace(path + ".tmp", path)
+
+def clear_snapshots(directory):
+    """Apaga snapshots de uma execução anterior (hook on_starting do gunicorn)"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith((".json", ".tmp")):
+            os.unlink(os.path.join(directory, name))
+
+def start_http_server(port, registry=REGISTRY, host="0.0.0.0"):
+    """Serve GET /metrics numa thread daemon (para processos sem servidor HTTP, como o worker)"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
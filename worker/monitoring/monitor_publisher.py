@@ -1,31 +1,153 @@
-import pika, json
-from config import RABBITMQ_HOST, MONITOR_QUEUE
-from datetime import datetime
+import pika
+from config import (RABBITMQ_HOST, MONITOR_QUEUE, MONITOR_EXCHANGE, MONITOR_MODE, MONITOR_FLUSH_INTERVAL,
+                    MONITOR_FLUSH_EVENTS, MONITOR_ERROR_SAMPLE_RATE, MONITOR_MAX_ERROR_SAMPLES, MESSAGE_CODEC)
+from messaging.codecs import get_codec
+from datetime import datetime, timezone
+from bisect import bisect_left
 import os
+import random
+import time
 import uuid
 
 WORKER_ID = os.getenv("WORKER_ID") or str(uuid.uuid4())
 
+# limites superiores (ms) dos buckets do histograma de latência; o último bucket é "acima disso"
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+class _ActionStats:
+    __slots__ = ("success", "error", "counts", "latency_sum", "latency_count")
+
+    def __init__(self):
+        self.success = 0
+        self.error = 0
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def as_dict(self):
+        return {
+            "success": self.success,
+            "error": self.error,
+            "latency_ms": {
+                "buckets": LATENCY_BUCKETS_MS,
+                "counts": self.counts,
+                "sum": round(self.latency_sum, 3),
+                "count": self.latency_count,
+            },
+        }
+
 class MonitorPublisher:
-    def __init__(self, host=RABBITMQ_HOST, queue=MONITOR_QUEUE):
+    def __init__(self, host=RABBITMQ_HOST, queue=MONITOR_QUEUE, exchange=MONITOR_EXCHANGE, mode=MONITOR_MODE,
+                 flush_interval=MONITOR_FLUSH_INTERVAL, flush_events=MONITOR_FLUSH_EVENTS,
+                 error_sample_rate=MONITOR_ERROR_SAMPLE_RATE, content_type=MESSAGE_CODEC):
         self.host = host
+        self.codec = get_codec(content_type)
         params = pika.ConnectionParameters(host=self.host)
         self.connection = pika.BlockingConnection(params)
         self.channel = self.connection.channel()
+        self.channel.exchange_declare(exchange=exchange, exchange_type="direct", durable=True)
         self.channel.queue_declare(queue=queue, durable=True)
+        self.channel.queue_bind(queue=queue, exchange=exchange, routing_key=queue)
         self.queue = queue
+        self.exchange = exchange
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.error_sample_rate = error_sample_rate
+        self._reset()
+
+    def _reset(self):
+        self._stats = {}
+        self._counters = {}
+        self._pending = 0
+        self._error_samples = []
+        self._window_start = _now_iso()
+        self._next_flush = time.monotonic() + self.flush_interval
 
-    def publish_event(self, action: str, status: str = "success", error: str = None):
+    def _send(self, message: dict, persistent: bool = True):
+        # resumos e contadores são regerados a cada janela: não vale o fsync de mensagem persistente
+        properties = pika.BasicProperties(delivery_mode=2 if persistent else 1,
+                                          content_type=self.codec.content_type)
+        self.channel.basic_publish(exchange=self.exchange, routing_key=self.queue,
+                                   body=self.codec.encode(message), properties=properties)
+
+    def publish_event(self, action: str, status: str = "success", error: str = None,
+                      latency_ms: float = None):
+        if self.mode == "aggregate":
+            self._record(action, status, error, latency_ms)
+            self.maybe_flush()
+            return
         event = {
+            "type": "event",
             "worker_id": WORKER_ID,
             "action": action,
             "status": status,
             "error": error,
-            "timestamp": datetime.utcnow().isoformat()
+            "latency_ms": latency_ms,
+            "timestamp": _now_iso()
         }
-        self.channel.basic_publish(exchange='', routing_key=self.queue, body=json.dumps(event), properties=pika.BasicProperties(delivery_mode=2))
+        self._send(event)
+
+    def count(self, name: str, value: int = 1):
+        """Soma num contador do worker (ex.: writes_saved), enviado junto com o próximo flush"""
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def _record(self, action, status, error, latency_ms):
+        stats = self._stats.get(action)
+        if stats is None:
+            stats = self._stats[action] = _ActionStats()
+        if status == "success":
+            stats.success += 1
+        else:
+            stats.error += 1
+            if (len(self._error_samples) < MONITOR_MAX_ERROR_SAMPLES
+                    and random.random() < self.error_sample_rate):
+                self._error_samples.append({"action": action, "error": error, "timestamp": _now_iso()})
+        if latency_ms is not None:
+            stats.counts[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            stats.latency_sum += latency_ms
+            stats.latency_count += 1
+        self._pending += 1
+
+    def maybe_flush(self):
+        """Publica o resumo se passou o intervalo ou se juntou eventos suficientes"""
+        if self._pending >= self.flush_events or time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        if self.mode != "aggregate":
+            # no modo event só os contadores esperam o flush
+            if self._counters:
+                self._send({
+                    "type": "counters",
+                    "worker_id": WORKER_ID,
+                    "window_start": self._window_start,
+                    "window_end": _now_iso(),
+                    "counters": self._counters,
+                }, persistent=False)
+            self._reset()
+            return
+        if self._pending or self._counters:
+            self._send({
+                "type": "summary",
+                "worker_id": WORKER_ID,
+                "window_start": self._window_start,
+                "window_end": _now_iso(),
+                "events": self._pending,
+                "actions": {action: stats.as_dict() for action, stats in self._stats.items()},
+                "error_samples": self._error_samples,
+                "counters": self._counters,
+            }, persistent=False)
+        self._reset()
 
     def close(self):
+        try:
+            self.flush()
+        except Exception:
+            pass
         try:
             self.connection.close()
         except:
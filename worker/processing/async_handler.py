@@ -0,0 +1,251 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import aio_pika
+from config import (RABBITMQ_HOST, CRUD_EXCHANGE, DEAD_LETTER_QUEUE, WORKER_CONCURRENCY, WORKER_ASYNC_PREFETCH,
+                    WORKER_DEDUP_SIZE, WORKER_DEDUP_TTL, CRUD_PARTITIONS, WORKER_PARTITIONS,
+                    WORKER_ADAPTIVE_PREFETCH)
+from repositories.user_repository import UserRepository
+from monitoring.monitor_publisher import MonitorPublisher
+from processing.message_handler import apply_message, partition_consumers, STAGE_SECONDS, MESSAGE_SECONDS, MESSAGES_TOTAL, ERRORS_TOTAL
+from processing.dedup import DedupCache, message_meta
+from processing.retry import RetryPolicy, RETURN_EXCHANGE, attempts_of, is_retryable
+from processing.prefetch import PrefetchController
+from processing.shutdown import Drain
+from messaging.codecs import get_codec
+from messaging.partitions import queue_arguments
+
+def entity_key(data):
+    """Chave da entidade para ordenação: name (usado pela API) ou id"""
+    return data.get("name") or data.get("id")
+
+class AsyncMessageHandler:
+    """Worker asyncio: várias mensagens em paralelo, em ordem dentro de cada entidade
+
+    Cada entidade tem uma "lane": a operação só começa quando a anterior da mesma
+    entidade termina. Entidades diferentes rodam em paralelo até o limite de concorrência.
+    O UserRepository (pymongo) roda num pool de threads e o MonitorPublisher (pika, não
+    thread-safe) numa thread própria.
+    """
+
+    def __init__(self, rabbit_host=RABBITMQ_HOST, repo: UserRepository = None, monitor: MonitorPublisher = None,
+                 concurrency=WORKER_CONCURRENCY, prefetch=WORKER_ASYNC_PREFETCH, dedup: DedupCache = None,
+                 partitions=CRUD_PARTITIONS, preferred=WORKER_PARTITIONS, retry_policy: RetryPolicy = None,
+                 adaptive_prefetch=WORKER_ADAPTIVE_PREFETCH, drain: Drain = None):
+        self.rabbit_host = rabbit_host
+        self.partitions = partitions
+        self.consumers = partition_consumers(partitions, preferred)
+        self.repo = repo or UserRepository()
+        self.monitor = monitor or MonitorPublisher()
+        self.dedup = dedup or DedupCache(maxsize=WORKER_DEDUP_SIZE, ttl=WORKER_DEDUP_TTL)
+        self.concurrency = concurrency
+        self.prefetch = max(prefetch, concurrency)
+        self._db_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="worker-db")
+        self._monitor_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="worker-monitor")
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._channel = None
+        self._retry_exchanges = {}
+        self._return_exchange = None
+        self._limit = None
+        self._tails = {}
+        self._consumer_arguments = {}
+        self.prefetch_control = PrefetchController(parallelism=concurrency, initial=self.prefetch) if adaptive_prefetch else None
+        self.drain = drain or Drain()
+        # tasks de _on_message em andamento, esperadas no drain
+        self._inflight = set()
+
+    def start(self):
+        asyncio.run(self.run())
+
+    async def run(self):
+        self._limit = asyncio.Semaphore(self.concurrency)
+        connection = await aio_pika.connect_robust(host=self.rabbit_host)
+        async with connection:
+            channel = await connection.channel()
+            if self.prefetch_control is None:
+                await channel.set_qos(prefetch_count=self.prefetch)
+            else:
+                await self._tune_prefetch(channel, [])
+            exchange = await channel.declare_exchange(CRUD_EXCHANGE, aio_pika.ExchangeType.DIRECT, durable=True)
+            await self._declare_retry(channel)
+            consumers = []
+            for name, arguments in self.consumers:
+                queue = await channel.declare_queue(name, durable=True, arguments=queue_arguments(self.partitions))
+                await queue.bind(exchange, routing_key=name)
+                await queue.bind(self._return_exchange, routing_key=name)
+                consumers.append((queue, await queue.consume(self._on_message, arguments=arguments)))
+            self._consumer_arguments = dict(self.consumers)
+            # resumo (aggregate) e contadores de count() nos dois modos
+            asyncio.ensure_future(self._flush_monitor_periodically())
+            print(f"[worker] Waiting for messages (async, concurrency={self.concurrency})...")
+            # o handler do sinal só marca o pedido de drain, visto aqui
+            while not self.drain.requested:
+                await asyncio.sleep(0.5)
+                if self.prefetch_control is not None and self.prefetch_control.due():
+                    await self._tune_prefetch(channel, consumers)
+            await self._drain(consumers)
+
+    async def _tune_prefetch(self, channel, consumers):
+        # basic.qos é um RPC síncrono: aplica o prefetch e mede a ida e volta ao broker na mesma chamada.
+        # Sem QoS global (obsoleto no RabbitMQ 4 e recusado pelas quorum queues) o valor só vale para
+        # consumidores novos, então uma mudança refaz as inscrições
+        previous = self.prefetch_control.prefetch
+        count = self.prefetch_control.adjust()
+        started = time.perf_counter()
+        await channel.set_qos(prefetch_count=count)
+        self.prefetch_control.observe_rtt(time.perf_counter() - started)
+        if count != previous:
+            await self._resubscribe(consumers)
+
+    async def _resubscribe(self, consumers):
+        """Troca cada consumidor por um novo com o prefetch atual (o novo entra antes do cancel)
+
+        O aiormq entrega ao callback tudo o que chegou antes do cancel-ok, então nada fica sem ack.
+        """
+        for i, (queue, tag) in enumerate(consumers):
+            arguments = self._consumer_arguments.get(queue.name)
+            consumers[i] = (queue, await queue.consume(self._on_message, arguments=arguments))
+            await queue.cancel(tag)
+
+    async def _drain(self, consumers):
+        """Para de consumir, espera as mensagens em andamento (ack ou retry) e publica o monitor"""
+        self.drain.begin()
+        for queue, tag in consumers:
+            await queue.cancel(tag)
+        if self._inflight:
+            _, late = await asyncio.wait(set(self._inflight), timeout=self.drain.remaining())
+            if late:
+                print(f"[worker] {len(late)} message(s) still in flight at the drain deadline")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._monitor_pool, self.monitor.close)
+        self.drain.finish()
+
+    async def _declare_retry(self, channel):
+        """Degraus de espera e DLQ (mesma topologia de RetryPolicy.declare, no aio-pika)"""
+        self._channel = channel
+        self._return_exchange = await channel.declare_exchange(RETURN_EXCHANGE, aio_pika.ExchangeType.DIRECT,
+                                                               durable=True)
+        for name, arguments in self.retry_policy.tiers():
+            tier = await channel.declare_exchange(name, aio_pika.ExchangeType.FANOUT, durable=True)
+            queue = await channel.declare_queue(name, durable=True, arguments=arguments)
+            await queue.bind(tier)
+            self._retry_exchanges[name] = tier
+        await channel.declare_queue(DEAD_LETTER_QUEUE, durable=True)
+
+    async def _reject(self, message, error: str, retryable: bool = True) -> str:
+        """Republica no degrau seguinte ou na DLQ (com confirm do canal) e só então faz o ack"""
+        attempts = attempts_of(message) + 1
+        name = self.retry_policy.target(attempts, retryable)
+        out = aio_pika.Message(body=message.body, delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                               content_type=message.content_type, message_id=message.message_id,
+                               headers=self.retry_policy.headers(message, attempts, error, message.routing_key))
+        if name is None:
+            await self._channel.default_exchange.publish(out, routing_key=DEAD_LETTER_QUEUE)
+            result = "dead"
+        else:
+            await self._retry_exchanges[name].publish(out, routing_key=message.routing_key)
+            result = "retry"
+        await message.ack()
+        MESSAGES_TOTAL.labels(result).inc()
+        await self._count("retried" if result == "retry" else "dead_lettered")
+        return result
+
+    async def _on_message(self, message):
+        task = asyncio.current_task()
+        self._inflight.add(task)
+        try:
+            await self._handle(message)
+        finally:
+            self._inflight.discard(task)
+
+    async def _handle(self, message):
+        # as lanes são reservadas antes de qualquer await, na ordem de entrega
+        started = time.perf_counter()
+        message_id, persisted = message_meta(message)
+        if self.dedup.seen(message_id):
+            MESSAGES_TOTAL.labels("duplicate").inc()
+            await self._count("duplicates_skipped")
+            await message.ack()
+            MESSAGES_TOTAL.labels("ack").inc()
+            return
+        try:
+            payload = get_codec(message.content_type).decode(message.body)
+            action = payload.get("action")
+            data = payload.get("data", {})
+            STAGE_SECONDS.labels(action or "unknown", "decode").observe(time.perf_counter() - started)
+            if action == "batch":
+                ops = [(op.get("action"), op.get("data", {})) for op in data.get("ops", [])]
+            else:
+                ops = [(action, data)]
+        except Exception as e:
+            ERRORS_TOTAL.labels("processing").inc()
+            await self._publish_event("processing", "error", str(e))
+            # ilegível: nenhuma nova tentativa resolve
+            await self._reject(message, str(e), retryable=False)
+            return
+
+        tasks = [self._enqueue(entity_key(op_data), op_action, op_data, persisted) for op_action, op_data in ops]
+        errors = []
+        for (op_action, _), result in zip(ops, await asyncio.gather(*tasks, return_exceptions=True)):
+            if isinstance(result, Exception):
+                ERRORS_TOTAL.labels(op_action or "processing").inc()
+                await self._publish_event(op_action or "processing", "error", str(result))
+                errors.append(result)
+        if errors:
+            # escritas idempotentes: a mensagem inteira volta depois da espera do degrau, a
+            # menos que todas as falhas sejam do conteúdo (id inválido etc.), que vai para a DLQ
+            await self._reject(message, str(errors[0]), any(is_retryable(e) for e in errors))
+            return
+        self.dedup.add(message_id)
+        await message.ack()
+        MESSAGES_TOTAL.labels("ack").inc()
+        elapsed = time.perf_counter() - started
+        MESSAGE_SECONDS.labels(action or "unknown").observe(elapsed)
+        if self.prefetch_control is not None:
+            self.prefetch_control.observe(elapsed)
+
+    def _enqueue(self, key, action, data, persisted=False):
+        if key is None:
+            return asyncio.ensure_future(self._run(None, action, data, persisted))
+        previous = self._tails.get(key)
+        task = asyncio.ensure_future(self._run(previous, action, data, persisted))
+        self._tails[key] = task
+
+        def release(done, key=key):
+            if self._tails.get(key) is done:
+                del self._tails[key]
+        task.add_done_callback(release)
+        return task
+
+    async def _run(self, previous, action, data, persisted=False):
+        if previous is not None:
+            # espera a operação anterior da mesma entidade, sem herdar o erro dela
+            await asyncio.wait([previous])
+        loop = asyncio.get_running_loop()
+        async with self._limit:
+            started = time.perf_counter()
+            event = await loop.run_in_executor(self._db_pool, apply_message, self.repo, action, data, persisted)
+            elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(event[0], "mongo").observe(elapsed)
+        if event[1] == "skipped":
+            await self._count("creates_skipped")
+            return
+        if event[1] == "error":
+            ERRORS_TOTAL.labels(event[0]).inc()
+        with STAGE_SECONDS.labels(event[0], "monitor").time():
+            await self._publish_event(*event, latency_ms=elapsed * 1000)
+
+    async def _publish_event(self, action, status, error=None, latency_ms=None):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._monitor_pool, lambda: self.monitor.publish_event(
+            action, status, error, latency_ms=latency_ms))
+
+    async def _count(self, name):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._monitor_pool, self.monitor.count, name)
+
+    async def _flush_monitor_periodically(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.monitor.flush_interval)
+            await loop.run_in_executor(self._monitor_pool, self.monitor.maybe_flush)
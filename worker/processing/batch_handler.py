@@ -0,0 +1,190 @@
+import time
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+from config import (WORKER_BATCH_SIZE, WORKER_BATCH_FLUSH_MS,
+                    WORKER_BATCH_ORDERED, WORKER_PREFETCH, WORKER_COALESCE)
+from processing.message_handler import MessageHandler, STAGE_SECONDS, MESSAGE_SECONDS, MESSAGES_TOTAL, ERRORS_TOTAL
+from processing.coalescer import WriteCoalescer, writes
+from processing.dedup import message_meta
+from messaging.codecs import get_codec
+
+class BatchMessageHandler(MessageHandler):
+    """Consome em lotes: até batch_size mensagens ou flush_ms, um bulk_write e ack múltiplo"""
+
+    def __init__(self, *args, batch_size=WORKER_BATCH_SIZE, flush_ms=WORKER_BATCH_FLUSH_MS,
+                 ordered=WORKER_BATCH_ORDERED, prefetch=WORKER_PREFETCH, coalesce=WORKER_COALESCE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.ordered = ordered
+        self.prefetch = max(prefetch, batch_size)
+        # escritas do mesmo documento dentro do lote viram uma só
+        self.coalescer = WriteCoalescer() if coalesce else None
+
+    def start(self):
+        pending = []
+        # entregas de todas as partições entram na mesma lista, na ordem das delivery tags do
+        # canal: o ack múltiplo de um lote nunca cobre mensagens de lotes seguintes
+        def deliver(channel, method, properties, body):
+            pending.append((method, properties, body))
+        self._consume(deliver, parallelism=self.batch_size)
+        print(f"[worker] Waiting for messages (batch_size={self.batch_size}, flush={self.flush_interval}s)...")
+        deadline = None
+        while not self.drain.requested:
+            self.connection.process_data_events(time_limit=self.flush_interval)
+            self.monitor.maybe_flush()
+            if pending and deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            while pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush_next(pending)
+                deadline = time.monotonic() + self.flush_interval if pending else None
+            self._maybe_tune_prefetch()
+        self._drain(pending)
+
+    def _flush_next(self, pending):
+        batch = pending[:self.batch_size]
+        del pending[:self.batch_size]
+        started = time.perf_counter()
+        self._flush(batch)
+        if self.prefetch_control is not None:
+            self.prefetch_control.observe(time.perf_counter() - started)
+
+    def _drain(self, pending=()):
+        """Para de consumir, aplica e confirma o que já chegou e fecha depois de publicar o monitor"""
+        self.drain.begin()
+        for tag in self._consumer_tags:
+            self.channel.basic_cancel(tag)
+        pending = list(pending)
+        while pending:
+            self._flush_next(pending)
+        self._close()
+
+    def _expand(self, action, data, persisted=False):
+        """Operações de uma mensagem ('batch' vira as suas ops), validadas antes de juntar"""
+        if action == "batch":
+            ops = []
+            for op in data.get("ops", []):
+                ops.extend(self._expand(op.get("action"), op.get("data", {}), persisted))
+            return ops
+        if action not in ("create", "update", "delete"):
+            raise ValueError(f"Unknown action: {action}")
+        if action == "create" and persisted:
+            self.monitor.count("creates_skipped")
+        elif writes(action, data, persisted) and "id" in data:
+            # id inválido falha aqui, só para esta mensagem, e não depois de juntar com outras
+            ObjectId(data["id"])
+        return [(action, data)]
+
+    def _to_op(self, action, data, persisted=False, updates=None):
+        """Op do bulk_write de uma operação (já coalescida ou não), ou None se o worker não escreve"""
+        if not writes(action, data, persisted):
+            return None
+        if action == "create":
+            return self.repo.upsert_op(data, updates) if "id" in data else self.repo.insert_op(data)
+        if action == "update":
+            return self.repo.update_op(data["id"], {k: v for k, v in data.items() if k != "id"})
+        return self.repo.delete_op(data["id"])
+
+    def _flush(self, pending):
+        started = time.perf_counter()
+        records = []
+        actions = [[] for _ in pending]
+        # failed: índice -> erro (vão para retry); malformed: ilegíveis ou com ação desconhecida,
+        # que nenhuma nova tentativa resolve (vão direto para a DLQ)
+        failed = {}
+        malformed = set()
+        message_ids = []
+        for i, (method, properties, body) in enumerate(pending):
+            message_id, persisted = message_meta(properties)
+            message_ids.append(message_id)
+            if self.dedup.seen(message_id):
+                MESSAGES_TOTAL.labels("duplicate").inc()
+                self.monitor.count("duplicates_skipped")
+                continue
+            try:
+                decode_started = time.perf_counter()
+                message = get_codec(getattr(properties, "content_type", None)).decode(body)
+                STAGE_SECONDS.labels(message.get("action") or "unknown", "decode").observe(time.perf_counter() - decode_started)
+            except Exception as e:
+                failed[i] = str(e)
+                malformed.add(i)
+                continue
+            try:
+                expanded = self._expand(message.get("action"), message.get("data", {}), persisted)
+            except Exception as e:
+                failed[i] = str(e)
+                malformed.add(i)
+                continue
+            for action, data in expanded:
+                actions[i].append(action)
+                records.append((action, data, persisted, i))
+
+        # os payloads da mesma entidade são juntados antes de virar ops do bulk_write
+        if self.coalescer is not None:
+            saved_before = self.coalescer.writes_saved
+            entries = self.coalescer.coalesce(records)
+            if self.coalescer.writes_saved > saved_before:
+                self.monitor.count("writes_saved", self.coalescer.writes_saved - saved_before)
+        else:
+            entries = [(action, data, persisted, None, {i}) for action, data, persisted, i in records]
+        # owners[k]: mensagens cuja escrita está na op k (mais de uma quando coalescidas)
+        ops, owners = [], []
+        for action, data, persisted, updates, group in entries:
+            op = self._to_op(action, data, persisted, updates)
+            if op is not None:
+                ops.append(op)
+                owners.append(group)
+
+        requeue = set()
+        if ops:
+            mongo_started = time.perf_counter()
+            try:
+                self.repo.bulk_write(ops, ordered=self.ordered)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                for err in errors:
+                    for i in owners[err["index"]]:
+                        failed[i] = err.get("errmsg", "write error")
+                if self.ordered and errors:
+                    # bulk ordenado para no primeiro erro: as mensagens seguintes voltam para a fila
+                    first = min(err["index"] for err in errors)
+                    requeue.update(i for group in owners[first + 1:] for i in group if i not in failed)
+            except PyMongoError as e:
+                # falha do banco, não das mensagens: tudo que tinha escrita vai para o retry com
+                # espera (um requeue imediato voltaria na hora e giraria em falso)
+                for group in owners:
+                    for i in group:
+                        failed.setdefault(i, str(e))
+            STAGE_SECONDS.labels("bulk", "mongo").observe(time.perf_counter() - mongo_started)
+
+        # latência do lote dividida entre as mensagens
+        latency_ms = (time.perf_counter() - started) * 1000 / len(pending)
+        ok_tags = []
+        acked = 0
+        monitor_started = time.perf_counter()
+        for i, (method, properties, body) in enumerate(pending):
+            if i in failed:
+                # republicada no degrau de espera (ou DLQ) antes do ack múltiplo abaixo
+                result = self.retrier.reject(method, properties, body, failed[i], retryable=i not in malformed)
+                ok_tags.append(method.delivery_tag)
+                MESSAGES_TOTAL.labels(result).inc()
+                ERRORS_TOTAL.labels("processing").inc()
+                self.monitor.count("retried" if result == "retry" else "dead_lettered")
+                self.monitor.publish_event("processing", "error", failed[i], latency_ms=latency_ms)
+            elif i in requeue:
+                self.channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                MESSAGES_TOTAL.labels("requeue").inc()
+            else:
+                ok_tags.append(method.delivery_tag)
+                acked += 1
+                self.dedup.add(message_ids[i])
+                for action in actions[i]:
+                    self.monitor.publish_event(action, "success", latency_ms=latency_ms)
+        STAGE_SECONDS.labels("bulk", "monitor").observe(time.perf_counter() - monitor_started)
+        if ok_tags:
+            self.channel.basic_ack(delivery_tag=max(ok_tags), multiple=True)
+            MESSAGES_TOTAL.labels("ack").inc(acked)
+        share = (time.perf_counter() - started) / len(pending)
+        batch_seconds = MESSAGE_SECONDS.labels("bulk")
+        for _ in pending:
+            batch_seconds.observe(share)
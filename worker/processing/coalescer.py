@@ -0,0 +1,81 @@
+def writes(action, data, persisted=False):
+    """True se a operação escreve no Mongo pelo worker (mesma regra de apply_message)"""
+    if action == "create":
+        return not persisted
+    return action in ("update", "delete") and "id" in data
+
+def _name_key(data):
+    name = data.get("name")
+    return ("name", name) if isinstance(name, str) else None
+
+class WriteCoalescer:
+    """Junta as operações de um lote que atingem a mesma entidade antes de virarem escritas
+
+    Trabalha nos payloads das mensagens, pela chave que elas trazem: o id, ou o name nos
+    updates e deletes da API (que não trazem id; o create traz os dois). Só junta o que
+    dá o mesmo resultado que aplicar em sequência:
+    - por id, updates viram um só $set (o último valor de cada campo vence), updates depois
+      de um create entram no mesmo upsert e um delete substitui o create/update anterior;
+      um create depois de um delete segue como escrita separada;
+    - operações que não escrevem nada no worker (create já gravado pela API, update e
+      delete só com name) são absorvidas pela entrada aberta da mesma entidade.
+    """
+
+    def __init__(self):
+        self.writes_in = 0
+        self.writes_out = 0
+
+    @property
+    def writes_saved(self):
+        return self.writes_in - self.writes_out
+
+    def stats(self):
+        return {"writes_in": self.writes_in, "writes_out": self.writes_out, "writes_saved": self.writes_saved}
+
+    @staticmethod
+    def _merge(entry, action, data):
+        """Combina uma escrita por id com a entrada aberta do mesmo id; False se não dá"""
+        if action == "delete":
+            entry.update(action="delete", data={"id": data["id"]}, updates=None)
+            return True
+        if action != "update":
+            return False
+        fields = {k: v for k, v in data.items() if k != "id"}
+        if entry["action"] == "delete":
+            return True  # update de documento já removido não altera nada
+        if entry["action"] == "update":
+            entry["data"] = {**entry["data"], **fields}
+        else:
+            # create idempotente (upsert) seguido de updates: $set junto no mesmo upsert
+            entry["updates"] = {**(entry["updates"] or {}), **fields}
+        return True
+
+    def coalesce(self, records):
+        """records: [(action, data, persisted, mensagem)] na ordem do lote; devolve
+        [(action, data, persisted, updates, mensagens)] na ordem da primeira contribuição"""
+        merged = []
+        open_by_key = {}
+        for action, data, persisted, owner in records:
+            key_id = ("id", data["id"]) if "id" in data else None
+            key_name = _name_key(data)
+            effect = writes(action, data, persisted)
+            if not effect:
+                entry = open_by_key.get(key_id) or open_by_key.get(key_name)
+                if entry is not None:
+                    entry["owners"].add(owner)
+                    continue
+            elif key_id is not None:
+                # escritas só se juntam pelo id: o name pode repetir ou mudar no meio do lote
+                entry = open_by_key.get(key_id)
+                if entry is not None and entry["writes"] and self._merge(entry, action, data):
+                    entry["owners"].add(owner)
+                    continue
+            entry = {"action": action, "data": data, "persisted": persisted, "updates": None,
+                     "owners": {owner}, "writes": effect}
+            merged.append(entry)
+            for key in (key_id, key_name):
+                if key is not None:
+                    open_by_key[key] = entry
+        self.writes_in += len(records)
+        self.writes_out += len(merged)
+        return [(e["action"], e["data"], e["persisted"], e["updates"], e["owners"]) for e in merged]
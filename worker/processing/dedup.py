@@ -0,0 +1,50 @@
+import threading
+import time
+from collections import OrderedDict
+
+class DedupCache:
+    """message_ids já processados, limitado por tamanho (LRU) e por TTL
+
+    Só guarda ids de mensagens aplicadas com sucesso: uma mensagem que falhou e foi
+    reentregue é processada de novo.
+    """
+
+    def __init__(self, maxsize: int = 100000, ttl: float = 600.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def seen(self, message_id) -> bool:
+        """True se o id já foi processado dentro do TTL"""
+        if message_id is None:
+            return False
+        with self._lock:
+            expires = self._seen.get(message_id)
+            if expires is None:
+                return False
+            if expires <= self.clock():
+                del self._seen[message_id]
+                return False
+            self.duplicates += 1
+            return True
+
+    def add(self, message_id):
+        if message_id is None:
+            return
+        with self._lock:
+            self._seen[message_id] = self.clock() + self.ttl
+            self._seen.move_to_end(message_id)
+            while len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+
+    def __len__(self):
+        return len(self._seen)
+
+def message_meta(properties):
+    """(message_id, persisted) das propriedades AMQP; persisted indica que a API já gravou o documento"""
+    message_id = getattr(properties, "message_id", None)
+    headers = getattr(properties, "headers", None) or {}
+    return message_id, bool(headers.get("x-persisted"))
@@ -1,52 +1,229 @@
-import json
+import time
 import pika
-from config import RABBITMQ_HOST, REQUEST_QUEUE
+from config import (RABBITMQ_HOST, REQUEST_QUEUE, CRUD_EXCHANGE, WORKER_DEDUP_SIZE, WORKER_DEDUP_TTL,
+                    CRUD_PARTITIONS, WORKER_PARTITIONS, WORKER_ADAPTIVE_PREFETCH)
 from repositories.user_repository import UserRepository
-from monitoring.monitor_publisher import MonitorPublisher
+from monitoring.monitor_publisher import MonitorPublisher, WORKER_ID
 from bson.objectid import ObjectId
+from messaging.codecs import get_codec
+from messaging.partitions import consumer_priorities, partition_queues, queue_arguments
+from processing.dedup import DedupCache, message_meta
+from processing.retry import RetryPolicy, Retrier, is_retryable
+from processing.prefetch import PrefetchController
+from processing.shutdown import Drain
+from monitoring.metrics import REGISTRY
+
+# expostas em /metrics (METRICS_PORT); action "message" é o nível da mensagem, antes de separar as ops
+STAGE_SECONDS = REGISTRY.histogram("worker_stage_seconds", "Tempo por etapa (decode, mongo, monitor) e ação",
+                                   ("action", "stage"))
+MESSAGE_SECONDS = REGISTRY.histogram("worker_message_seconds", "Tempo total de processamento por mensagem",
+                                     ("action",))
+MESSAGES_TOTAL = REGISTRY.counter("worker_messages_total",
+                                  "Mensagens consumidas por desfecho (ack, requeue, retry, dead, duplicate)", ("result",))
+ERRORS_TOTAL = REGISTRY.counter("worker_errors_total", "Operações com erro por ação", ("action",))
+
+def apply_message(repo, action, data, persisted=False):
+    """Aplica uma operação no banco e devolve o evento de monitoramento (action, status, error)"""
+    if action == "create":
+        if persisted:
+            # a API já inseriu o documento: nada a escrever
+            return "create", "skipped", None
+        # data contains id and rest
+        if "id" in data:
+            repo.upsert(data)
+        else:
+            repo.insert(data)
+        return "create", "success", None
+    elif action == "update":
+        # expecting name or id - adapt according to api
+        # here assume data contains 'name' or 'id'
+        if "id" in data:
+            _id = data["id"]
+            # remove id from update to avoid overwriting object id field
+            updated = {k: v for k, v in data.items() if k != "id"}
+            repo.update_by_id(_id, updated)
+        return "update", "success", None
+    elif action == "delete":
+        if "id" in data:
+            repo.delete_by_id(data["id"])
+        return "delete", "success", None
+    return action or "unknown", "error", "Unknown action"
+
+def partition_consumers(partitions=CRUD_PARTITIONS, preferred=WORKER_PARTITIONS, worker_id=WORKER_ID):
+    """(fila, argumentos do consume) de cada partição da crud_queue
+
+    Com partições, o worker se inscreve em todas com uma x-priority própria: o broker deixa
+    ativo em cada fila o consumidor de maior prioridade e os outros ficam de reserva.
+    """
+    queues = partition_queues(REQUEST_QUEUE, partitions)
+    if partitions <= 1:
+        return [(queues[0], None)]
+    priorities = consumer_priorities(partitions, worker_id, preferred)
+    return [(queue, {"x-priority": priorities[i]}) for i, queue in enumerate(queues)]
+
+def declare_partitions(channel, partitions=CRUD_PARTITIONS):
+    channel.exchange_declare(exchange=CRUD_EXCHANGE, exchange_type="direct", durable=True)
+    for queue in partition_queues(REQUEST_QUEUE, partitions):
+        channel.queue_declare(queue=queue, durable=True, arguments=queue_arguments(partitions))
+        channel.queue_bind(queue=queue, exchange=CRUD_EXCHANGE, routing_key=queue)
 
 class MessageHandler:
-    def __init__(self, rabbit_host=RABBITMQ_HOST):
-        self.repo = UserRepository()
-        self.monitor = MonitorPublisher()
+    def __init__(self, rabbit_host=RABBITMQ_HOST, repo: UserRepository = None, monitor: MonitorPublisher = None,
+                 dedup: DedupCache = None, partitions=CRUD_PARTITIONS, preferred=WORKER_PARTITIONS,
+                 retry_policy: RetryPolicy = None, prefetch=1, adaptive_prefetch=WORKER_ADAPTIVE_PREFETCH,
+                 drain: Drain = None):
+        self.repo = repo or UserRepository()
+        self.monitor = monitor or MonitorPublisher()
+        self.dedup = dedup or DedupCache(maxsize=WORKER_DEDUP_SIZE, ttl=WORKER_DEDUP_TTL)
+        self.consumers = partition_consumers(partitions, preferred)
         params = pika.ConnectionParameters(host=rabbit_host)
         self.connection = pika.BlockingConnection(params)
         self.channel = self.connection.channel()
-        self.channel.queue_declare(queue=REQUEST_QUEUE, durable=True)
+        declare_partitions(self.channel, partitions)
+        # confirms só afetam as republicações de retry/DLQ feitas neste canal
+        self.channel.confirm_delivery()
+        self.retrier = Retrier(self.channel, retry_policy)
+        self.retrier.policy.declare(self.channel, [queue for queue, _ in self.consumers])
+        self.prefetch = prefetch
+        self.adaptive_prefetch = adaptive_prefetch
+        self.prefetch_control = None
+        self.drain = drain or Drain()
+        self._consumer_tags = []
+        self._callback = None
 
     def start(self):
-        self.channel.basic_qos(prefetch_count=1)
-        self.channel.basic_consume(queue=REQUEST_QUEUE, on_message_callback=self._on_message)
-        print("[worker] Waiting for messages...")
-        self.channel.start_consuming()
+        self._consume(self._on_message, parallelism=1)
+        self._schedule_monitor_flush()
+        print(f"[worker] Waiting for messages (prefetch={'adaptive' if self.adaptive_prefetch else self.prefetch})...")
+        while not self.drain.requested:
+            # process_data_events volta a cada entrega (ou em 1s): o pedido de drain é visto entre mensagens
+            self.connection.process_data_events(time_limit=1)
+            self._maybe_tune_prefetch()
+        self._drain()
+
+    def _consume(self, callback, parallelism):
+        self._callback = callback
+        if self.adaptive_prefetch:
+            self.prefetch_control = PrefetchController(parallelism=parallelism, initial=self.prefetch)
+            self._tune_prefetch()
+        else:
+            # prefetch por consumidor (por partição ativa)
+            self.channel.basic_qos(prefetch_count=self.prefetch)
+            self._subscribe()
+
+    def _subscribe(self):
+        """Inscreve consumidores novos (com o prefetch do último basic.qos) e cancela os antigos
+
+        O novo entra antes do cancel: com single active consumer é ele, e não o de outro worker,
+        que assume a partição. Entregas ainda no buffer do pika voltam para a fila no cancel.
+        """
+        old = self._consumer_tags
+        self._consumer_tags = [
+            self.channel.basic_consume(queue=queue, on_message_callback=self._callback, arguments=arguments)
+            for queue, arguments in self.consumers
+        ]
+        for tag in old:
+            self.channel.basic_cancel(tag)
+
+    def _maybe_tune_prefetch(self):
+        if self.prefetch_control is not None and self.prefetch_control.due():
+            self._tune_prefetch()
+
+    def _tune_prefetch(self):
+        # basic.qos é um RPC síncrono: aplica o prefetch e mede a ida e volta ao broker na mesma chamada.
+        # Sem QoS global (obsoleto no RabbitMQ 4 e recusado pelas quorum queues) o valor só vale para
+        # consumidores novos, então uma mudança refaz as inscrições
+        previous = self.prefetch_control.prefetch
+        count = self.prefetch_control.adjust()
+        started = time.perf_counter()
+        self.channel.basic_qos(prefetch_count=count)
+        self.prefetch_control.observe_rtt(time.perf_counter() - started)
+        if count != previous or not self._consumer_tags:
+            self._subscribe()
+
+    def _drain(self):
+        """Para de consumir e fecha depois de publicar o monitor (a mensagem em andamento já teve ack)"""
+        self.drain.begin()
+        # entregas já recebidas mas ainda não processadas voltam para a fila (nack do pika no cancel)
+        for tag in self._consumer_tags:
+            self.channel.basic_cancel(tag)
+        self._close()
+
+    def _close(self):
+        self.monitor.close()
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+        self.drain.finish()
+
+    def _schedule_monitor_flush(self):
+        # sai por intervalo mesmo sem mensagens novas: o resumo (aggregate) e, nos dois modos,
+        # os contadores de count() (duplicatas, creates pulados, retry/DLQ)
+        def tick():
+            self.monitor.maybe_flush()
+            self.connection.call_later(self.monitor.flush_interval, tick)
+        self.connection.call_later(self.monitor.flush_interval, tick)
 
     def _on_message(self, ch, method, properties, body):
+        started = time.perf_counter()
+        action = "unknown"
+        message_id, persisted = message_meta(properties)
+        if self.dedup.seen(message_id):
+            # reentrega de mensagem já aplicada
+            MESSAGES_TOTAL.labels("duplicate").inc()
+            self.monitor.count("duplicates_skipped")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        retryable = False
         try:
-            message = json.loads(body)
-            action = message.get("action")
+            message = get_codec(getattr(properties, "content_type", None)).decode(body)
+            action = message.get("action") or "unknown"
+            STAGE_SECONDS.labels(action, "decode").observe(time.perf_counter() - started)
+            retryable = True
             data = message.get("data", {})
-            # process
-            if action == "create":
-                # data contains id and rest
-                self.repo.insert(data)
-                self.monitor.publish_event("create", "success")
-            elif action == "update":
-                # expecting name or id - adapt according to api
-                # here assume data contains 'name' or 'id'
-                if "id" in data:
-                    _id = data["id"]
-                    # remove id from update to avoid overwriting object id field
-                    updated = {k: v for k, v in data.items() if k != "id"}
-                    self.repo.update_by_id(_id, updated)
-                self.monitor.publish_event("update", "success")
-            elif action == "delete":
-                if "id" in data:
-                    self.repo.delete_by_id(data["id"])
-                self.monitor.publish_event("delete", "success")
+            if action == "batch":
+                # mensagem única com várias operações (POST /api/users/batch); as escritas
+                # são idempotentes, então se alguma falhar a mensagem inteira é repetida
+                errors = []
+                for op in data.get("ops", []):
+                    try:
+                        self._process(op.get("action"), op.get("data", {}), persisted)
+                    except Exception as e:
+                        ERRORS_TOTAL.labels(op.get("action") or "unknown").inc()
+                        errors.append(e)
+                if errors:
+                    # só vale repetir se alguma op falhou por algo transitório
+                    retryable = any(is_retryable(e) for e in errors)
+                    raise RuntimeError(f"{len(errors)} batch op(s) failed: {errors[0]}")
             else:
-                self.monitor.publish_event(action or "unknown", "error", "Unknown action")
+                self._process(action, data, persisted)
+            self.dedup.add(message_id)
+            result = "ack"
         except Exception as e:
-            # publish error monitor event
+            # sem sleep nem requeue imediato: a mensagem vai para o degrau de espera (ou para
+            # a DLQ, se ilegível ou sem tentativas) e o consumidor segue com a próxima
+            ERRORS_TOTAL.labels("processing").inc()
             self.monitor.publish_event("processing", "error", str(e))
-        finally:
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            result = self.retrier.reject(method, properties, body, str(e), retryable and is_retryable(e))
+            self.monitor.count("retried" if result == "retry" else "dead_lettered")
+        # se a republicação falhar a exceção sobe sem ack e o broker reentrega a mensagem
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        MESSAGES_TOTAL.labels(result).inc()
+        elapsed = time.perf_counter() - started
+        MESSAGE_SECONDS.labels(action).observe(elapsed)
+        if self.prefetch_control is not None:
+            self.prefetch_control.observe(elapsed)
+
+    def _process(self, action, data, persisted=False):
+        started = time.perf_counter()
+        action, status, error = apply_message(self.repo, action, data, persisted)
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(action, "mongo").observe(elapsed)
+        if status == "skipped":
+            self.monitor.count("creates_skipped")
+            return
+        if status == "error":
+            ERRORS_TOTAL.labels(action).inc()
+        with STAGE_SECONDS.labels(action, "monitor").time():
+            self.monitor.publish_event(action, status, error, latency_ms=elapsed * 1000)
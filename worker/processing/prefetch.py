@@ -0,0 +1,72 @@
+import math
+import time
+from config import WORKER_PREFETCH_MAX, WORKER_PREFETCH_INTERVAL
+from monitoring.metrics import REGISTRY
+
+PREFETCH_COUNT = REGISTRY.gauge("worker_prefetch_count", "Prefetch atual do canal de consumo")
+BROKER_RTT_SECONDS = REGISTRY.gauge("worker_broker_rtt_seconds", "Ida e volta ao broker (EWMA)")
+SERVICE_SECONDS = REGISTRY.gauge("worker_service_seconds", "Tempo de processamento por unidade de trabalho (EWMA)")
+
+class PrefetchController:
+    """Prefetch pelo tempo de processamento e pela ida e volta ao broker (EWMA dos dois)
+
+    Para o consumidor não ficar parado esperando a próxima entrega, o canal precisa ter em
+    trânsito o que ele processa durante uma ida e volta: parallelism x (1 + rtt / service).
+    Mais do que isso só espera no buffer do worker, longe de outro consumidor livre.
+    `service` é o tempo de uma unidade de trabalho: a mensagem (sync, async) ou o lote (batch).
+    """
+
+    def __init__(self, parallelism: int = 1, initial: int = None, maximum: int = WORKER_PREFETCH_MAX,
+                 interval: float = WORKER_PREFETCH_INTERVAL, alpha: float = 0.2, tolerance: float = 0.2,
+                 clock=time.monotonic):
+        self.parallelism = max(1, parallelism)
+        self.maximum = max(maximum, self.parallelism)
+        self.prefetch = self._clamp(initial or self.parallelism)
+        self.interval = interval
+        self.alpha = alpha
+        # mudanças menores que isso (fração do atual) são ignoradas, para não oscilar
+        self.tolerance = tolerance
+        self.clock = clock
+        self.service = None
+        self.rtt = None
+        self._next = clock()
+        PREFETCH_COUNT.set(self.prefetch)
+
+    def _clamp(self, value) -> int:
+        return min(self.maximum, max(self.parallelism, value))
+
+    def _ewma(self, current, sample):
+        return sample if current is None else current + self.alpha * (sample - current)
+
+    def observe(self, seconds: float):
+        """Tempo de processamento de uma unidade de trabalho"""
+        self.service = self._ewma(self.service, seconds)
+
+    def observe_rtt(self, seconds: float):
+        """Ida e volta de um RPC síncrono ao broker"""
+        self.rtt = self._ewma(self.rtt, seconds)
+
+    def target(self) -> int:
+        if self.service is None or self.rtt is None:
+            return self.prefetch
+        return self._clamp(math.ceil(self.parallelism * (1 + self.rtt / max(self.service, 1e-6))))
+
+    def due(self) -> bool:
+        return self.clock() >= self._next
+
+    def adjust(self) -> int:
+        """Prefetch a aplicar agora (o atual, se o alvo mudou pouco)"""
+        self._next = self.clock() + self.interval
+        target = self.target()
+        if abs(target - self.prefetch) >= max(1, self.prefetch * self.tolerance):
+            self.prefetch = target
+        PREFETCH_COUNT.set(self.prefetch)
+        if self.rtt is not None:
+            BROKER_RTT_SECONDS.set(self.rtt)
+        if self.service is not None:
+            SERVICE_SECONDS.set(self.service)
+        return self.prefetch
+
+    def stats(self):
+        return {"prefetch": self.prefetch, "service_ms": self.service and round(self.service * 1000, 3),
+                "rtt_ms": self.rtt and round(self.rtt * 1000, 3)}
@@ -0,0 +1,95 @@
+import pika
+from bson.errors import BSONError
+from config import RETRY_EXCHANGE, DEAD_LETTER_QUEUE, WORKER_RETRY_DELAYS_MS, WORKER_MAX_ATTEMPTS
+
+# cabeçalho com o número de falhas da mensagem até agora
+ATTEMPTS_HEADER = "x-attempts"
+
+# erros do conteúdo da mensagem (id inválido, campo faltando, tipo errado, ação desconhecida):
+# repetir não resolve, então vão direto para a DLQ em vez de passar por todos os degraus
+PERMANENT_ERRORS = (BSONError, ValueError, KeyError, TypeError)
+
+def is_retryable(error: BaseException) -> bool:
+    return not isinstance(error, PERMANENT_ERRORS)
+
+def attempts_of(properties) -> int:
+    headers = getattr(properties, "headers", None) or {}
+    try:
+        return int(headers.get(ATTEMPTS_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+# volta dos degraus: ligada só às filas das partições, com o nome de cada uma como routing key.
+# Não é a crud_events, para os listeners dela (invalidação de cache, monitor em tempo real)
+# não verem a mesma escrita de novo a cada tentativa
+RETURN_EXCHANGE = f"{RETRY_EXCHANGE}.return"
+
+def tier_name(delay_ms: int) -> str:
+    """Nome da exchange (fanout) e da fila de espera de um degrau"""
+    return f"{RETRY_EXCHANGE}.{delay_ms}ms"
+
+class RetryPolicy:
+    """Destino de uma mensagem que falhou: o degrau de espera da tentativa seguinte ou a DLQ
+
+    Cada degrau é uma exchange fanout com uma fila de TTL fixo (x-message-ttl), cujo
+    dead-letter é a RETURN_EXCHANGE: ao expirar, a mensagem volta com a routing key com que
+    foi publicada no degrau, que é a da partição original. TTL por fila, e não por
+    mensagem, porque o RabbitMQ só expira mensagens na cabeça da fila.
+    """
+
+    def __init__(self, delays_ms=WORKER_RETRY_DELAYS_MS, max_attempts=WORKER_MAX_ATTEMPTS):
+        self.delays_ms = tuple(delays_ms)
+        self.max_attempts = max_attempts
+
+    def target(self, attempts: int, retryable: bool = True):
+        """Exchange do degrau para a mensagem com `attempts` falhas, ou None para a DLQ"""
+        if not retryable or not self.delays_ms or attempts >= self.max_attempts:
+            return None
+        return tier_name(self.delays_ms[min(attempts, len(self.delays_ms)) - 1])
+
+    @staticmethod
+    def headers(properties, attempts: int, error: str, routing_key: str) -> dict:
+        # x-death é do broker: não é copiado para a nova mensagem
+        headers = {k: v for k, v in (getattr(properties, "headers", None) or {}).items() if k != "x-death"}
+        headers.update({ATTEMPTS_HEADER: attempts, "x-last-error": (error or "")[:500],
+                        "x-original-routing-key": headers.get("x-original-routing-key", routing_key)})
+        return headers
+
+    def tiers(self):
+        for delay in sorted(set(self.delays_ms)):
+            yield tier_name(delay), {"x-message-ttl": delay, "x-dead-letter-exchange": RETURN_EXCHANGE}
+
+    def declare(self, channel, queues):
+        """Degraus, volta para as filas `queues` (partições) e DLQ num canal pika"""
+        channel.exchange_declare(exchange=RETURN_EXCHANGE, exchange_type="direct", durable=True)
+        for queue in queues:
+            channel.queue_bind(queue=queue, exchange=RETURN_EXCHANGE, routing_key=queue)
+        for name, arguments in self.tiers():
+            channel.exchange_declare(exchange=name, exchange_type="fanout", durable=True)
+            channel.queue_declare(queue=name, durable=True, arguments=arguments)
+            channel.queue_bind(queue=name, exchange=name)
+        channel.queue_declare(queue=DEAD_LETTER_QUEUE, durable=True)
+
+class Retrier:
+    """Republica no canal do consumidor uma mensagem que falhou (o ack da original fica com quem chama)
+
+    O canal usa publisher confirms: quando reject() retorna, a cópia já está no broker e a
+    original pode ser confirmada sem risco de perder a escrita.
+    """
+
+    def __init__(self, channel, policy: RetryPolicy = None):
+        self.channel = channel
+        self.policy = policy or RetryPolicy()
+
+    def reject(self, method, properties, body, error: str, retryable: bool = True) -> str:
+        """Envia para o próximo degrau ("retry") ou para a DLQ ("dead")"""
+        attempts = attempts_of(properties) + 1
+        exchange = self.policy.target(attempts, retryable)
+        out = pika.BasicProperties(delivery_mode=2, content_type=getattr(properties, "content_type", None),
+                                   message_id=getattr(properties, "message_id", None),
+                                   headers=self.policy.headers(properties, attempts, error, method.routing_key))
+        if exchange is None:
+            self.channel.basic_publish(exchange="", routing_key=DEAD_LETTER_QUEUE, body=body, properties=out)
+            return "dead"
+        self.channel.basic_publish(exchange=exchange, routing_key=method.routing_key, body=body, properties=out)
+        return "retry"
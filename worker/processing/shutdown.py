@@ -0,0 +1,55 @@
+import os
+import signal
+import threading
+import time
+from config import WORKER_DRAIN_TIMEOUT
+
+class Drain:
+    """Desligamento gracioso: parar de consumir, terminar e confirmar o que está em andamento,
+    publicar o monitor e sair, dentro de um prazo
+
+    O handler do sinal só marca o pedido; o loop do consumidor olha a marca entre uma entrega
+    e outra e faz o resto num ponto seguro (pika não é reentrante). Se o prazo estourar, o
+    processo sai mesmo assim e o broker reentrega as mensagens sem ack.
+    """
+
+    def __init__(self, timeout: float = WORKER_DRAIN_TIMEOUT, exit=os._exit):
+        self.timeout = timeout
+        self._exit = exit
+        self.requested = False
+        self.started = None
+        self._timer = None
+
+    def install(self, signals=(signal.SIGTERM, signal.SIGINT)):
+        # signal.signal só pode ser chamado da thread principal
+        if threading.current_thread() is threading.main_thread():
+            for sig in signals:
+                signal.signal(sig, self.request)
+
+    def request(self, *_):
+        self.requested = True
+
+    def begin(self):
+        if self.started is not None:
+            return
+        self.requested = True
+        self.started = time.monotonic()
+        print(f"[worker] Draining (deadline {self.timeout}s)...")
+        self._timer = threading.Timer(self.timeout, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def remaining(self) -> float:
+        if self.started is None:
+            return self.timeout
+        return max(0.0, self.started + self.timeout - time.monotonic())
+
+    def finish(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        print(f"[worker] Drained in {time.monotonic() - self.started:.2f}s")
+
+    def _expire(self):
+        print("[worker] Drain deadline exceeded, exiting with messages in flight (the broker redelivers them)",
+              flush=True)
+        self._exit(1)
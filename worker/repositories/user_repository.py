@@ -1,5 +1,6 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, InsertOne, UpdateOne, DeleteOne
 from config import MONGO_URI
+from repositories.indexes import IndexManager
 from bson.objectid import ObjectId
 
 class UserRepository:
@@ -7,10 +8,22 @@ class UserRepository:
         self.client = MongoClient(mongo_uri)
         self.db = self.client[db_name]
         self.collection = self.db["items"]
+        self.indexes = IndexManager(self.collection)
 
     def insert(self, data):
         return self.collection.insert_one(data)
 
+    @staticmethod
+    def _upsert_args(data):
+        # o id vem da API (documento já inserido lá): só insere se ainda não existir
+        doc = {k: v for k, v in data.items() if k not in ("id", "_id")}
+        return {"_id": ObjectId(data["id"])}, {"$setOnInsert": doc}
+
+    def upsert(self, data):
+        """Create idempotente: reaplicar a mesma mensagem não duplica o documento"""
+        _filter, update = self._upsert_args(data)
+        return self.collection.update_one(_filter, update, upsert=True)
+
     def find_by_id(self, _id):
         return self.collection.find_one({"_id": ObjectId(_id)})
 
@@ -19,3 +32,25 @@ class UserRepository:
 
     def delete_by_id(self, _id):
         return self.collection.delete_one({"_id": ObjectId(_id)})
+
+    # operações para bulk_write, com a mesma semântica dos métodos acima
+    def insert_op(self, data):
+        return InsertOne(data)
+
+    def upsert_op(self, data, updates=None):
+        """updates: $set de updates do mesmo lote, aplicado também se o documento já existir"""
+        _filter, update = self._upsert_args(data)
+        if updates:
+            # um campo não pode estar no $set e no $setOnInsert ao mesmo tempo
+            on_insert = {k: v for k, v in update["$setOnInsert"].items() if k not in updates}
+            update = {"$set": dict(updates), **({"$setOnInsert": on_insert} if on_insert else {})}
+        return UpdateOne(_filter, update, upsert=True)
+
+    def update_op(self, _id, data):
+        return UpdateOne({"_id": ObjectId(_id)}, {"$set": data})
+
+    def delete_op(self, _id):
+        return DeleteOne({"_id": ObjectId(_id)})
+
+    def bulk_write(self, ops, ordered=True):
+        return self.collection.bulk_write(ops, ordered=ordered)
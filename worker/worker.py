@@ -1,5 +1,24 @@
-from processing.message_handler import MessageHandler
+from config import WORKER_MODE, METRICS_PORT
+from monitoring.metrics import start_http_server
+
+def build_handler(mode=WORKER_MODE):
+    if mode == "async":
+        from processing.async_handler import AsyncMessageHandler
+        return AsyncMessageHandler()
+    if mode == "batch":
+        from processing.batch_handler import BatchMessageHandler
+        return BatchMessageHandler()
+    from processing.message_handler import MessageHandler
+    return MessageHandler()
 
 if __name__ == "__main__":
-    handler = MessageHandler()
+    handler = build_handler()
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        print(f"[worker] Metrics on :{METRICS_PORT}/metrics")
+    report = handler.repo.indexes.ensure()
+    if report["collscans"]:
+        print(f"[worker] WARNING: hot queries running as COLLSCAN: {report['collscans']}")
+    # SIGTERM (rolling deploy) e SIGINT: drain gracioso em vez de derrubar as mensagens em andamento
+    handler.drain.install()
     handler.start()